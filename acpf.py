@@ -0,0 +1,270 @@
+import numpy as np
+import copy
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+from collections import OrderedDict
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+from pypower.makeYbus import makeYbus
+from pypower.makeSbus import makeSbus
+from pypower.pfsoln import pfsoln
+
+from dcpf import DCPowerFlow
+
+"""
+acpf.py - AC power flow solver for cascades. Newton's method as in
+pypower.newtonpf, but warm-started from the voltages each island ended the
+previous round with (the VM/VA columns of its bus data) instead of a flat
+start, and with the admittance matrices and the Jacobian's sparsity pattern
+built once per island topology and refilled in place on every iteration.
+Islands that fail to converge (or have no generator to balance them) are solved
+with the DC power flow instead.
+"""
+
+# power flow result columns written back to the case data
+BUS_RESULTS = [idx_bus.VM, idx_bus.VA]
+GEN_RESULTS = [idx_gen.PG, idx_gen.QG]
+BRANCH_RESULTS = [idx_brch.PF, idx_brch.QF, idx_brch.PT, idx_brch.QT]
+
+
+class NewtonStructure(object):
+    """Everything about the Newton power flow of one island topology that does
+    not depend on the operating point: admittance matrices, bus types, and the
+    Jacobian's sparsity pattern with a map from admittance matrix entries to
+    Jacobian entries.
+    """
+
+    def __init__(self, baseMVA, bus, branch, ref, pv, pq):
+        """ARGUMENTS: baseMVA: float,
+                      bus, branch: numpy arrays (PYPOWER case data with
+                                   consecutive bus numbers from 0, and only
+                                   active branches),
+                      ref, pv, pq: numpy arrays (of bus rows)
+        """
+        n = len(bus)
+        self.ref, self.pv, self.pq = ref, pv, pq
+        self.pvpq = np.concatenate((pv, pq))
+        self.Ybus, self.Yf, self.Yt = makeYbus(baseMVA, bus, branch)
+
+        # admittance matrix entries, with every diagonal entry present
+        Y = self.Ybus.tocoo()
+        keys = np.concatenate((Y.row * n + Y.col, np.arange(n) * (n + 1)))
+        values = np.concatenate((Y.data, np.zeros(n, dtype=complex)))
+        keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        self.yi = keys // n
+        self.yk = keys % n
+        self.y = (np.bincount(inverse, weights=values.real, minlength=len(keys)) +
+                  1j * np.bincount(inverse, weights=values.imag, minlength=len(keys)))
+        self.diag = self.yi == self.yk
+
+        # Jacobian blocks [[dP/dVa, dP/dVm], [dQ/dVa, dQ/dVm]] over the pv+pq
+        # angles and pq magnitudes
+        npvpq = len(self.pvpq)
+        pvpq_pos = -np.ones(n, dtype=int)
+        pvpq_pos[self.pvpq] = np.arange(npvpq)
+        pq_pos = -np.ones(n, dtype=int)
+        pq_pos[pq] = np.arange(len(pq))
+        rows, cols, self.blocks = [], [], []
+        for row_pos, row_offset, col_pos, col_offset in ((pvpq_pos, 0, pvpq_pos, 0),
+                                                         (pvpq_pos, 0, pq_pos, npvpq),
+                                                         (pq_pos, npvpq, pvpq_pos, 0),
+                                                         (pq_pos, npvpq, pq_pos, npvpq)):
+            entries = np.flatnonzero((row_pos[self.yi] >= 0) & (col_pos[self.yk] >= 0))
+            rows.append(row_pos[self.yi[entries]] + row_offset)
+            cols.append(col_pos[self.yk[entries]] + col_offset)
+            self.blocks.append(entries)
+        size = npvpq + len(pq)
+        n_entries = sum(len(entries) for entries in self.blocks)
+        # each Jacobian entry comes from exactly one block entry, so building
+        # the matrix from entry numbers gives the order to refill its data in
+        self.J = sparse.csc_matrix((np.arange(1, n_entries + 1, dtype=float),
+                                    (np.concatenate(rows), np.concatenate(cols))),
+                                   shape=(size, size))
+        self.order = self.J.data.astype(int) - 1
+
+    def jacobian(self, V, Ibus):
+        """Refills the Jacobian at the voltages V (as pypower.dSbus_dV).
+
+        ARGUMENTS: V: numpy array (of complex bus voltages),
+                   Ibus: numpy array (of complex bus current injections)
+        RETURNS:   scipy.sparse.csc_matrix
+        """
+        Vi, Vk = V[self.yi], V[self.yk]
+        Vnorm = V / abs(V)
+        dVm = Vi * np.conj(self.y * Vnorm[self.yk])
+        dVm[self.diag] += np.conj(Ibus[self.yi[self.diag]]) * Vnorm[self.yi[self.diag]]
+        dVa = -self.y * Vk
+        dVa[self.diag] += Ibus[self.yi[self.diag]]
+        dVa = 1j * Vi * np.conj(dVa)
+        values = np.concatenate((dVa.real[self.blocks[0]], dVm.real[self.blocks[1]],
+                                 dVa.imag[self.blocks[2]], dVm.imag[self.blocks[3]]))
+        self.J.data[:] = values[self.order]
+        return self.J
+
+
+class ACPowerFlow(DCPowerFlow):
+    """AC power flow solver bound to a base PYPOWER case (see acpf.py). Keeps
+    counters of Newton iterations, solves and DC fallbacks.
+    """
+
+    def __init__(self, ppc, maxCached=256, tol=1e-8, maxIter=10):
+        """ARGUMENTS: ppc: dict (representing the base PYPOWER case file),
+                      maxCached: int (number of factorizations and Newton
+                                 structures to keep),
+                      tol: float (mismatch tolerance in p.u., as PF_TOL),
+                      maxIter: int (Newton iterations before falling back to
+                               DC, as PF_MAX_IT)
+        """
+        DCPowerFlow.__init__(self, ppc, maxCached=maxCached)
+        self.tol = tol
+        self.maxIter = maxIter
+        self.structures = OrderedDict()
+        self.solves = 0
+        self.iterations = 0
+        self.fallbacks = 0
+
+    def counters(self):
+        """RETURNS: dict (total solves, Newton iterations and DC fallbacks)"""
+        return {'solves': self.solves, 'iterations': self.iterations,
+                'fallbacks': self.fallbacks}
+
+    def structure(self, key, bus, branch, ref, pv, pq):
+        if key in self.structures:
+            self.structures.move_to_end(key)
+            return self.structures[key]
+        structure = NewtonStructure(self.baseMVA, bus, branch, ref, pv, pq)
+        self.structures[key] = structure
+        if len(self.structures) > self.maxCached:
+            self.structures.popitem(last=False)
+        return structure
+
+    def newton(self, structure, Sbus, V):
+        """Runs Newton's method from V.
+
+        RETURNS: tuple (numpy array (of complex bus voltages), bool (converged),
+                 int (iterations))
+        """
+        pv, pq, pvpq = structure.pv, structure.pq, structure.pvpq
+        npv, npq = len(pv), len(pq)
+        Va, Vm = np.angle(V), abs(V)
+
+        def mismatch(V):
+            mis = V * np.conj(structure.Ybus @ V) - Sbus
+            return np.concatenate((mis[pvpq].real, mis[pq].imag))
+
+        F = mismatch(V)
+        i = 0
+        converged = np.linalg.norm(F, np.inf) < self.tol
+        while not converged and i < self.maxIter:
+            i += 1
+            J = structure.jacobian(V, structure.Ybus @ V)
+            try:
+                dx = -splinalg.splu(J).solve(F)
+            except RuntimeError:
+                # singular Jacobian
+                return (V, False, i)
+            Va[pv] += dx[:npv]
+            Va[pq] += dx[npv:npv + npq]
+            Vm[pq] += dx[npv + npq:]
+            V = Vm * np.exp(1j * Va)
+            Vm, Va = abs(V), np.angle(V)
+            F = mismatch(V)
+            if not np.all(np.isfinite(F)):
+                return (V, False, i)
+            converged = np.linalg.norm(F, np.inf) < self.tol
+        return (V, converged, i)
+
+    def solve(self, bus, gen, branch, bus_rows, branch_rows):
+        """Solves an AC power flow on the given bus/gen/branch arrays (as
+        DCPowerFlow.solve()), starting from their VM/VA columns. Falls back to
+        DCPowerFlow.solve() if Newton's method does not converge or the island
+        has no in-service generator.
+
+        ARGUMENTS: bus, gen, branch: numpy arrays (PYPOWER case data),
+                   bus_rows: numpy array (of base bus row indices),
+                   branch_rows: numpy array (of base branch row indices)
+        RETURNS:   bool (False if the DC power flow was used)
+        """
+        self.solves += 1
+        n = len(bus)
+        local = -np.ones(self.n_bus, dtype=int)
+        local[bus_rows] = np.arange(n)
+        active = np.flatnonzero(branch[:, idx_brch.BR_X] != np.inf)
+
+        # bus types (as pypower.bustypes)
+        on = np.flatnonzero(gen[:, idx_gen.GEN_STATUS] > 0)
+        gbus = local[self.bus_lookup[gen[on, idx_gen.GEN_BUS].astype(int)]]
+        has_gen = np.zeros(n, dtype=bool)
+        has_gen[gbus] = True
+        types = bus[:, idx_bus.BUS_TYPE]
+        ref = np.flatnonzero((types == idx_bus.REF) & has_gen)
+        pv = np.flatnonzero((types == idx_bus.PV) & has_gen)
+        pq = np.flatnonzero((types == idx_bus.PQ) | ~has_gen)
+        if len(ref) == 0:
+            ref, pv = pv[:1], pv[1:]
+        if len(ref) == 0:
+            self.fallbacks += 1
+            DCPowerFlow.solve(self, bus, gen, branch, bus_rows, branch_rows)
+            return False
+
+        # the island with consecutive bus numbers and without failed lines
+        bus_local = bus.copy()
+        bus_local[:, idx_bus.BUS_I] = np.arange(n)
+        gen_local = gen.copy()
+        gen_local[:, idx_gen.GEN_BUS] = local[self.bus_lookup[gen[:, idx_gen.GEN_BUS].astype(int)]]
+        branch_local = branch[active]
+        branch_local[:, idx_brch.F_BUS] = local[self.f[branch_rows[active]]]
+        branch_local[:, idx_brch.T_BUS] = local[self.t[branch_rows[active]]]
+
+        # a tuple, as concatenated bytes would not mark where each array ends
+        key = (bus_rows.tobytes(), branch_rows[active].tobytes(), ref.tobytes(), pv.tobytes())
+        structure = self.structure(key, bus_local, branch_local, ref, pv, pq)
+
+        # warm start from the island's voltages, with generator setpoints
+        V = bus[:, idx_bus.VM] * np.exp(1j * np.pi / 180 * bus[:, idx_bus.VA])
+        V[gbus] = gen[on, idx_gen.VG] / abs(V[gbus]) * V[gbus]
+        Sbus = makeSbus(self.baseMVA, bus_local, gen_local)
+        V, converged, iterations = self.newton(structure, Sbus, V)
+        self.iterations += iterations
+        if not converged:
+            self.fallbacks += 1
+            DCPowerFlow.solve(self, bus, gen, branch, bus_rows, branch_rows)
+            return False
+
+        bus_local, gen_local, branch_local = pfsoln(self.baseMVA, bus_local, gen_local,
+                                                    branch_local, structure.Ybus,
+                                                    structure.Yf, structure.Yt, V,
+                                                    ref, pv, pq)
+        bus[:, BUS_RESULTS] = bus_local[:, BUS_RESULTS]
+        gen[:, GEN_RESULTS] = gen_local[:, GEN_RESULTS]
+        branch[:, BRANCH_RESULTS] = 0
+        branch[np.ix_(active, BRANCH_RESULTS)] = branch_local[:, BRANCH_RESULTS]
+        return True
+
+    def runpf(self, ppc):
+        """Drop-in replacement for pypower.runpf (with default options) for the
+        base grid and its islands. The input case file is not modified.
+
+        ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+        RETURNS:   tuple (dict (the solved case file), int (success flag; 0 if
+                   the DC power flow was used))
+        """
+        bus_rows, branch_rows = self.island_rows(ppc)
+        results = copy.copy(ppc)
+        results['bus'] = ppc['bus'].copy()
+        results['gen'] = ppc['gen'].copy()
+        branch = ppc['branch']
+        if branch.shape[1] <= idx_brch.QT:
+            # add columns for power flow results
+            padding = np.zeros((len(branch), idx_brch.QT + 1 - branch.shape[1]))
+            results['branch'] = np.hstack((branch, padding))
+        else:
+            results['branch'] = branch.copy()
+
+        success = int(self.solve(results['bus'], results['gen'], results['branch'],
+                                 bus_rows, branch_rows))
+        results['success'] = success
+        return (results, success)
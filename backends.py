@@ -0,0 +1,184 @@
+import numpy as np
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+from connectivity import label_components, ComponentTracker
+
+"""
+backends.py - Graph backends for finding the connected components of a grid.
+Every backend labels the buses of the grid formed by its active lines straight
+from the branch array's bus rows:
+
+    'networkx': networkx.connected_components
+    'igraph':   igraph.Graph.connected_components (needs python-igraph)
+    'scipy':    scipy.sparse.csgraph.connected_components, on CSR arrays built
+                from the branch array (no graph object)
+    'auto':     igraph for grids below AUTO_THRESHOLD buses (if installed),
+                scipy otherwise; in cascades, the incremental
+                connectivity.ComponentTracker (built on the scipy backend)
+
+Labels are canonical (numbered in order of each component's first bus row), so
+every backend gives the same labels for the same grid. The backend used when
+none is given is set with set_default_backend().
+"""
+
+BACKENDS = ('networkx', 'igraph', 'scipy')
+
+# below this many buses, igraph's graph construction beats scipy's CSR setup
+AUTO_THRESHOLD = 300
+
+_config = {'backend': 'auto'}
+
+def set_default_backend(backend):
+    """Sets the backend used when none is given.
+
+    ARGUMENTS: backend: str ('auto' or one of BACKENDS)
+    """
+    if backend != 'auto' and backend not in BACKENDS:
+        raise ValueError("unknown graph backend '%s'" % backend)
+    _config['backend'] = backend
+
+def get_default_backend():
+    """RETURNS: str"""
+    return _config['backend']
+
+def igraph_available():
+    try:
+        import igraph
+    except ImportError:
+        return False
+    return True
+
+def resolve_backend(n_bus, backend=None):
+    """Picks the backend to use for a grid.
+
+    ARGUMENTS: n_bus: int (number of buses in the grid),
+               backend: str ('auto', one of BACKENDS, or None for the default)
+    RETURNS:   str (one of BACKENDS)
+    """
+    if backend is None:
+        backend = _config['backend']
+    if backend == 'auto':
+        if n_bus < AUTO_THRESHOLD and igraph_available():
+            return 'igraph'
+        return 'scipy'
+    if backend not in BACKENDS:
+        raise ValueError("unknown graph backend '%s'" % backend)
+    return backend
+
+def bus_edges(ppc):
+    """Returns the active lines of a grid as pairs of bus rows.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+    RETURNS:   tuple (number of buses, numpy arrays of from and to bus rows)
+    """
+    bus_ids = ppc['bus'][:, idx_bus.BUS_I].astype(int)
+    bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+    bus_lookup[bus_ids] = np.arange(len(bus_ids))
+    active = ppc['branch'][:, idx_brch.BR_X] != np.inf
+    f = bus_lookup[ppc['branch'][active, idx_brch.F_BUS].astype(int)]
+    t = bus_lookup[ppc['branch'][active, idx_brch.T_BUS].astype(int)]
+    return (len(bus_ids), f, t)
+
+def canonical_labels(labels):
+    """Renumbers component labels in order of each component's first vertex.
+
+    ARGUMENTS: labels: numpy array (of component labels)
+    RETURNS:   numpy array (of component labels)
+    """
+    labels = np.asarray(labels)
+    if len(labels) == 0:
+        return labels.astype(int)
+    first = np.unique(labels, return_index=True)[1]
+    relabel = np.empty(labels.max() + 1, dtype=int)
+    relabel[labels[np.sort(first)]] = np.arange(len(first))
+    return relabel[labels]
+
+def networkx_labels(n, f, t):
+    import networkx as nx
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_edges_from(zip(f.tolist(), t.tolist()))
+    labels = np.empty(n, dtype=int)
+    for label, component in enumerate(nx.connected_components(G)):
+        labels[list(component)] = label
+    return labels
+
+def igraph_labels(n, f, t):
+    import igraph as ig
+    G = ig.Graph(n=n, edges=np.column_stack((f, t)).tolist())
+    return np.array(G.connected_components().membership, dtype=int)
+
+def scipy_labels(n, f, t):
+    return label_components(n, f, t)
+
+LABELERS = {'networkx': networkx_labels, 'igraph': igraph_labels, 'scipy': scipy_labels}
+
+def graph_labels(n, f, t, backend='scipy'):
+    """Labels the connected components of the graph on n vertices with edges
+    (f[i], t[i]) with one of BACKENDS.
+
+    ARGUMENTS: n: int,
+               f, t: numpy arrays (of edge endpoints),
+               backend: str (one of BACKENDS)
+    RETURNS:   numpy array (of canonical component labels, one per vertex)
+    """
+    return canonical_labels(LABELERS[backend](n, np.asarray(f, dtype=int),
+                                              np.asarray(t, dtype=int)))
+
+def component_labels(ppc, backend=None):
+    """Labels each bus of a grid with its connected component.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file),
+               backend: str ('auto', one of BACKENDS, or None for the default)
+    RETURNS:   numpy array (of canonical component labels, one per bus row)
+    """
+    n, f, t = bus_edges(ppc)
+    return graph_labels(n, f, t, resolve_backend(n, backend))
+
+
+class RelabelingTracker(ComponentTracker):
+    """ComponentTracker that relabels the whole grid with a given backend after
+    every removal, rather than only the components that lost a line. Labels do
+    not persist across removals (they stay canonical), so remove_lines() does
+    not report which components split.
+    """
+
+    def __init__(self, ppc, backend):
+        """ARGUMENTS: ppc: dict (representing a PYPOWER case file),
+                   backend: str (one of BACKENDS)
+        """
+        ComponentTracker.__init__(self, ppc)
+        self.backend = backend
+        self.relabel()
+
+    def relabel(self):
+        self.labels = graph_labels(len(self.labels), self.f[self.active],
+                                   self.t[self.active], self.backend)
+        self.n_labels = self.labels.max() + 1 if len(self.labels) > 0 else 0
+
+    def remove_lines(self, lines):
+        """Removes lines from the grid and relabels it.
+
+        ARGUMENTS: lines: iterable (of line indices)
+        RETURNS:   None
+        """
+        lines = np.asarray(lines, dtype=int)
+        self.active[lines] = False
+        self.relabel()
+
+def get_tracker(ppc, backend=None):
+    """Builds the component tracker for a cascade on a grid: the incremental
+    ComponentTracker for 'auto', or a RelabelingTracker for an explicit
+    backend.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file),
+               backend: str ('auto', one of BACKENDS, or None for the default)
+    RETURNS:   ComponentTracker
+    """
+    if backend is None:
+        backend = _config['backend']
+    if backend == 'auto':
+        return ComponentTracker(ppc)
+    return RelabelingTracker(ppc, resolve_backend(len(ppc['bus']), backend))
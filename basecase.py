@@ -0,0 +1,189 @@
+import numpy as np
+import copy
+import hashlib
+from collections import OrderedDict
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+from dcpf import DCPowerFlow
+from lodf import LODFPowerFlow
+from acpf import ACPowerFlow
+
+"""
+basecase.py - Cache of solved base cases. Every simulation of a grid starts by
+solving the untouched grid (once to derive capacities, and again in
+run_simulation()), so the solved case, its initial load and its power flow
+solver (with any derived matrices) are cached by a hash of the case data.
+"""
+
+def get_solver(grid, solver='pypower', matrices=None):
+    """Builds the power flow solver object for a grid.
+
+    ARGUMENTS: grid: dict (representing the base PYPOWER case file),
+               solver: str ('pypower' to use pypower.rundcpf, 'native' to use
+                       a DCPowerFlow solver cached on grid, 'lodf' to use a
+                       LODFPowerFlow solver, which updates the base case flows
+                       incrementally until the grid islands, or 'ac' to use an
+                       ACPowerFlow solver, for AC cascades),
+               matrices: dict (precomputed matrices of the solver, see
+                         solver_matrices())
+    RETURNS:   DCPowerFlow (or None for 'pypower')
+    """
+    if solver == 'pypower':
+        return None
+    elif solver == 'native':
+        return DCPowerFlow(grid)
+    elif solver == 'lodf':
+        return LODFPowerFlow(grid, matrices=matrices)
+    elif solver == 'ac':
+        return ACPowerFlow(grid)
+    else:
+        raise ValueError("unknown DC power flow solver '%s'" % solver)
+
+def pypower_rundcpf(ppc):
+    """Runs pypower.rundcpf without output. pypower's power flow modules are
+    only imported once this is first called.
+    """
+    from pypower.ppoption import ppoption
+    from pypower.rundcpf import rundcpf
+    return rundcpf(ppc, ppoption(VERBOSE=0, OUT_ALL=0))
+
+def solver_rundcpf(dcpf):
+    """Returns a power flow function with the same call signature and
+    return value as pypower.rundcpf (minus the options argument). For an
+    ACPowerFlow, this is its AC power flow.
+
+    ARGUMENTS: dcpf: DCPowerFlow (or None, see get_solver())
+    RETURNS:   function
+    """
+    if dcpf is None:
+        return pypower_rundcpf
+    if isinstance(dcpf, ACPowerFlow):
+        return dcpf.runpf
+    return dcpf.rundcpf
+
+def solver_matrices(dcpf):
+    """Returns the dense matrices a solver derives from its base case, which
+    are worth computing once and sharing (see sharedcase.py).
+
+    ARGUMENTS: dcpf: DCPowerFlow (or None, see get_solver())
+    RETURNS:   dict (matrix name -> numpy array; empty for solvers without
+               dense matrices)
+    """
+    if isinstance(dcpf, LODFPowerFlow):
+        return {'X': dcpf.X, 'ptdf': dcpf.ptdf, 'M': dcpf.M}
+    return dict()
+
+def get_rundcpf(grid, solver='pypower'):
+    """Returns the DC power flow function (see solver_rundcpf()) of a new
+    solver for grid.
+
+    ARGUMENTS: grid: dict (representing the base PYPOWER case file),
+               solver: str (see get_solver())
+    RETURNS:   function
+    """
+    return solver_rundcpf(get_solver(grid, solver))
+
+def case_hash(ppc):
+    """Hashes the contents of a PYPOWER case file's data arrays.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+    RETURNS:   str
+    """
+    h = hashlib.sha1(repr(float(ppc['baseMVA'])).encode())
+    for key in ('bus', 'gen', 'branch'):
+        array = np.ascontiguousarray(ppc[key], dtype=float)
+        h.update(repr(array.shape).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+def copy_case(ppc):
+    """Copies the data arrays of a PYPOWER case file, sharing everything else.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+    RETURNS:   dict (representing a PYPOWER case file)
+    """
+    output = copy.copy(ppc)
+    for key in ('bus', 'gen', 'branch'):
+        output[key] = np.copy(ppc[key])
+    return output
+
+
+class BaseCaseCache(object):
+    """Least recently used cache of solved base cases, keyed by case_hash() and
+    solver name. Each entry is a dict with:
+
+        'grid':          the solved case file (do not modify; see copy_case())
+        'initial_power': total load of the case
+        'flows':         absolute branch flows of the solved case
+        'solver':        the solver object from get_solver(), which carries
+                         its cached matrices
+        'rundcpf':       the solver's power flow function (see
+                         solver_rundcpf())
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, grid, solver='pypower'):
+        """Returns the cache entry for grid, solving it on a miss.
+
+        ARGUMENTS: grid: dict (representing a PYPOWER case file),
+                   solver: str (see get_solver())
+        RETURNS:   dict (see BaseCaseCache)
+        """
+        key = (case_hash(grid), solver)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        dcpf = get_solver(grid, solver)
+        rundcpf = solver_rundcpf(dcpf)
+        solved = rundcpf(grid)[0]
+        if 'areas' in solved:
+            # area data refers to buses that islands may not have
+            del solved['areas']
+        return self.insert(key, solved, dcpf, rundcpf)
+
+    def put(self, grid, solver, solved, matrices=None):
+        """Adds the entry of a base case that was solved elsewhere (e.g. by
+        the process that placed it in shared memory, see sharedcase.py).
+
+        ARGUMENTS: grid: dict (representing a PYPOWER case file),
+                   solver: str (see get_solver()),
+                   solved: dict (grid, solved with solver),
+                   matrices: dict (see solver_matrices())
+        RETURNS:   dict (see BaseCaseCache)
+        """
+        dcpf = get_solver(grid, solver, matrices)
+        return self.insert((case_hash(grid), solver), solved, dcpf, solver_rundcpf(dcpf))
+
+    def insert(self, key, solved, dcpf, rundcpf):
+        entry = {'grid': solved,
+                 'initial_power': sum(solved['bus'][:, idx_bus.PD]),
+                 'flows': abs(solved['branch'][:, idx_brch.PF]),
+                 'solver': dcpf,
+                 'rundcpf': rundcpf}
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        """RETURNS: dict (hit and miss counters and number of entries)"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# cache shared by simulation.py and batch.py
+base_cases = BaseCaseCache()
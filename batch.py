@@ -0,0 +1,171 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+from connectivity import label_components, assign_refs, island_refs, update_slack
+from basecase import base_cases
+from rescale_power import rescale_labeled
+
+"""
+batch.py - Batched Monte Carlo cascade engine. Advances the cascades of many
+samples of the same grid together: the grids of all samples still cascading are
+stacked into one block-diagonal system, so each round takes one connected
+components search, one rescaling pass and one sparse factorization for the
+whole batch. Samples are retired as their cascades terminate.
+"""
+
+def run_batch(grid, capacities, attacks):
+    """Runs a batch of cascading failure simulations on the same grid. Gives the
+    same results as calling simulation.run_simulation() once per sample.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               capacities: numpy array (of length len(grid['branch']), or of
+                           shape (n_samples, len(grid['branch'])) for
+                           per-sample capacities),
+               attacks: numpy array (of bools, shape (n_samples,
+                        len(grid['branch'])), marking attacked lines)
+    RETURNS:   dict (containing numpy arrays system_size, power_loss and
+               cascade_length, one entry per sample)
+    """
+    attacks = np.asarray(attacks, dtype=bool)
+    n_samples, n_branch = attacks.shape
+    capacities = np.broadcast_to(capacities, attacks.shape)
+
+    # base case
+    entry = base_cases.get(grid, 'native')
+    solver = entry['solver']
+    base = entry['grid']
+    baseMVA = base['baseMVA']
+    n_bus = len(base['bus'])
+    n_gen = len(base['gen'])
+    f, t = solver.f, solver.t
+    gbus = solver.bus_lookup[base['gen'][:, idx_gen.GEN_BUS].astype(int)]
+    gen_on = base['gen'][:, idx_gen.GEN_STATUS] > 0
+    gs = base['bus'][:, idx_bus.GS]
+    initial_power = entry['initial_power']
+
+    # per-sample state (only for samples that are still cascading)
+    alive = np.arange(n_samples)
+    failed = np.zeros(attacks.shape, dtype=bool)
+    n_failed = np.zeros(n_samples, dtype=int)
+    PG = np.tile(base['gen'][:, idx_gen.PG], (n_samples, 1))
+    PD = np.tile(base['bus'][:, idx_bus.PD], (n_samples, 1))
+    bus_type = np.tile(base['bus'][:, idx_bus.BUS_TYPE], (n_samples, 1))
+    new_failed = attacks.copy()
+
+    system_size = np.ones(n_samples)
+    power_loss = np.zeros(n_samples)
+    cascade_length = np.zeros(n_samples, dtype=int)
+
+    while len(alive) > 0:
+        # retire samples whose cascades have terminated
+        done = ~new_failed.any(axis=1)
+        if done.any():
+            finished = alive[done]
+            system_size[finished] = (n_branch - n_failed[done]) / n_branch
+            power_loss[finished] = (initial_power - PD[done].sum(axis=1)) / initial_power
+            keep = ~done
+            alive = alive[keep]
+            failed, n_failed, new_failed = failed[keep], n_failed[keep], new_failed[keep]
+            PG, PD, bus_type = PG[keep], PD[keep], bus_type[keep]
+            if len(alive) == 0:
+                break
+
+        # fail lines
+        cascade_length[alive] += 1
+        n_failed += new_failed.sum(axis=1)
+        failed |= new_failed
+        n_alive = len(alive)
+        n_vertices = n_alive * n_bus
+
+        # vertex v = i * n_bus + bus row is bus row of the i-th live sample
+        sample, line = np.nonzero(~failed)
+        edge_f = sample * n_bus + f[line]
+        edge_t = sample * n_bus + t[line]
+        gen_v = (np.arange(n_alive)[:, None] * n_bus + gbus[None, :]).ravel()
+        labels = label_components(n_vertices, edge_f, edge_t)
+        n_labels = labels.max() + 1
+
+        # new slack bus for islands without one (as buses_to_ppc_subgrid)
+        types = bus_type.ravel()
+        first_vertex = assign_refs(labels, n_labels, types)
+
+        # rescale generation in every island (as rescale_power_gen)
+        PG_flat = PG.ravel()
+        PD_flat = PD.ravel()
+        rescale_labeled(PG_flat, PD_flat, labels[gen_v], labels, n_labels)
+
+        # reference bus of each island (as bustypes)
+        gen_v_on = np.tile(gen_on, n_alive)
+        on_v = gen_v[gen_v_on]
+        ref = island_refs(labels, n_labels, types, first_vertex, gen_v, gen_v_on)
+
+        # injections
+        b = solver.b[line]
+        Pfinj = b * solver.shift[line]
+        Pbus = np.bincount(on_v, weights=PG_flat[gen_v_on], minlength=n_vertices)
+        Pbus = (Pbus - PD_flat - np.tile(gs, n_alive)) / baseMVA
+        Pbus -= np.bincount(edge_f, weights=Pfinj, minlength=n_vertices)
+        Pbus += np.bincount(edge_t, weights=Pfinj, minlength=n_vertices)
+
+        # one block-diagonal DC power flow for all islands of all samples
+        nonref = np.ones(n_vertices, dtype=bool)
+        nonref[ref] = False
+        local = np.cumsum(nonref) - 1
+        keep_edge_f = nonref[edge_f]
+        keep_edge_t = nonref[edge_t]
+        rows = np.concatenate((local[edge_f][keep_edge_f], local[edge_t][keep_edge_t],
+                               local[edge_f][keep_edge_f & keep_edge_t],
+                               local[edge_t][keep_edge_f & keep_edge_t]))
+        cols = np.concatenate((local[edge_f][keep_edge_f], local[edge_t][keep_edge_t],
+                               local[edge_t][keep_edge_f & keep_edge_t],
+                               local[edge_f][keep_edge_f & keep_edge_t]))
+        vals = np.concatenate((b[keep_edge_f], b[keep_edge_t],
+                               -b[keep_edge_f & keep_edge_t], -b[keep_edge_f & keep_edge_t]))
+        n_nonref = np.count_nonzero(nonref)
+        B = sparse.csc_matrix((vals, (rows, cols)), shape=(n_nonref, n_nonref))
+        Va = np.zeros(n_vertices)
+        if n_nonref > 0:
+            Va[nonref] = splinalg.splu(B).solve(Pbus[nonref])
+
+        # line flows
+        PF = np.zeros(failed.shape)
+        PF[sample, line] = (b * (Va[edge_f] - Va[edge_t]) + Pfinj) * baseMVA
+
+        # the reference generator of each island with lines picks up the
+        # mismatch (islands without generators only adjust their dummy)
+        update_slack(labels, n_labels, ref, gen_v, gen_v_on, PG_flat, Pbus, baseMVA)
+
+        # find failed lines
+        new_failed = abs(PF) > capacities[alive]
+
+    return {"system_size": system_size,
+            "power_loss": power_loss,
+            "cascade_length": cascade_length}
+
+
+def proportional_batch(grid, a, attacks):
+    """Runs a batch of cascading failure simulations with capacities
+    proportional to initial load (i.e. C = (1+a)*L).
+
+    See run_batch() for more details.
+    """
+    capacities = base_cases.get(grid, 'native')['flows']*(1+a)
+
+    return run_batch(grid, capacities, attacks)
+
+def iid_batch(grid, dist, attacks):
+    """Runs a batch of cascading failure simulations with capacities given by
+    C = L + S, where S is drawn from a given distribution once per sample (as
+    in simulation.iid_sim()).
+
+    See run_batch() for more details.
+    """
+    load = base_cases.get(grid, 'native')['flows']
+    capacities = np.array([load + dist() for i in range(len(attacks))])
+    capacities = capacities.reshape((len(attacks), len(load)))
+
+    return run_batch(grid, capacities, attacks)
@@ -0,0 +1,217 @@
+import pypower.api as pp
+import numpy as np
+import random
+import time
+import tracemalloc
+import platform
+import json
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+import simulation
+import kernel
+import components
+import components_ig
+from basecase import base_cases, copy_case
+from rescale_power import rescale_power_gen, rescale_power_labeled
+from connectivity import ComponentTracker
+
+"""
+cascade_benchmark.py - Repeatable benchmarks of the cascade pipeline on the IEEE
+30, 57, 118 and 300 bus cases: end-to-end iid_sim()/proportional_sim() runs at
+fixed seeds and several attack fractions, the same with the flat-array cascade
+kernel, and micro-benchmarks of the graph, subgrid, recombination and rescaling
+steps. Results are written as JSON (samples/sec and tracemalloc peak memory per
+benchmark) and can be compared against a stored baseline to flag regressions
+(see USAGE).
+"""
+
+USAGE = """Usage:
+    python cascade_benchmark.py run <out.json> [samples]
+    python cascade_benchmark.py compare <baseline.json> <current.json> [tolerance]
+
+compare exits with status 1 if any benchmark regressed."""
+
+CASES = [('case30', pp.case30), ('case57', pp.case57), ('case118', pp.case118),
+         ('case300', pp.case300)]
+ATTACK_FRACTIONS = [0.02, 0.1, 0.3]
+SOLVERS = ['pypower', 'native']
+FREESPACE = 10
+ALPHA = 0.2
+
+def measure(fn, n_samples, memorySamples=None):
+    """Times n_samples calls of fn(i), then measures the peak memory allocated
+    over memorySamples calls (tracemalloc slows calls down, so it gets a
+    separate pass).
+
+    ARGUMENTS: fn: function (taking the sample index),
+               n_samples: int,
+               memorySamples: int (defaults to n_samples)
+    RETURNS:   dict (samples, seconds, samples_per_sec, peak_memory in bytes)
+    """
+    start = time.perf_counter()
+    for i in range(n_samples):
+        fn(i)
+    seconds = time.perf_counter() - start
+
+    if memorySamples is None:
+        memorySamples = n_samples
+    tracemalloc.start()
+    for i in range(memorySamples):
+        fn(i)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'samples': n_samples,
+            'seconds': seconds,
+            'samples_per_sec': n_samples / seconds if seconds > 0 else float('inf'),
+            'peak_memory': peak}
+
+def attack_sets(case, fraction, n_samples, seed):
+    """ARGUMENTS: case: dict, fraction: float, n_samples: int, seed: int
+    RETURNS:   list (of n_samples attack sets of size fraction * n_branches)
+    """
+    rng = random.Random(seed)
+    n_branches = len(case['branch'])
+    size = max(1, int(fraction * n_branches))
+    return [rng.sample(range(n_branches), size) for i in range(n_samples)]
+
+def benchmark_simulations(samples=10, seed=0):
+    """End-to-end benchmarks of iid_sim() and proportional_sim(), and of
+    kernel.iid_kernel() (with numba if it is installed). Base cases are solved
+    (and cached) before timing starts.
+
+    RETURNS: dict (benchmark name -> measure() result)
+    """
+    results = dict()
+    for name, load_case in CASES:
+        case = load_case()
+        for solver in SOLVERS:
+            base_cases.get(case, solver)
+            for fraction in ATTACK_FRACTIONS:
+                attacks = attack_sets(case, fraction, samples, seed)
+                iid = lambda i : simulation.iid_sim(case, lambda : FREESPACE, attacks[i],
+                                                    solver=solver)
+                prop = lambda i : simulation.proportional_sim(case, ALPHA, attacks[i],
+                                                              solver=solver)
+                results['iid_sim/%s/%s/%g' % (name, solver, fraction)] = \
+                    measure(iid, samples, min(samples, 3))
+                results['proportional_sim/%s/%s/%g' % (name, solver, fraction)] = \
+                    measure(prop, samples, min(samples, 3))
+        # compile (if numba is installed) before timing
+        kernel.iid_kernel(case, lambda : FREESPACE, [0])
+        for fraction in ATTACK_FRACTIONS:
+            attacks = attack_sets(case, fraction, samples, seed)
+            flat = lambda i : kernel.iid_kernel(case, lambda : FREESPACE, attacks[i])
+            results['iid_kernel/%s/%g' % (name, fraction)] = measure(flat, samples, min(samples, 3))
+    return results
+
+def benchmark_steps(repeat=50, seed=0):
+    """Micro-benchmarks of the steps of one cascade round, on each case with
+    10% of its lines failed at random.
+
+    RETURNS: dict (benchmark name -> measure() result)
+    """
+    results = dict()
+    for name, load_case in CASES:
+        case = load_case()
+        grid = copy_case(base_cases.get(case)['grid'])
+        failed = attack_sets(grid, 0.1, 1, seed)[0]
+        grid['branch'][failed, idx_brch.BR_R] = np.inf
+        grid['branch'][failed, idx_brch.BR_X] = np.inf
+        parts = components.get_components(grid)
+        largest = max(parts, key=lambda c : len(c['bus']))
+        buses = set(largest['bus'][:, idx_bus.BUS_I].astype(int))
+        tracker = ComponentTracker(grid)
+        tracker.remove_lines(failed)
+        # fresh copies for every call, since rescaling is in place
+        rescaled = iter([[copy_case(c) for c in parts] for i in range(2 * repeat)])
+        relabeled = iter([copy_case(grid) for i in range(2 * repeat)])
+
+        def rescale(i):
+            for component in next(rescaled):
+                rescale_power_gen(component)
+
+        steps = {'ppc_to_nx': lambda i : components.ppc_to_nx(grid),
+                 'ppc_to_ig': lambda i : components_ig.ppc_to_ig(grid),
+                 'buses_to_ppc_subgrid': lambda i : components.buses_to_ppc_subgrid(buses, grid),
+                 'combine_components': lambda i : components.combine_components(parts, grid),
+                 'rescale_power_gen': rescale,
+                 'rescale_power_labeled': lambda i : rescale_power_labeled(next(relabeled),
+                                                                           tracker.labels)}
+        for step, fn in steps.items():
+            results['%s/%s' % (step, name)] = measure(fn, repeat, min(repeat, 5))
+    return results
+
+def run(fname, samples=10, seed=0):
+    """Runs every benchmark and writes the results to fname as JSON.
+
+    ARGUMENTS: fname: str, samples: int (per end-to-end benchmark), seed: int
+    RETURNS:   dict (the written results)
+    """
+    results = dict()
+    results.update(benchmark_steps(seed=seed))
+    results.update(benchmark_simulations(samples=samples, seed=seed))
+    output = {'meta': {'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'samples': samples,
+                       'seed': seed,
+                       'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+              'results': results}
+    with open(fname, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    return output
+
+def compare(baseline, current, tolerance=0.1):
+    """Compares two sets of benchmark results.
+
+    ARGUMENTS: baseline, current: dict (as written by run()),
+               tolerance: float (relative slowdown or memory growth that
+                          counts as a regression)
+    RETURNS:   list of tuples (name, baseline samples/sec, current samples/sec,
+               baseline peak memory, current peak memory, regressed), for the
+               benchmarks present in both
+    """
+    rows = []
+    for name in sorted(baseline['results']):
+        if name not in current['results']:
+            continue
+        old, new = baseline['results'][name], current['results'][name]
+        regressed = (new['samples_per_sec'] < old['samples_per_sec'] * (1 - tolerance) or
+                     new['peak_memory'] > old['peak_memory'] * (1 + tolerance))
+        rows.append((name, old['samples_per_sec'], new['samples_per_sec'],
+                     old['peak_memory'], new['peak_memory'], regressed))
+    return rows
+
+def print_comparison(rows):
+    print(" %-42s %12s %12s %8s %10s %10s" % ('Benchmark', 'Base (/s)', 'Now (/s)',
+                                             'Speedup', 'Base (kB)', 'Now (kB)'))
+    for name, old, new, old_mem, new_mem, regressed in rows:
+        print(" %-42s %12.2f %12.2f %7.2fx %10.1f %10.1f%s" % (
+            name, old, new, new / old, old_mem / 1024, new_mem / 1024,
+            '  REGRESSION' if regressed else ''))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'run':
+        samples = int(sys.argv[3]) if len(sys.argv) >= 4 else 10
+        output = run(sys.argv[2], samples=samples)
+        for name, result in sorted(output['results'].items()):
+            print(" %-42s %12.2f /s %10.1f kB" % (name, result['samples_per_sec'],
+                                                  result['peak_memory'] / 1024))
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'compare':
+        tolerance = float(sys.argv[4]) if len(sys.argv) >= 5 else 0.1
+        with open(sys.argv[2]) as f:
+            baseline = json.load(f)
+        with open(sys.argv[3]) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, tolerance)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+    else:
+        print(USAGE)
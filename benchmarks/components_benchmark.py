@@ -0,0 +1,96 @@
+import pypower.api as pp
+import networkx as nx
+import numpy as np
+import random
+import time
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+import components
+import components_ig
+from connectivity import ComponentTracker
+
+"""
+components_benchmark.py - Compares connectivity.ComponentTracker against
+rebuilding the graph every round (components.py/components_ig.py) over random
+sequences of line removals.
+"""
+
+def same_partition(components1, components2):
+    """Checks that two lists of bus sets describe the same partition."""
+    return (sorted(sorted(c) for c in components1) ==
+            sorted(sorted(c) for c in components2))
+
+def benchmark_case(case, rounds=10, per_round=3, iterations=20):
+    """Times each connectivity method over iterations cascades of rounds
+    rounds, removing per_round random lines per round.
+
+    ARGUMENTS: case: dict (representing a PYPOWER case file),
+               rounds: int,
+               per_round: int,
+               iterations: int
+    RETURNS:   dict (method name -> total seconds, plus full get_components()
+               times for reference)
+    """
+    timings = {'tracker': 0., 'networkx': 0., 'igraph': 0.,
+               'get_components (nx)': 0., 'get_components (ig)': 0.}
+    n_branches = len(case['branch'])
+    bus_ids = case['bus'][:, idx_bus.BUS_I].astype(int)
+
+    for i in range(iterations):
+        grid = {key: (np.copy(value) if isinstance(value, np.ndarray) else value)
+                for key, value in case.items()}
+        order = random.sample(range(n_branches), min(n_branches, rounds * per_round))
+
+        start = time.perf_counter()
+        tracker = ComponentTracker(grid)
+        timings['tracker'] += time.perf_counter() - start
+
+        for r in range(rounds):
+            lines = order[r * per_round:(r + 1) * per_round]
+            grid['branch'][lines, idx_brch.BR_R] = np.inf
+            grid['branch'][lines, idx_brch.BR_X] = np.inf
+
+            start = time.perf_counter()
+            tracker.remove_lines(lines)
+            tracked = [set(bus_ids[rows]) for rows in tracker.components()]
+            timings['tracker'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            nx_components = list(nx.connected_components(components.ppc_to_nx(grid)))
+            timings['networkx'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            ig_components = [set(bus_ids[c]) for c in
+                             components_ig.ppc_to_ig(grid).connected_components()]
+            timings['igraph'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            components.get_components(grid)
+            timings['get_components (nx)'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            components_ig.get_components(grid)
+            timings['get_components (ig)'] += time.perf_counter() - start
+
+            assert(same_partition(tracked, nx_components))
+            assert(same_partition(tracked, ig_components))
+
+    return timings
+
+
+def runBenchmarks():
+    random.seed(0)
+    cases = [('IEEE 30 bus', pp.case30()), ('IEEE 57 bus', pp.case57()),
+             ('IEEE 118 bus', pp.case118()), ('IEEE 300 bus', pp.case300())]
+    for name, case in cases:
+        print("%s test case:" % name)
+        timings = benchmark_case(case)
+        for method, seconds in timings.items():
+            print("  %-22s %8.4f s" % (method, seconds))
+
+if __name__ == '__main__':
+    runBenchmarks()
@@ -0,0 +1,61 @@
+import subprocess
+import time
+import sys
+import os
+
+"""
+startup_benchmark.py - Cold start benchmark: the wall time from launching a
+fresh Python process to the result of its first simulation, for a case built
+by pypower (pypower.api.case300() and its base case solve) and for the same
+case loaded from the binary case store (see casestore.py), plus the time to
+just import kernel (numpy and scipy.sparse: the floor for any simulation) and
+systemsize_analysis. Every measurement is the median of several
+fresh processes.
+
+Usage:
+    python startup_benchmark.py [case] [repeat]
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCRIPTS = {
+    # numpy and scipy.sparse, which every simulation needs
+    'import kernel': "import kernel",
+    'import systemsize_analysis': "import systemsize_analysis",
+    'pypower case, first simulation': """
+import pypower.api as pp
+import kernel
+case = getattr(pp, '{case}')()
+kernel.proportional_kernel(case, 0.2, [0, 1, 2])
+""",
+    'case store, first simulation': """
+import casestore
+import kernel
+case = casestore.get_case('{case}')
+kernel.proportional_kernel(case, 0.2, [0, 1, 2])
+"""}
+
+def cold_start(script, repeat=5):
+    """RETURNS: float (median wall time in seconds of running script in a
+    new interpreter)"""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+def run(case='case300', repeat=5):
+    # build the store entry (and warm the OS file cache) before timing
+    subprocess.run([sys.executable, '-c', "import casestore; casestore.get_case('%s')" % case],
+                   cwd=ROOT, check=True)
+    results = dict()
+    for name, script in SCRIPTS.items():
+        results[name] = cold_start(script.format(case=case), repeat)
+        print(" %-36s %8.0f ms" % (name, 1000 * results[name]))
+    return results
+
+if __name__ == '__main__':
+    case = sys.argv[1] if len(sys.argv) >= 2 else 'case300'
+    repeat = int(sys.argv[2]) if len(sys.argv) >= 3 else 5
+    run(case, repeat)
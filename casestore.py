@@ -0,0 +1,229 @@
+import numpy as np
+import importlib
+import importlib.util
+import json
+import sys
+import os
+import re
+
+from basecase import base_cases, solver_matrices
+
+"""
+casestore.py - Binary store of PYPOWER cases. A case (a built-in pypower case
+such as 'case300', a MATPOWER .m file or a PYPOWER .py case file) is converted
+once into a directory of .npy files: the case's arrays, and for each solver the
+arrays of the solved base case and the solver's dense matrices (see
+basecase.solver_matrices()), plus a case.json with everything else. Loading
+memory-maps the arrays and seeds base_cases with the solved base cases, so a
+process can start simulating without building the case from source or solving
+it (and without importing pypower's case and power flow modules to do so).
+"""
+
+# format version of the store; stores of other versions are rebuilt
+STORE_VERSION = 1
+# default directory of stored cases
+CASE_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cases')
+# numbers in MATPOWER matrices
+MATPOWER_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?(?:Inf|inf|NaN|nan)')
+
+
+def parse_matpower(fname):
+    """Reads a MATPOWER case file (version 2). Numeric matrices and scalar or
+    string fields of mpc are read; cell arrays (e.g. bus_name) are skipped.
+
+    ARGUMENTS: fname: str
+    RETURNS:   dict (representing a PYPOWER case file)
+    """
+    with open(fname) as f:
+        text = f.read()
+    # comments run from % to the end of the line
+    text = re.sub(r'%[^\n]*', '', text)
+    match = re.search(r'function\s+(\w+)\s*=\s*\w+', text)
+    name = match.group(1) if match is not None else 'mpc'
+
+    ppc = dict()
+    field = re.compile(r'\b%s\.(\w+)\s*=\s*(\[.*?\]|\{.*?\}|[^;\n]*)\s*;?' % re.escape(name),
+                       re.DOTALL)
+    for key, value in field.findall(text):
+        value = value.strip()
+        if value.startswith('{'):
+            continue
+        if value.startswith('['):
+            rows = [row for row in re.split(r'[;\n]', value[1:-1]) if row.strip()]
+            matrix = [[float(x) for x in MATPOWER_NUMBER.findall(row)] for row in rows]
+            matrix = [row for row in matrix if len(row) > 0]
+            if len(set(len(row) for row in matrix)) > 1:
+                raise ValueError("rows of mpc.%s in %s differ in length" % (key, fname))
+            ppc[key] = np.array(matrix, dtype=float)
+        elif value[:1] in ('"', "'"):
+            ppc[key] = value[1:-1]
+        else:
+            ppc[key] = float(value)
+    for key in ('baseMVA', 'bus', 'gen', 'branch'):
+        if key not in ppc:
+            raise ValueError("%s does not define mpc.%s" % (fname, key))
+    return ppc
+
+def load_source(source):
+    """Builds a case from a built-in pypower case name, a MATPOWER .m file or
+    a PYPOWER .py case file (whose case function has the file's name).
+
+    ARGUMENTS: source: str
+    RETURNS:   dict (representing a PYPOWER case file)
+    """
+    name, ext = os.path.splitext(os.path.basename(source))
+    if ext == '.m':
+        return parse_matpower(source)
+    elif ext == '.py':
+        spec = importlib.util.spec_from_file_location(name, source)
+        module = importlib.util.module_from_spec(spec)
+        # pypower.savecase writes case files that use these without importing
+        # them (pypower.loadcase runs them where they are defined)
+        module.__dict__.update(array=np.array, inf=np.inf, nan=np.nan)
+        spec.loader.exec_module(module)
+        return getattr(module, name)()
+    elif ext == '' and not os.path.exists(source):
+        return getattr(importlib.import_module('pypower.' + source), source)()
+    raise ValueError("unknown case source '%s'" % source)
+
+def _split(ppc):
+    """Splits a case file into its numpy arrays and its other (JSON) entries;
+    entries that are neither (e.g. pypower's 'order') are dropped.
+    """
+    arrays = {key: value for key, value in ppc.items() if isinstance(value, np.ndarray)}
+    other = dict()
+    for key, value in ppc.items():
+        if key in arrays:
+            continue
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        other[key] = value
+    return (arrays, other)
+
+def save_case(case, path, solvers=('native',), source=None):
+    """Solves a case with each solver (through base_cases) and writes it to a
+    store directory.
+
+    ARGUMENTS: case: dict (representing a PYPOWER case file),
+               path: str (directory; created if needed, replaced entries are
+                     overwritten),
+               solvers: list (of solver names, see basecase.get_solver()),
+               source: str (where the case came from, see stale())
+    """
+    os.makedirs(path, exist_ok=True)
+    if 'areas' in case:
+        del case['areas']
+    arrays, other = _split(case)
+    meta = {'version': STORE_VERSION, 'source': source, 'other': other,
+            'arrays': sorted(arrays), 'solvers': dict()}
+    files = {key + '.npy': array for key, array in arrays.items()}
+    for solver in solvers:
+        base = base_cases.get(case, solver)
+        solved_arrays, solved_other = _split(base['grid'])
+        matrices = solver_matrices(base['solver'])
+        meta['solvers'][solver] = {'other': solved_other, 'arrays': sorted(solved_arrays),
+                                   'matrices': sorted(matrices)}
+        files.update({'%s-%s.npy' % (solver, key): array
+                      for key, array in solved_arrays.items()})
+        files.update({'%s-matrix-%s.npy' % (solver, key): matrix
+                      for key, matrix in matrices.items()})
+    for fname, array in files.items():
+        # replace rather than overwrite files, which may be memory-mapped (even
+        # as the arrays being saved)
+        fname = os.path.join(path, fname)
+        with open(fname + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(fname + '.tmp', fname)
+    # case.json goes last, so an interrupted save is not loaded
+    tmp = os.path.join(path, 'case.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(path, 'case.json'))
+
+def load_case(path, mmap=True):
+    """Loads a case from a store directory, and adds its solved base cases to
+    base_cases. With mmap, the case's (and base_cases') arrays are read-only
+    memory maps of the store's files.
+
+    ARGUMENTS: path: str (directory written by save_case()),
+               mmap: bool
+    RETURNS:   dict (representing a PYPOWER case file)
+    """
+    with open(os.path.join(path, 'case.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != STORE_VERSION:
+        raise ValueError("%s is a case store of version %s, not %s"
+                         % (path, meta['version'], STORE_VERSION))
+    mode = 'r' if mmap else None
+    load = lambda fname : np.load(os.path.join(path, fname + '.npy'), mmap_mode=mode)
+    case = dict(meta['other'])
+    case.update({key: load(key) for key in meta['arrays']})
+    for solver, entry in meta['solvers'].items():
+        solved = dict(entry['other'])
+        solved.update({key: load('%s-%s' % (solver, key)) for key in entry['arrays']})
+        matrices = {key: load('%s-matrix-%s' % (solver, key)) for key in entry['matrices']}
+        base_cases.put(case, solver, solved, matrices or None)
+    return case
+
+def read_meta(path):
+    """RETURNS: dict (the case.json of a store directory, or None if it has
+    none)"""
+    fname = os.path.join(path, 'case.json')
+    if not os.path.exists(fname):
+        return None
+    with open(fname) as f:
+        return json.load(f)
+
+def stale(path, source=None, solvers=('native',)):
+    """Checks whether a store directory needs to be (re)built: it is missing,
+    of another format version, lacks a solver, was converted from another
+    source, or is older than its source file.
+
+    ARGUMENTS: path: str,
+               source: str (case source, see load_source()),
+               solvers: list (of solver names)
+    RETURNS:   bool
+    """
+    meta = read_meta(path)
+    if meta is None or meta['version'] != STORE_VERSION:
+        return True
+    if not set(solvers) <= set(meta['solvers']):
+        return True
+    if source is not None:
+        if meta['source'] != source:
+            return True
+        if os.path.exists(source):
+            return os.path.getmtime(source) > os.path.getmtime(os.path.join(path, 'case.json'))
+    return False
+
+def get_case(source, solvers=('native',), storeDir=CASE_STORE, mmap=True):
+    """Loads a case through the store, converting it first if needed.
+
+    ARGUMENTS: source: str (built-in pypower case name, e.g. 'case300', or
+                       the path of a .m or .py case file),
+               solvers: list (of solver names whose base cases are stored;
+                        a rebuilt store keeps the solvers it had),
+               storeDir: str (directory of the store),
+               mmap: bool (see load_case())
+    RETURNS:   dict (representing a PYPOWER case file)
+    """
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(storeDir, name)
+    if stale(path, source, solvers):
+        meta = read_meta(path)
+        if meta is not None and meta['version'] == STORE_VERSION and meta['source'] == source:
+            solvers = sorted(set(solvers) | set(meta['solvers']))
+        save_case(load_source(source), path, solvers, source=source)
+    return load_case(path, mmap)
+
+def main(argv):
+    """Converts cases into the store: casestore.py <case> [<case> ...]"""
+    for source in argv:
+        path = os.path.join(CASE_STORE, os.path.splitext(os.path.basename(source))[0])
+        save_case(load_source(source), path, ('native', 'pypower'), source=source)
+        print("%s -> %s" % (source, path))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
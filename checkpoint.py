@@ -0,0 +1,160 @@
+import pickle
+import random
+import signal
+import os
+from contextlib import contextmanager
+
+"""
+checkpoint.py - Checkpoints for resumable system size sweeps. After each
+completed (case, attack size) block, the block's output, the state of the
+random module, any sampler state and the number of result store rows are
+written to a pickle file (atomically, through a temporary file and os.replace).
+A sweep restarted with the same checkpoint file skips the completed blocks and
+restores the random state before running the next one, so it draws the same
+attack sets as an uninterrupted run. Each case's blocks are stored with a
+fingerprint of the sweep's parameters, and resuming a case with different
+parameters raises a CheckpointMismatch rather than reusing its blocks.
+"""
+
+class SweepInterrupted(Exception):
+    """Raised when a sweep is stopped by SIGINT or SIGTERM. Every block
+    completed before the signal is in the checkpoint."""
+    pass
+
+
+class CheckpointMismatch(ValueError):
+    """Raised when a checkpoint's blocks for a case were computed with other
+    sweep parameters than those of the sweep resuming it."""
+    pass
+
+
+class SweepCheckpoint(object):
+    def __init__(self, path):
+        """Opens a checkpoint file, loading it if it exists.
+
+        ARGUMENTS: path: str
+        """
+        self.path = path
+        self.blocks = dict()
+        self.fingerprints = dict()
+        self.rng_state = None
+        self.sampler_states = dict()
+        self.store_rows = None
+        self.restored = False
+        self.saving = False
+        self.pending_signal = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            self.blocks = state['blocks']
+            self.fingerprints = state.get('fingerprints', dict())
+            self.rng_state = state['rng_state']
+            self.sampler_states = state['sampler_states']
+            self.store_rows = state['store_rows']
+
+    def check(self, caseName, fingerprint):
+        """Checks that the blocks checkpointed for a case were computed with the
+        given sweep parameters, and records them for the blocks to come.
+
+        ARGUMENTS: caseName: str,
+                   fingerprint: dict (of the sweep's parameters, see
+                                systemsize_analysis.sweep_fingerprint())
+        """
+        has_blocks = any(name == caseName for name, attack_size in self.blocks)
+        if has_blocks and self.fingerprints.get(caseName) != fingerprint:
+            raise CheckpointMismatch("%s holds blocks of %s from a sweep with other parameters "
+                                     "(checkpointed %s, now %s); remove it to start over"
+                                     % (self.path, caseName, self.fingerprints.get(caseName),
+                                        fingerprint))
+        self.fingerprints[caseName] = fingerprint
+
+    def completed(self, caseName, attack_size):
+        """RETURNS: dict (the block's output, see equal_freespace()), or None if
+        the block has not been completed"""
+        return self.blocks.get((caseName, attack_size))
+
+    def resume(self, sampler=None, caseName=None, store=None):
+        """Prepares to run the first block that is not in the checkpoint:
+        restores the random state, the sampler's state and the result store
+        (dropping rows appended after the last checkpoint). Only acts once
+        per checkpoint object, and only if blocks were completed before.
+
+        ARGUMENTS: sampler: sampling sampler object,
+                   caseName: str,
+                   store: resultstore.ResultStore
+        """
+        if sampler is not None and caseName in self.sampler_states:
+            for key, value in self.sampler_states[caseName].items():
+                setattr(sampler, key, value)
+        if self.restored:
+            return
+        self.restored = True
+        if self.rng_state is not None:
+            random.setstate(self.rng_state)
+        if store is not None and self.store_rows is not None:
+            store.truncate(self.store_rows)
+
+    def save(self, caseName, attack_size, block, sampler=None, store=None):
+        """Records a completed block.
+
+        ARGUMENTS: caseName: str,
+                   attack_size: int,
+                   block: dict (the block's output),
+                   sampler: sampling sampler object (its attributes, other than
+                            its RNG, are saved),
+                   store: resultstore.ResultStore (flushed, so the rows the
+                          checkpoint counts are on disk)
+        """
+        self.saving = True
+        try:
+            self.blocks[(caseName, attack_size)] = block
+            self.rng_state = random.getstate()
+            if sampler is not None:
+                self.sampler_states[caseName] = {key: value for key, value in
+                                                 vars(sampler).items() if key != 'rng'}
+            if store is not None:
+                store.flush()
+                self.store_rows = len(store)
+            self.restored = True
+            state = {'blocks': self.blocks,
+                     'fingerprints': self.fingerprints,
+                     'rng_state': self.rng_state,
+                     'sampler_states': self.sampler_states,
+                     'store_rows': self.store_rows}
+            tmp = self.path + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(state, f)
+            os.replace(tmp, self.path)
+        finally:
+            self.saving = False
+        if self.pending_signal is not None:
+            self.raise_interrupt(self.pending_signal)
+
+    def remove(self):
+        """Deletes the checkpoint file, e.g. once the sweep's output is written."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def raise_interrupt(self, signum):
+        raise SweepInterrupted("sweep interrupted by signal %d; completed blocks are "
+                               "checkpointed in %s" % (signum, self.path))
+
+    def handle_signal(self, signum, frame):
+        if self.saving:
+            # let the checkpoint finish writing first
+            self.pending_signal = signum
+        else:
+            self.raise_interrupt(signum)
+
+    @contextmanager
+    def handle_signals(self):
+        """Context manager that turns SIGINT and SIGTERM into SweepInterrupted,
+        deferred until any checkpoint being written is complete.
+        """
+        previous = {signum: signal.signal(signum, self.handle_signal)
+                    for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            yield self
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
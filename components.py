@@ -1,5 +1,3 @@
-import pypower.api as pp
-import networkx as nx
 import numpy as np
 import copy
 
@@ -7,6 +5,8 @@ import pypower.idx_brch as idx_brch
 import pypower.idx_bus as idx_bus
 import pypower.idx_gen as idx_gen
 
+from backends import component_labels
+
 """
 components.py - Helper functions for dealing with the connected components of a
 disconnected power system
@@ -25,6 +25,7 @@ def ppc_to_nx(ppc, includeInactive=False, includeReactance=False):
                includeReactance: bool
     RETURNS:   NetworkX Graph
     """
+    import networkx as nx
     G = nx.Graph()
     G.add_nodes_from(ppc['bus'][:, idx_bus.BUS_I].astype(int))
     if includeInactive:
@@ -44,38 +45,96 @@ def ppc_to_nx(ppc, includeInactive=False, includeReactance=False):
 
     return G
 
+class IslandCase(dict):
+    """A PYPOWER case file for one island of a larger grid. Besides the usual
+    case file entries, it keeps the rows of the larger grid's bus, gen and
+    branch arrays that its own rows were taken from (bus_idx, gen_idx and
+    branch_idx), so that it can be written back with fancy indexing instead of
+    searching for matching rows. If the island has no generators, its gen array
+    holds a dummy generator that has no row in gen_idx.
+    """
+
+    def __init__(self, ppc, bus_idx, gen_idx, branch_idx):
+        """ARGUMENTS: ppc: dict (representing the larger PYPOWER case file),
+                      bus_idx, gen_idx, branch_idx: numpy arrays (of row indices)
+        """
+        dict.__init__(self, ((key, value) for key, value in ppc.items()
+                             if key not in ('bus', 'gen', 'branch')))
+        self.bus_idx = bus_idx
+        self.gen_idx = gen_idx
+        self.branch_idx = branch_idx
+
+        self['bus'] = ppc['bus'][bus_idx]
+        if idx_bus.REF not in self['bus'][:, idx_bus.BUS_TYPE]:
+            # set new slack bus if needed
+            self['bus'][0, idx_bus.BUS_TYPE] = idx_bus.REF
+
+        self['gen'] = ppc['gen'][gen_idx]
+        if len(gen_idx) == 0:
+            # create a dummy generator if there are no generators
+            self['gen'] = np.zeros((1, ppc['gen'].shape[1]))
+            newGenMask = [idx_gen.GEN_BUS, idx_gen.VG, idx_gen.MBASE, idx_gen.GEN_STATUS]
+            newGenVals = np.array([self['bus'][0, idx_bus.BUS_I], 1, 100, 1])
+            self['gen'][0, newGenMask] = newGenVals
+
+        self['branch'] = ppc['branch'][branch_idx]
+
+
 def buses_to_ppc_subgrid(buses, ppc):
     """Given a set of buses, reduces a PYPOWER case file to the grid only
     consisting of the buses in the bus set.
 
     ARGUMENTS: buses: iterable (of bus ID's),
                ppc: dict (representing a PYPOWER case file)
-    RETURNS:   dict (representing a PYPOWER case file)
+    RETURNS:   IslandCase (representing a PYPOWER case file)
+    """
+    buses = np.array(list(buses))
+    bus_idx = np.flatnonzero(np.isin(ppc['bus'][:, idx_bus.BUS_I], buses))
+    gen_idx = np.flatnonzero(np.isin(ppc['gen'][:, idx_gen.GEN_BUS], buses))
+    branch_idx = np.flatnonzero(np.isin(ppc['branch'][:, idx_brch.F_BUS], buses) &
+                                np.isin(ppc['branch'][:, idx_brch.T_BUS], buses))
+    return IslandCase(ppc, bus_idx, gen_idx, branch_idx)
+
+def group_by_label(labels, n_labels):
+    """Groups the indices of an array of integer labels by label.
+
+    ARGUMENTS: labels: numpy array (of ints; negative labels are dropped),
+               n_labels: int
+    RETURNS:   list of numpy arrays (of indices, one for each label from 0 to
+               n_labels - 1)
     """
-    new_ppc = copy.deepcopy(ppc)
-
-    # remove buses not in bus set
-    busInSet = lambda bus : bus[idx_bus.BUS_I] in buses
-    new_ppc['bus'] = np.array(list(filter(busInSet, ppc['bus'])))
-    if idx_bus.REF not in new_ppc['bus'][:,idx_bus.BUS_TYPE]:
-        # set new slack bus if needed
-        new_ppc['bus'][0, idx_bus.BUS_TYPE] = idx_bus.REF
-
-    # remove generators not in bus set
-    genInSet = lambda gen : gen[idx_gen.GEN_BUS] in buses
-    new_ppc['gen'] = np.array(list(filter(genInSet, ppc['gen'])))
-    if len(new_ppc['gen']) == 0:
-        # create a dummy generator if there are no generators
-        new_ppc['gen'] = np.zeros((1,21))
-        newGenMask = [idx_gen.GEN_BUS, idx_gen.VG, idx_gen.MBASE, idx_gen.GEN_STATUS]
-        newGenVals = np.array([new_ppc['bus'][0, idx_bus.BUS_I], 1, 100, 1])
-        new_ppc['gen'][0, newGenMask] = newGenVals
-        
-    # remove lines not in bus set
-    lineInSet = lambda line: line[idx_brch.F_BUS] in buses and line[idx_brch.T_BUS] in buses
-    new_ppc['branch'] = np.array(list(filter(lineInSet, ppc['branch'])))
-
-    return new_ppc
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(n_labels + 1))
+    return [order[bounds[i]:bounds[i+1]] for i in range(n_labels)]
+
+def labels_to_ppc_components(labels, ppc):
+    """Splits a PYPOWER case file into its connected components given the
+    component label of each bus (e.g. as kept by
+    connectivity.ComponentTracker). Takes a single pass over the case data, no
+    matter how many components there are.
+
+    ARGUMENTS: labels: numpy array (of component labels, one per bus row),
+               ppc: dict (representing a PYPOWER case file)
+    RETURNS:   list of IslandCases (representing PYPOWER case files), ordered
+               by label
+    """
+    labels = np.unique(labels, return_inverse=True)[1].ravel()
+    bus_ids = ppc['bus'][:, idx_bus.BUS_I].astype(int)
+    bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+    bus_lookup[bus_ids] = np.arange(len(bus_ids))
+
+    gen_labels = labels[bus_lookup[ppc['gen'][:, idx_gen.GEN_BUS].astype(int)]]
+    f_labels = labels[bus_lookup[ppc['branch'][:, idx_brch.F_BUS].astype(int)]]
+    t_labels = labels[bus_lookup[ppc['branch'][:, idx_brch.T_BUS].astype(int)]]
+    branch_labels = np.where(f_labels == t_labels, f_labels, -1)
+
+    n_labels = labels.max() + 1 if len(labels) > 0 else 0
+    bus_groups = group_by_label(labels, n_labels)
+    gen_groups = group_by_label(gen_labels, n_labels)
+    branch_groups = group_by_label(branch_labels, n_labels)
+
+    return [IslandCase(ppc, bus_groups[i], gen_groups[i], branch_groups[i])
+            for i in range(n_labels)]
 
 def nx_to_ppc_components(graph, ppc):
     """Helper function for get_components. Uses the NetworkX Graph representation
@@ -83,20 +142,30 @@ def nx_to_ppc_components(graph, ppc):
 
     ARGUMENTS: graph: networkx.Graph,
                ppc: dict (representing a PYPOWER case file)
-    RETURNS:   list of dicts (representing PYPOWER case files)
+    RETURNS:   list of IslandCases (representing PYPOWER case files)
     """
-    return [buses_to_ppc_subgrid(component, ppc) for component in nx.connected_components(graph)]
+    import networkx as nx
+    bus_ids = ppc['bus'][:, idx_bus.BUS_I].astype(int)
+    bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+    bus_lookup[bus_ids] = np.arange(len(bus_ids))
+    labels = np.zeros(len(bus_ids), dtype=int)
+    for label, component in enumerate(nx.connected_components(graph)):
+        labels[bus_lookup[list(component)]] = label
+    return labels_to_ppc_components(labels, ppc)
 
 ## END HELPER FUNCTIONS
 
-def get_components(ppc):
+def get_components(ppc, backend=None):
     """Splits a PYPOWER case file into case files for each of its connected 
-    components. A nice wrapper function for nx_to_ppc_components().
+    components.
 
-    ARGUMENTS: ppc: dict (representing a PYPOWER case file)
-    RETURNS:   list of dicts (representing PYPOWER case files)
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file),
+               backend: str (graph backend, see backends.py; defaults to
+                        backends.get_default_backend())
+    RETURNS:   list of dicts (representing PYPOWER case files), in order of
+               their first bus
     """
-    return nx_to_ppc_components(ppc_to_nx(ppc), ppc)
+    return labels_to_ppc_components(component_labels(ppc, backend), ppc)
 
 
 def combine_components(components, original):
@@ -107,32 +176,42 @@ def combine_components(components, original):
                original: dict (representing a PYPOWER case file)
     RETURNS:   dict (representing a PYPOWER case file)
     """
-    output = copy.deepcopy(original)
-    for component in components:
-        # update bus data
-        buses = set(component['bus'][:,0])
-        busInComp = lambda bus : bus[idx_bus.BUS_I] in buses
-        bus_mask = np.apply_along_axis(busInComp, 1, original['bus'])
-        output['bus'][bus_mask] = component['bus']
-
-        # update generator data
-        genInComp = lambda gen : gen[idx_gen.GEN_BUS] in buses
-        gen_mask = np.apply_along_axis(genInComp, 1, original['gen'])
-        output['gen'][gen_mask] = component['gen']
-
-        # update line data
-        lineInComp = lambda line : ((line[idx_brch.F_BUS] in buses)
-                                     and (line[idx_brch.T_BUS] in buses))
-        line_mask = np.apply_along_axis(lineInComp, 1, original['branch'])
-
-        if len(component['branch']) > 0:
-            # only save if there's something to save
-            output['branch'][line_mask] = component['branch']
+    output = copy.copy(original)
+    output['bus'] = np.copy(original['bus'])
+    output['gen'] = np.copy(original['gen'])
+    output['branch'] = np.copy(original['branch'])
+
+    if all(isinstance(component, IslandCase) for component in components):
+        # scatter every component's rows back in one go (dropping any dummy
+        # generators, which come after the component's real generators)
+        if len(components) > 0:
+            output['bus'][np.concatenate([c.bus_idx for c in components])] = \
+                np.vstack([c['bus'] for c in components])
+            output['gen'][np.concatenate([c.gen_idx for c in components])] = \
+                np.vstack([c['gen'][:len(c.gen_idx)] for c in components])
+            output['branch'][np.concatenate([c.branch_idx for c in components])] = \
+                np.vstack([c['branch'] for c in components])
+    else:
+        for component in components:
+            # update bus data
+            buses = component['bus'][:, idx_bus.BUS_I]
+            bus_mask = np.isin(original['bus'][:, idx_bus.BUS_I], buses)
+            output['bus'][bus_mask] = component['bus']
+
+            # update generator data
+            gen_mask = np.isin(original['gen'][:, idx_gen.GEN_BUS], buses)
+            output['gen'][gen_mask] = component['gen'][:np.count_nonzero(gen_mask)]
+
+            # update line data
+            line_mask = (np.isin(original['branch'][:, idx_brch.F_BUS], buses) &
+                         np.isin(original['branch'][:, idx_brch.T_BUS], buses))
+            if len(component['branch']) > 0:
+                # only save if there's something to save
+                output['branch'][line_mask] = component['branch']
 
     # ensure no power flowing through failed lines
-    isFailed = lambda branch : branch[idx_brch.BR_X] == np.inf
-    failed_line_mask = np.apply_along_axis(isFailed, 1, output['branch'])
+    failed_line_mask = output['branch'][:, idx_brch.BR_X] == np.inf
     output['branch'][failed_line_mask, idx_brch.PF] = 0
-    output['branch'][failed_line_mask, idx_brch.PT] = 0    
+    output['branch'][failed_line_mask, idx_brch.PT] = 0
 
     return output
@@ -0,0 +1,158 @@
+import numpy as np
+import scipy.sparse as sparse
+from scipy.sparse.csgraph import connected_components
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+"""
+connectivity.py - Incremental tracking of the connected components of a power
+grid as its lines fail over the course of a cascade.
+"""
+
+def label_components(n, f, t):
+    """Labels the connected components of the graph on n vertices with edges
+    (f[i], t[i]).
+
+    ARGUMENTS: n: int,
+               f, t: numpy arrays (of edge endpoints)
+    RETURNS:   numpy array (of component labels, one per vertex)
+    """
+    # build the CSR arrays directly, which avoids most of scipy's format
+    # conversion overhead on small graphs
+    order = np.argsort(f, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(f, minlength=n), out=indptr[1:])
+    graph = sparse.csr_matrix((np.ones(len(f)), t[order].astype(np.int32), indptr),
+                              shape=(n, n))
+    return connected_components(graph, directed=True, connection='weak')[1]
+
+def assign_refs(labels, n_labels, types):
+    """Makes the first bus of every island without a REF bus a REF bus (as
+    buses_to_ppc_subgrid()).
+
+    ARGUMENTS: labels: numpy array (of island labels, one per bus),
+               n_labels: int,
+               types: numpy array (of bus types, modified in place)
+    RETURNS:   numpy array (of the first bus of each island)
+    """
+    first_bus = np.unique(labels, return_index=True)[1]
+    has_ref = np.bincount(labels, weights=(types == idx_bus.REF), minlength=n_labels) > 0
+    types[first_bus[~has_ref]] = idx_bus.REF
+    return first_bus
+
+def island_refs(labels, n_labels, types, first_bus, gbus, gen_on):
+    """Picks the reference bus of each island as pypower's bustypes() does:
+    the first REF bus with a generator, else the first PV bus with one, else
+    the first PQ bus with one. Islands without generators are treated as
+    having a dummy generator at their first bus.
+
+    ARGUMENTS: labels: numpy array (of island labels, one per bus),
+               n_labels: int,
+               types: numpy array (of bus types),
+               first_bus: numpy array (from assign_refs()),
+               gbus: numpy array (of the bus of every generator),
+               gen_on: numpy array (of bools, generators in service)
+    RETURNS:   numpy array (of the reference bus of each island)
+    """
+    n_bus = len(labels)
+    has_gen = np.zeros(n_bus, dtype=bool)
+    has_gen[gbus[gen_on]] = True
+    island_has_gen = np.bincount(labels[gbus], minlength=n_labels) > 0
+    has_gen[first_bus[~island_has_gen]] = True
+    rank = np.where(has_gen, np.where(types == idx_bus.REF, 0,
+                                      np.where(types == idx_bus.PV, 1, 2)), 3)
+    best = np.full(n_labels, 4 * n_bus)
+    np.minimum.at(best, labels, rank * n_bus + np.arange(n_bus))
+    return best % n_bus
+
+def update_slack(labels, n_labels, ref, gbus, gen_on, PG, Pbus, baseMVA):
+    """Has the first in-service generator at the reference bus of each island
+    with lines pick up the island's power mismatch.
+
+    ARGUMENTS: labels: numpy array (of island labels, one per bus),
+               n_labels: int,
+               ref: numpy array (from island_refs()),
+               gbus: numpy array (of the bus of every generator),
+               gen_on: numpy array (of bools, generators in service),
+               PG: numpy array (of generation, modified in place),
+               Pbus: numpy array (of per unit bus injections),
+               baseMVA: float
+    """
+    mismatch = -np.bincount(labels, weights=Pbus, minlength=n_labels) * baseMVA
+    size = np.bincount(labels, minlength=n_labels)
+    is_ref = np.zeros(len(labels), dtype=bool)
+    is_ref[ref[size > 1]] = True
+    ref_gens = np.flatnonzero(is_ref[gbus] & gen_on)
+    ref_gens = ref_gens[np.unique(gbus[ref_gens], return_index=True)[1]]
+    PG[ref_gens] += mismatch[labels[gbus[ref_gens]]]
+
+
+class ComponentTracker(object):
+    """Keeps per-bus component labels for a grid, built once per simulation.
+    When lines are removed, only the components that lost a line are
+    relabeled.
+    """
+
+    def __init__(self, ppc):
+        """ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+        """
+        bus_ids = ppc['bus'][:, idx_bus.BUS_I].astype(int)
+        bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+        bus_lookup[bus_ids] = np.arange(len(bus_ids))
+        self.f = bus_lookup[ppc['branch'][:, idx_brch.F_BUS].astype(int)]
+        self.t = bus_lookup[ppc['branch'][:, idx_brch.T_BUS].astype(int)]
+        self.active = ppc['branch'][:, idx_brch.BR_X] != np.inf
+
+        self.labels = label_components(len(bus_ids), self.f[self.active],
+                                       self.t[self.active])
+        self.n_labels = self.labels.max() + 1 if len(bus_ids) > 0 else 0
+
+    def remove_lines(self, lines):
+        """Removes lines from the grid and relabels the components they were
+        in. A component that splits keeps its label for one of its pieces and
+        the other pieces get new labels.
+
+        ARGUMENTS: lines: iterable (of line indices)
+        RETURNS:   dict (mapping the label of each component that split to the
+                   list of labels of its pieces)
+        """
+        lines = np.asarray(lines, dtype=int)
+        lines = lines[self.active[lines]]
+        self.active[lines] = False
+        if len(lines) == 0:
+            return dict()
+
+        # relabel all components that lost a line with one search
+        affected = np.unique(self.labels[self.f[lines]])
+        in_affected = np.isin(self.labels, affected)
+        buses = np.flatnonzero(in_affected)
+        local = -np.ones(len(self.labels), dtype=int)
+        local[buses] = np.arange(len(buses))
+        edges = np.flatnonzero(self.active & in_affected[self.f])
+        sub_labels = label_components(len(buses), local[self.f[edges]],
+                                      local[self.t[edges]])
+
+        splits = dict()
+        old_labels = self.labels[buses]
+        for label in affected:
+            pieces = np.unique(sub_labels[old_labels == label])
+            if len(pieces) == 1:
+                continue
+            new_labels = np.concatenate(([label], self.n_labels + np.arange(len(pieces) - 1)))
+            relabel = np.zeros(sub_labels.max() + 1, dtype=int)
+            relabel[pieces] = new_labels
+            piece_buses = buses[old_labels == label]
+            self.labels[piece_buses] = relabel[sub_labels[old_labels == label]]
+            self.n_labels += len(pieces) - 1
+            splits[int(label)] = [int(l) for l in new_labels]
+        return splits
+
+    def components(self):
+        """Returns the bus rows of each component, ordered by label.
+
+        RETURNS: list of numpy arrays (of bus row indices)
+        """
+        order = np.argsort(self.labels, kind='stable')
+        boundaries = np.flatnonzero(np.diff(self.labels[order])) + 1
+        return np.split(order, boundaries)
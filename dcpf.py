@@ -0,0 +1,222 @@
+import numpy as np
+import copy
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+from collections import OrderedDict
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+"""
+dcpf.py - Native DC power flow solver. The susceptance matrix of a base grid is
+built and factorized once, and islands of that grid are solved from reduced
+index sets into the base bus/branch arrays instead of going through
+pypower.rundcpf (which rebuilds and refactorizes everything on every call).
+"""
+
+def reference_buses(bus, gbus):
+    """Chooses the reference bus(es) of a case file the same way that
+    pypower.bustypes does: REF buses with an in-service generator, or failing
+    that the first PV bus with an in-service generator.
+
+    ARGUMENTS: bus: numpy array (PYPOWER bus data),
+               gbus: numpy array (of bus rows with in-service generators)
+    RETURNS:   numpy array (of bus rows)
+    """
+    has_gen = np.zeros(len(bus), dtype=bool)
+    has_gen[gbus] = True
+    bus_type = bus[:, idx_bus.BUS_TYPE]
+    ref = np.flatnonzero((bus_type == idx_bus.REF) & has_gen)
+    if len(ref) == 0:
+        ref = np.flatnonzero((bus_type == idx_bus.PV) & has_gen)[:1]
+    if len(ref) == 0:
+        # pypower fails here; fall back to any bus with generation
+        ref = np.flatnonzero(has_gen)[:1] if has_gen.any() else np.zeros(1, dtype=int)
+    return ref
+
+
+class DCPowerFlow(object):
+    """DC power flow solver bound to a base PYPOWER case. Branch endpoints,
+    susceptances and phase shift injections are computed once from the base
+    case, and factorizations of reduced B matrices are cached by topology so
+    that islands whose topology did not change are not refactorized.
+    """
+
+    def __init__(self, ppc, maxCached=256):
+        """ARGUMENTS: ppc: dict (representing the base PYPOWER case file)
+                      maxCached: int (number of factorizations to keep)
+        """
+        bus = ppc['bus']
+        branch = ppc['branch']
+        self.baseMVA = ppc['baseMVA']
+        self.n_bus = len(bus)
+        self.n_branch = len(branch)
+
+        # lookup table from bus ID to row of the base bus array
+        bus_ids = bus[:, idx_bus.BUS_I].astype(int)
+        self.bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+        self.bus_lookup[bus_ids] = np.arange(self.n_bus)
+
+        # per-branch data, as in pypower.makeBdc
+        self.f = self.bus_lookup[branch[:, idx_brch.F_BUS].astype(int)]
+        self.t = self.bus_lookup[branch[:, idx_brch.T_BUS].astype(int)]
+        tap = np.where(branch[:, idx_brch.TAP] != 0, branch[:, idx_brch.TAP], 1.)
+        self.b = branch[:, idx_brch.BR_STATUS] / branch[:, idx_brch.BR_X] / tap
+        self.shift = -branch[:, idx_brch.SHIFT] * np.pi / 180
+
+        # base case susceptance matrix
+        self.Bbus = self.make_Bbus(np.arange(self.n_bus), np.arange(self.n_branch),
+                                   self.b)
+
+        self.maxCached = maxCached
+        self.factors = OrderedDict()
+
+    def make_Bbus(self, bus_rows, branch_rows, b):
+        """Builds the bus susceptance matrix of the subgrid consisting of the
+        given base bus and branch rows, with branch susceptances b.
+
+        ARGUMENTS: bus_rows: numpy array (of base bus row indices),
+                   branch_rows: numpy array (of base branch row indices),
+                   b: numpy array (of susceptances, one per branch row)
+        RETURNS:   scipy.sparse.csc_matrix
+        """
+        n = len(bus_rows)
+        local = -np.ones(self.n_bus, dtype=int)
+        local[bus_rows] = np.arange(n)
+        f = local[self.f[branch_rows]]
+        t = local[self.t[branch_rows]]
+        rows = np.concatenate((f, t, f, t))
+        cols = np.concatenate((f, t, t, f))
+        vals = np.concatenate((b, b, -b, -b))
+        return sparse.csc_matrix((vals, (rows, cols)), shape=(n, n))
+
+    def island_rows(self, ppc):
+        """Finds the base bus and branch rows of a case file that is an island
+        (or the whole) of the base grid. Uses the index arrays attached to the
+        case file if it has them.
+
+        ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+        RETURNS:   tuple of numpy arrays (bus rows, branch rows)
+        """
+        if getattr(ppc, 'bus_idx', None) is not None:
+            return (ppc.bus_idx, ppc.branch_idx)
+
+        bus_rows = self.bus_lookup[ppc['bus'][:, idx_bus.BUS_I].astype(int)]
+        in_island = np.zeros(self.n_bus, dtype=bool)
+        in_island[bus_rows] = True
+        branch_rows = np.flatnonzero(in_island[self.f] & in_island[self.t])
+        if len(branch_rows) != len(ppc['branch']):
+            raise ValueError('case file is not an island of the base grid')
+        return (bus_rows, branch_rows)
+
+    def factorize(self, B, key):
+        """Returns a (cached) LU factorization of B.
+
+        ARGUMENTS: B: scipy.sparse.csc_matrix,
+                   key: tuple (of the bus rows, branch rows and reference
+                        buses B was built from, as bytes)
+        RETURNS:   scipy.sparse.linalg.SuperLU
+        """
+        if key in self.factors:
+            self.factors.move_to_end(key)
+            return self.factors[key]
+        lu = splinalg.splu(B)
+        self.factors[key] = lu
+        if len(self.factors) > self.maxCached:
+            self.factors.popitem(last=False)
+        return lu
+
+    def injections(self, bus, gen, local):
+        """Computes the real power injection (in p.u., excluding phase shift
+        injections) at each bus of a case file.
+
+        ARGUMENTS: bus, gen: numpy arrays (PYPOWER case data),
+                   local: numpy array (mapping base bus rows to rows of bus)
+        RETURNS:   tuple (numpy array (of injections), numpy array (of bus rows
+                   of in-service generators), numpy array (of bools marking
+                   in-service generators))
+        """
+        on = gen[:, idx_gen.GEN_STATUS] > 0
+        gbus = local[self.bus_lookup[gen[on, idx_gen.GEN_BUS].astype(int)]]
+        Pbus = np.bincount(gbus, weights=gen[on, idx_gen.PG], minlength=len(bus))
+        Pbus = (Pbus - bus[:, idx_bus.PD] - bus[:, idx_bus.GS]) / self.baseMVA
+        return (Pbus, gbus, on)
+
+    def solve(self, bus, gen, branch, bus_rows, branch_rows):
+        """Solves a DC power flow on the given bus/gen/branch arrays, which must
+        hold the rows bus_rows/branch_rows of the base grid. Updates the arrays
+        in-place exactly as pypower.rundcpf does (PF/PT, VM/VA and the slack
+        generator's PG).
+
+        ARGUMENTS: bus, gen, branch: numpy arrays (PYPOWER case data),
+                   bus_rows: numpy array (of base bus row indices),
+                   branch_rows: numpy array (of base branch row indices)
+        RETURNS:   None
+        """
+        n = len(bus)
+        local = -np.ones(self.n_bus, dtype=int)
+        local[bus_rows] = np.arange(n)
+
+        # failed lines carry no flow
+        active = branch[:, idx_brch.BR_X] != np.inf
+        b = np.where(active, self.b[branch_rows], 0.)
+        f = local[self.f[branch_rows]]
+        t = local[self.t[branch_rows]]
+        Pfinj = b * self.shift[branch_rows]
+
+        # bus injections
+        Pbus, gbus, on = self.injections(bus, gen, local)
+        Pbus -= np.bincount(f, weights=Pfinj, minlength=n)
+        Pbus += np.bincount(t, weights=Pfinj, minlength=n)
+
+        ref = reference_buses(bus, gbus)
+        nonref = np.ones(n, dtype=bool)
+        nonref[ref] = False
+        nonref = np.flatnonzero(nonref)
+
+        # solve for voltage angles
+        B = self.make_Bbus(bus_rows, branch_rows[active], b[active])
+        Va = bus[:, idx_bus.VA] * (np.pi / 180)
+        if len(nonref) > 0:
+            # a tuple, as concatenated bytes would not mark where each array ends
+            key = (bus_rows.tobytes(), branch_rows[active].tobytes(), ref.tobytes())
+            lu = self.factorize(B[nonref][:, nonref].tocsc(), key)
+            Va[nonref] = lu.solve(Pbus[nonref] - B[nonref][:, ref] @ Va[ref])
+
+        # update case data
+        branch[:, idx_brch.PF] = (b * (Va[f] - Va[t]) + Pfinj) * self.baseMVA
+        branch[:, idx_brch.PT] = -branch[:, idx_brch.PF]
+        branch[:, idx_brch.QF] = 0
+        branch[:, idx_brch.QT] = 0
+        bus[:, idx_bus.VM] = 1
+        bus[:, idx_bus.VA] = Va * (180 / np.pi)
+        on_rows = np.flatnonzero(on)
+        for k in ref:
+            refgen = on_rows[gbus == k]
+            if len(refgen) > 0:
+                mismatch = B[k] @ Va - Pbus[k]
+                gen[refgen[0], idx_gen.PG] += mismatch[0] * self.baseMVA
+
+    def rundcpf(self, ppc):
+        """Drop-in replacement for pypower.rundcpf for the base grid and its
+        islands. The input case file is not modified.
+
+        ARGUMENTS: ppc: dict (representing a PYPOWER case file)
+        RETURNS:   tuple (dict (the solved case file), int (success flag))
+        """
+        bus_rows, branch_rows = self.island_rows(ppc)
+        results = copy.copy(ppc)
+        results['bus'] = ppc['bus'].copy()
+        results['gen'] = ppc['gen'].copy()
+        branch = ppc['branch']
+        if branch.shape[1] <= idx_brch.QT:
+            # add columns for power flow results
+            padding = np.zeros((len(branch), idx_brch.QT + 1 - branch.shape[1]))
+            results['branch'] = np.hstack((branch, padding))
+        else:
+            results['branch'] = branch.copy()
+
+        self.solve(results['bus'], results['gen'], results['branch'], bus_rows, branch_rows)
+        results['success'] = 1
+        return (results, 1)
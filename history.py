@@ -0,0 +1,121 @@
+import numpy as np
+from collections.abc import Sequence
+
+import pypower.idx_brch as idx_brch
+
+from basecase import copy_case
+
+"""
+history.py - Compact, delta-encoded record of a grid over the rounds of a
+cascade, used for run_simulation(saveIterations=True).
+"""
+
+class DeltaBuffer(object):
+    """Growable buffer of (flat index, value) pairs, grouped by round."""
+
+    def __init__(self, capacity=256):
+        self.indices = np.empty(capacity, dtype=np.int32)
+        self.values = np.empty(capacity)
+        self.offsets = [0]
+
+    def append(self, indices, values):
+        start = self.offsets[-1]
+        end = start + len(indices)
+        if end > len(self.indices):
+            size = max(end, 2 * len(self.indices))
+            self.indices = np.resize(self.indices, size)
+            self.values = np.resize(self.values, size)
+        self.indices[start:end] = indices
+        self.values[start:end] = values
+        self.offsets.append(end)
+
+    def get(self, i):
+        """Returns the (indices, values) pairs of round i."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return (self.indices[start:end], self.values[start:end])
+
+    def nbytes(self):
+        return self.indices.nbytes + self.values.nbytes
+
+
+class GridHistory(Sequence):
+    """The state of a grid after each round of a cascade. The first grid is
+    stored in full; after that only the entries of the bus, gen and branch
+    arrays that changed in each round are kept (newly failed lines, flows,
+    rescaled PG/PD values, angles, ...). Indexing reconstructs a round's grid
+    on access, so a GridHistory can be used like the list of grids that
+    run_simulation() used to return (see also as_list()).
+    """
+
+    KEYS = ('bus', 'gen', 'branch')
+
+    def __init__(self, grid):
+        """ARGUMENTS: grid: dict (representing the PYPOWER case file for round 0)
+        """
+        self.base = copy_case(grid)
+        self.deltas = {key: DeltaBuffer() for key in self.KEYS}
+        self.failures = []
+        self.failed = self.base['branch'][:, idx_brch.BR_X] == np.inf
+        self.last = copy_case(grid)
+        # most recently reconstructed round, for cheap sequential access
+        self.cursor = (0, copy_case(self.base))
+
+    def append(self, grid):
+        """Records the grid after the next round.
+
+        ARGUMENTS: grid: dict (representing a PYPOWER case file)
+        """
+        for key in self.KEYS:
+            current = grid[key]
+            if current.shape != self.last[key].shape:
+                raise ValueError("grid['%s'] changed shape during the cascade" % key)
+            changed = np.flatnonzero(current != self.last[key])
+            self.deltas[key].append(changed, current.flat[changed])
+            self.last[key][...] = current
+        failed = grid['branch'][:, idx_brch.BR_X] == np.inf
+        self.failures.append(np.flatnonzero(failed & ~self.failed))
+        self.failed = failed
+
+    def failed_lines(self, i):
+        """Returns the lines that failed in round i (from round i-1 to i).
+
+        ARGUMENTS: i: int
+        RETURNS:   numpy array (of line indices)
+        """
+        i = range(len(self))[i]
+        if i == 0:
+            return np.flatnonzero(self.base['branch'][:, idx_brch.BR_X] == np.inf)
+        return self.failures[i - 1]
+
+    def __len__(self):
+        return len(self.failures) + 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        i = range(len(self))[i]
+
+        round_i, grid = self.cursor
+        if round_i > i:
+            round_i, grid = 0, copy_case(self.base)
+        while round_i < i:
+            for key in self.KEYS:
+                indices, values = self.deltas[key].get(round_i)
+                grid[key].flat[indices] = values
+            round_i += 1
+        self.cursor = (round_i, grid)
+        return copy_case(grid)
+
+    def as_list(self):
+        """Returns the grid of every round as a list of dicts.
+
+        RETURNS: list of dicts (representing PYPOWER case files)
+        """
+        return self[:]
+
+    def nbytes(self):
+        """Returns the memory used by the stored rounds (excluding round 0).
+
+        RETURNS: int
+        """
+        return sum(buf.nbytes() for buf in self.deltas.values())
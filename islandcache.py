@@ -0,0 +1,80 @@
+import numpy as np
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+"""
+islandcache.py - Reuse of island power flows between the rounds of a cascade.
+Late in a cascade most islands did not lose a line in the last round, and once
+their generation matches their load, rescaling leaves them untouched as well;
+solving them again gives the same flows. Islands are fingerprinted by
+everything the DC power flow reads that can change during a cascade, and an
+island whose fingerprint matches one solved in the previous round takes that
+round's solution.
+"""
+
+def island_fingerprint(component):
+    """Fingerprints an island (after rescaling): its bus, gen and branch rows,
+    bus types, loads and shunts, reference bus angles, generator outputs and
+    status, and which of its branches have failed. The other power flow inputs (impedances, taps,
+    phase shifts, ...) do not change during a cascade.
+
+    ARGUMENTS: component: components.IslandCase
+    RETURNS:   bytes
+    """
+    parts = (component.bus_idx.astype(np.int64),
+             component.gen_idx.astype(np.int64),
+             component.branch_idx.astype(np.int64),
+             component['bus'][:, [idx_bus.BUS_TYPE, idx_bus.PD, idx_bus.GS]],
+             # the power flow keeps the reference bus angle
+             component['bus'][component['bus'][:, idx_bus.BUS_TYPE] == idx_bus.REF, idx_bus.VA],
+             component['gen'][:, [idx_gen.PG, idx_gen.GEN_STATUS]],
+             component['branch'][:, idx_brch.BR_X] == np.inf)
+    return b''.join(np.ascontiguousarray(part).tobytes() + b'|' for part in parts)
+
+
+class IslandSolveCache(object):
+    """Solved islands of the previous round of one cascade, keyed by
+    island_fingerprint(), with counters of reused and solved islands.
+    """
+
+    def __init__(self, rundcpf, enabled=True):
+        """ARGUMENTS: rundcpf: function (see basecase.solver_rundcpf()),
+                   enabled: bool (if False, every island is solved, and only
+                            counted)
+        """
+        self.rundcpf = rundcpf
+        self.enabled = enabled
+        self.previous = dict()
+        self.current = dict()
+        self.reused = 0
+        self.solved = 0
+
+    def solve(self, component):
+        """Runs a DC power flow on an island, or returns the previous round's
+        solution of an identical island.
+
+        ARGUMENTS: component: components.IslandCase (rescaled)
+        RETURNS:   tuple (solved island, bool: whether it was reused)
+        """
+        if not self.enabled:
+            self.solved += 1
+            return (self.rundcpf(component)[0], False)
+
+        key = island_fingerprint(component)
+        solved = self.previous.get(key)
+        reused = solved is not None
+        if reused:
+            self.reused += 1
+        else:
+            solved = self.rundcpf(component)[0]
+            self.solved += 1
+        self.current[key] = solved
+        return (solved, reused)
+
+    def next_round(self):
+        """Makes the islands solved in this round the ones to reuse in the next
+        round (older solutions are dropped)."""
+        self.previous = self.current
+        self.current = dict()
@@ -0,0 +1,441 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+from collections import OrderedDict
+
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+from connectivity import label_components, assign_refs, island_refs, update_slack
+from basecase import base_cases
+from rescale_power import rescale_labeled
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+"""
+kernel.py - Flat-array cascade kernel. Runs the cascade of a single sample on
+plain arrays taken once from the base case (branch endpoints, susceptances,
+phase shift injections, generator buses, loads, capacities and a failed line
+mask) with no case file dicts, island objects or per-row Python work, and gives
+the same results as simulation.run_simulation() with the native solver.
+
+Each round is split into four kernels (island labels, reference buses and
+rescaling, injections, then flows, slack update and overload scan) around one
+sparse DC solve. Every kernel has a loop version, which is compiled with
+numba.njit when numba is installed, and a NumPy version, which is used
+otherwise (see get_kernels()).
+"""
+
+REF = idx_bus.REF
+PV = idx_bus.PV
+
+# rtol and atol of np.isclose, as used by rescale_labeled()
+RTOL = 1e-05
+ATOL = 1e-08
+
+
+def labels_loop(n_bus, f, t, failed):
+    """Labels the islands of a grid by union-find over its active lines.
+
+    ARGUMENTS: n_bus: int,
+               f, t: numpy arrays (of branch endpoint bus rows),
+               failed: numpy array (of bools, one per branch)
+    RETURNS:   numpy array (of island labels, one per bus row)
+    """
+    parent = np.arange(n_bus)
+    for i in range(len(f)):
+        if failed[i]:
+            continue
+        a = f[i]
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        c = t[i]
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        if a < c:
+            parent[c] = a
+        elif c < a:
+            parent[a] = c
+    labels = np.empty(n_bus, dtype=np.int64)
+    root_label = -np.ones(n_bus, dtype=np.int64)
+    n_labels = 0
+    for v in range(n_bus):
+        r = v
+        while parent[r] != r:
+            r = parent[r]
+        if root_label[r] < 0:
+            root_label[r] = n_labels
+            n_labels += 1
+        labels[v] = root_label[r]
+    return labels
+
+def prepare_loop(labels, n_labels, types, gbus, gen_on, PG, PD):
+    """Makes the first bus of every island without a REF bus a REF bus,
+    rescales generation in every island (as rescale_power_gen()) and picks the
+    reference bus of each island (as dcpf.reference_buses(), treating islands
+    without generators as having a dummy generator at their first bus).
+
+    ARGUMENTS: labels: numpy array (of island labels, one per bus row),
+               n_labels: int,
+               types: numpy array (of bus types),
+               gbus: numpy array (of generator bus rows),
+               gen_on: numpy array (of bools marking in-service generators),
+               PG: numpy array (of generator outputs),
+               PD: numpy array (of bus loads)
+    RETURNS:   numpy array (of reference bus rows, one per island; types, PG and
+               PD are updated in-place)
+    """
+    n_bus = len(labels)
+    first = -np.ones(n_labels, dtype=np.int64)
+    has_ref = np.zeros(n_labels, dtype=np.bool_)
+    for v in range(n_bus):
+        label = labels[v]
+        if first[label] < 0:
+            first[label] = v
+        if types[v] == REF:
+            has_ref[label] = True
+    for label in range(n_labels):
+        if not has_ref[label]:
+            types[first[label]] = REF
+
+    # rescale generation
+    total_gen = np.zeros(n_labels)
+    total_load = np.zeros(n_labels)
+    n_gens = np.zeros(n_labels, dtype=np.int64)
+    for g in range(len(gbus)):
+        label = labels[gbus[g]]
+        total_gen[label] += PG[g]
+        n_gens[label] += 1
+    for v in range(n_bus):
+        total_load[labels[v]] += PD[v]
+    no_gen = np.zeros(n_labels, dtype=np.bool_)
+    scale = np.ones(n_labels)
+    for label in range(n_labels):
+        no_gen[label] = abs(total_gen[label]) <= ATOL
+        balanced = abs(total_gen[label] - total_load[label]) <= ATOL + RTOL * abs(total_load[label])
+        if not (no_gen[label] or balanced):
+            scale[label] = total_load[label] / total_gen[label]
+    for v in range(n_bus):
+        if no_gen[labels[v]]:
+            PD[v] = 0.
+    for g in range(len(gbus)):
+        PG[g] *= scale[labels[gbus[g]]]
+
+    # reference buses
+    has_gen = np.zeros(n_bus, dtype=np.bool_)
+    for g in range(len(gbus)):
+        if gen_on[g]:
+            has_gen[gbus[g]] = True
+    for label in range(n_labels):
+        if n_gens[label] == 0:
+            has_gen[first[label]] = True
+    best = np.full(n_labels, 4 * n_bus, dtype=np.int64)
+    for v in range(n_bus):
+        if not has_gen[v]:
+            rank = 3
+        elif types[v] == REF:
+            rank = 0
+        elif types[v] == PV:
+            rank = 1
+        else:
+            rank = 2
+        key = rank * n_bus + v
+        if key < best[labels[v]]:
+            best[labels[v]] = key
+    return best % n_bus
+
+def injections_loop(gbus, gen_on, PG, PD, gs, baseMVA, f, t, failed, Pfinj):
+    """Computes the real power injection (in p.u., including phase shift
+    injections of active lines) at each bus.
+
+    ARGUMENTS: gbus, gen_on, PG, PD: as for prepare_loop(),
+               gs: numpy array (of bus shunt conductances),
+               baseMVA: float,
+               f, t, failed: as for labels_loop(),
+               Pfinj: numpy array (of phase shift injections, one per branch)
+    RETURNS:   numpy array (of injections, one per bus row)
+    """
+    n_bus = len(PD)
+    Pbus = np.zeros(n_bus)
+    for g in range(len(gbus)):
+        if gen_on[g]:
+            Pbus[gbus[g]] += PG[g]
+    from_shift = np.zeros(n_bus)
+    to_shift = np.zeros(n_bus)
+    for i in range(len(f)):
+        if not failed[i]:
+            from_shift[f[i]] += Pfinj[i]
+            to_shift[t[i]] += Pfinj[i]
+    for v in range(n_bus):
+        Pbus[v] = (Pbus[v] - PD[v] - gs[v]) / baseMVA
+        Pbus[v] -= from_shift[v]
+        Pbus[v] += to_shift[v]
+    return Pbus
+
+def finish_loop(Va, Pbus, labels, n_labels, ref, gbus, gen_on, PG, f, t, b, Pfinj,
+                failed, baseMVA, capacities, PF, new_failed):
+    """Computes line flows, lets the reference generator of each island with
+    lines pick up its mismatch (as pypower.rundcpf) and marks overloaded lines.
+
+    ARGUMENTS: Va: numpy array (of bus voltage angles),
+               Pbus: numpy array (from injections_loop()),
+               labels, n_labels: as for prepare_loop(),
+               ref: numpy array (from prepare_loop()),
+               gbus, gen_on, PG: as for prepare_loop(),
+               f, t, failed: as for labels_loop(),
+               b, Pfinj: numpy arrays (of susceptances and phase shift
+                         injections, one per branch),
+               baseMVA: float,
+               capacities: numpy array (one per branch),
+               PF: numpy array (output, line flows),
+               new_failed: numpy array (output, bools marking overloaded lines)
+    RETURNS:   None (PG, PF and new_failed are updated in-place)
+    """
+    for i in range(len(f)):
+        if failed[i]:
+            PF[i] = 0.
+        else:
+            PF[i] = (b[i] * (Va[f[i]] - Va[t[i]]) + Pfinj[i]) * baseMVA
+        new_failed[i] = abs(PF[i]) > capacities[i]
+
+    n_bus = len(labels)
+    mismatch = np.zeros(n_labels)
+    size = np.zeros(n_labels, dtype=np.int64)
+    for v in range(n_bus):
+        mismatch[labels[v]] += Pbus[v]
+        size[labels[v]] += 1
+    is_ref = np.zeros(n_bus, dtype=np.bool_)
+    for label in range(n_labels):
+        if size[label] > 1:
+            is_ref[ref[label]] = True
+    for g in range(len(gbus)):
+        v = gbus[g]
+        if gen_on[g] and is_ref[v]:
+            # only the first generator at the reference bus
+            is_ref[v] = False
+            PG[g] += -mismatch[labels[v]] * baseMVA
+
+
+def labels_numpy(n_bus, f, t, failed):
+    """NumPy version of labels_loop()."""
+    active = ~failed
+    return label_components(n_bus, f[active], t[active])
+
+def prepare_numpy(labels, n_labels, types, gbus, gen_on, PG, PD):
+    """NumPy version of prepare_loop()."""
+    first_bus = assign_refs(labels, n_labels, types)
+    rescale_labeled(PG, PD, labels[gbus], labels, n_labels)
+    return island_refs(labels, n_labels, types, first_bus, gbus, gen_on)
+
+def injections_numpy(gbus, gen_on, PG, PD, gs, baseMVA, f, t, failed, Pfinj):
+    """NumPy version of injections_loop()."""
+    n_bus = len(PD)
+    active = ~failed
+    Pbus = np.bincount(gbus[gen_on], weights=PG[gen_on], minlength=n_bus)
+    Pbus = (Pbus - PD - gs) / baseMVA
+    Pbus -= np.bincount(f[active], weights=Pfinj[active], minlength=n_bus)
+    Pbus += np.bincount(t[active], weights=Pfinj[active], minlength=n_bus)
+    return Pbus
+
+def finish_numpy(Va, Pbus, labels, n_labels, ref, gbus, gen_on, PG, f, t, b, Pfinj,
+                 failed, baseMVA, capacities, PF, new_failed):
+    """NumPy version of finish_loop()."""
+    active = ~failed
+    PF[:] = 0.
+    PF[active] = (b[active] * (Va[f[active]] - Va[t[active]]) + Pfinj[active]) * baseMVA
+    new_failed[:] = abs(PF) > capacities
+    update_slack(labels, n_labels, ref, gbus, gen_on, PG, Pbus, baseMVA)
+
+
+LOOP_KERNELS = {'labels': labels_loop, 'prepare': prepare_loop,
+                'injections': injections_loop, 'finish': finish_loop}
+NUMPY_KERNELS = {'labels': labels_numpy, 'prepare': prepare_numpy,
+                 'injections': injections_numpy, 'finish': finish_numpy}
+_compiled = None
+
+def numba_available():
+    return numba is not None
+
+def get_kernels(jit=None):
+    """Returns the kernels to run cascades with.
+
+    ARGUMENTS: jit: bool (True for the numba-compiled loop kernels, False for
+                    the NumPy kernels; defaults to True if numba is installed)
+    RETURNS:   dict (kernel name -> function)
+    """
+    global _compiled
+    if jit is None:
+        jit = numba_available()
+    if not jit:
+        return NUMPY_KERNELS
+    if not numba_available():
+        raise ImportError("numba is not installed")
+    if _compiled is None:
+        _compiled = {name: numba.njit(cache=True)(fn) for name, fn in LOOP_KERNELS.items()}
+    return _compiled
+
+
+class CascadeKernel(object):
+    """Flat arrays of a base case, for running single-sample cascades on it
+    (see kernel.py). Factorizations of the reduced B matrix are cached by
+    topology, so samples that reach the same failed line set are not
+    refactorized.
+    """
+
+    def __init__(self, grid, kernels=None, maxCached=1024):
+        """ARGUMENTS: grid: dict (representing a PYPOWER case file),
+                      kernels: dict (see get_kernels(); defaults to
+                               get_kernels()),
+                      maxCached: int (number of factorizations to keep)
+        """
+        entry = base_cases.get(grid, 'native')
+        solver = entry['solver']
+        base = entry['grid']
+        self.kernels = kernels if kernels is not None else get_kernels()
+        self.baseMVA = float(base['baseMVA'])
+        self.n_bus = len(base['bus'])
+        self.n_branch = len(base['branch'])
+        self.f = solver.f
+        self.t = solver.t
+        self.b = solver.b
+        self.Pfinj = solver.b * solver.shift
+        self.gbus = solver.bus_lookup[base['gen'][:, idx_gen.GEN_BUS].astype(int)]
+        self.gen_on = base['gen'][:, idx_gen.GEN_STATUS] > 0
+        self.PG = base['gen'][:, idx_gen.PG].copy()
+        self.PD = base['bus'][:, idx_bus.PD].copy()
+        self.gs = base['bus'][:, idx_bus.GS].copy()
+        self.types = base['bus'][:, idx_bus.BUS_TYPE].copy()
+        self.initial_power = entry['initial_power']
+        self.flows = entry['flows']
+
+        self.maxCached = maxCached
+        self.factors = OrderedDict()
+
+    def factorize(self, failed, nonref):
+        """Returns a (cached) LU factorization of the B matrix of the active
+        lines, reduced to the non-reference buses.
+
+        ARGUMENTS: failed: numpy array (of bools, one per branch),
+                   nonref: numpy array (of bools, one per bus row)
+        RETURNS:   scipy.sparse.linalg.SuperLU
+        """
+        key = np.packbits(failed).tobytes() + np.packbits(nonref).tobytes()
+        if key in self.factors:
+            self.factors.move_to_end(key)
+            return self.factors[key]
+
+        active = ~failed
+        local = np.cumsum(nonref) - 1
+        f, t, b = self.f[active], self.t[active], self.b[active]
+        keep_f, keep_t = nonref[f], nonref[t]
+        both = keep_f & keep_t
+        rows = np.concatenate((local[f][keep_f], local[t][keep_t], local[f][both], local[t][both]))
+        cols = np.concatenate((local[f][keep_f], local[t][keep_t], local[t][both], local[f][both]))
+        vals = np.concatenate((b[keep_f], b[keep_t], -b[both], -b[both]))
+        n = np.count_nonzero(nonref)
+        lu = splinalg.splu(sparse.csc_matrix((vals, (rows, cols)), shape=(n, n)))
+        self.factors[key] = lu
+        if len(self.factors) > self.maxCached:
+            self.factors.popitem(last=False)
+        return lu
+
+    def run(self, capacities, attack_set, saveFlows=False):
+        """Runs a cascading failure simulation.
+
+        ARGUMENTS: capacities: numpy array (of length n_branch),
+                   attack_set: list (of line indices),
+                   saveFlows: bool (also return the line flows of every round)
+        RETURNS:   dict (failure_history, failed_lines, system_size, power_loss
+                   and cascade_length, as in simulation.run_simulation(), and
+                   with saveFlows, round_flows: list (of numpy arrays, the line
+                   flows each round's overloads were found from))
+        """
+        kernels = self.kernels
+        capacities = np.asarray(capacities, dtype=float)
+        failed = np.zeros(self.n_branch, dtype=bool)
+        new_failed = np.zeros(self.n_branch, dtype=bool)
+        new_failed[list(attack_set)] = True
+        PF = np.zeros(self.n_branch)
+        PG = self.PG.copy()
+        PD = self.PD.copy()
+        types = self.types.copy()
+        failure_history = []
+        failed_lines = []
+        lines = list(attack_set)
+        round_flows = []
+
+        while len(lines) > 0:
+            failure_history.append(lines)
+            failed_lines.extend(lines)
+            failed |= new_failed
+
+            labels = kernels['labels'](self.n_bus, self.f, self.t, failed)
+            n_labels = int(labels.max()) + 1
+            ref = kernels['prepare'](labels, n_labels, types, self.gbus, self.gen_on, PG, PD)
+            Pbus = kernels['injections'](self.gbus, self.gen_on, PG, PD, self.gs, self.baseMVA,
+                                         self.f, self.t, failed, self.Pfinj)
+
+            nonref = np.ones(self.n_bus, dtype=bool)
+            nonref[ref] = False
+            Va = np.zeros(self.n_bus)
+            if nonref.any():
+                Va[nonref] = self.factorize(failed, nonref).solve(Pbus[nonref])
+
+            kernels['finish'](Va, Pbus, labels, n_labels, ref, self.gbus, self.gen_on, PG,
+                              self.f, self.t, self.b, self.Pfinj, failed, self.baseMVA,
+                              capacities, PF, new_failed)
+            lines = np.flatnonzero(new_failed).tolist()
+            if saveFlows:
+                round_flows.append(PF.copy())
+
+        output_data = {"failure_history": failure_history,
+                       "failed_lines": failed_lines,
+                       "system_size": (self.n_branch - len(failed_lines)) / self.n_branch,
+                       "power_loss": (self.initial_power - PD.sum()) / self.initial_power,
+                       "cascade_length": len(failure_history)}
+        if saveFlows:
+            output_data["round_flows"] = round_flows
+        return output_data
+
+
+def get_kernel(grid):
+    """Returns the (cached) CascadeKernel of a grid's base case.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file)
+    RETURNS:   CascadeKernel
+    """
+    entry = base_cases.get(grid, 'native')
+    if 'kernel' not in entry:
+        entry['kernel'] = CascadeKernel(grid)
+    return entry['kernel']
+
+def run_kernel(grid, capacities, attack_set):
+    """Runs a cascading failure simulation with the cascade kernel.
+
+    See CascadeKernel.run() for more details.
+    """
+    return get_kernel(grid).run(capacities, attack_set)
+
+def proportional_kernel(grid, a, attack_set):
+    """Runs a cascading failure simulation with the cascade kernel, with
+    capacities proportional to initial load (i.e. C = (1+a)*L).
+
+    See CascadeKernel.run() for more details.
+    """
+    kernel = get_kernel(grid)
+    return kernel.run(kernel.flows*(1+a), attack_set)
+
+def iid_kernel(grid, dist, attack_set):
+    """Runs a cascading failure simulation with the cascade kernel, with
+    capacities given by C = L + S, where S is drawn from a given distribution
+    (as in simulation.iid_sim()).
+
+    See CascadeKernel.run() for more details.
+    """
+    kernel = get_kernel(grid)
+    return kernel.run(kernel.flows + dist(), attack_set)
@@ -0,0 +1,133 @@
+import numpy as np
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+from dcpf import DCPowerFlow, reference_buses
+
+"""
+lodf.py - Incremental DC power flow for line outages. Flows after a set of
+outages are computed from the base case PTDF/LODF matrices with a low-rank
+(Woodbury) update rather than by refactorizing the susceptance matrix.
+"""
+
+class LODFPowerFlow(DCPowerFlow):
+    """DC power flow solver that updates the base case flows of a connected
+    grid for its failed lines with a rank-k correction, which costs O(n*k) for
+    k outages instead of a new factorization. Islands, and outage sets that
+    island the grid (making the update singular), fall back to a full solve.
+    """
+
+    def __init__(self, ppc, maxCached=256, maxCondition=1e10, matrices=None):
+        """ARGUMENTS: ppc: dict (representing the base PYPOWER case file)
+                      maxCached: int (number of factorizations to keep)
+                      maxCondition: float (condition number of the outage
+                                    matrix above which a full solve is used)
+                      matrices: dict (X, ptdf and M of a solver for the same
+                                case, e.g. from shared memory (see
+                                sharedcase.py), used instead of computing them)
+        """
+        DCPowerFlow.__init__(self, ppc, maxCached=maxCached)
+        self.maxCondition = maxCondition
+
+        bus = np.copy(ppc['bus'])
+        gen = np.copy(ppc['gen'])
+        rows = np.arange(self.n_bus)
+        P0, gbus, on = self.injections(bus, gen, rows)
+        self.ref = reference_buses(bus, gbus)
+        self.P0 = P0
+        nonref = np.ones(self.n_bus, dtype=bool)
+        nonref[self.ref] = False
+        nonref = np.flatnonzero(nonref)
+
+        if matrices is not None:
+            self.X = matrices['X']
+            self.ptdf = matrices['ptdf']
+            self.M = matrices['M']
+        else:
+            # X maps bus injections (p.u.) to voltage angles relative to the
+            # ref bus(es), so PTDF = diag(b) * A * X
+            lu = self.factorize(self.Bbus[nonref][:, nonref].tocsc(),
+                                (rows.tobytes(), np.arange(self.n_branch).tobytes(),
+                                 self.ref.tobytes()))
+            self.X = np.zeros((self.n_bus, self.n_bus))
+            self.X[np.ix_(nonref, nonref)] = lu.solve(np.eye(len(nonref)))
+            self.ptdf = self.b[:, None] * (self.X[self.f] - self.X[self.t])
+
+            # M[l, k] is the change in flow on l per unit transferred from the
+            # from bus to the to bus of k; LODF[l, k] = M[l, k] / (1 - M[k, k])
+            self.M = self.ptdf[:, self.f] - self.ptdf[:, self.t]
+
+        # base case flows (p.u.) and angles
+        self.Va0 = bus[:, idx_bus.VA] * (np.pi / 180)
+        Pinj = P0 - np.bincount(self.f, weights=self.b * self.shift, minlength=self.n_bus)
+        Pinj += np.bincount(self.t, weights=self.b * self.shift, minlength=self.n_bus)
+        self.Va0 = self.Va0[self.ref[0]] + self.X @ Pinj
+        self.flows0 = self.b * (self.Va0[self.f] - self.Va0[self.t] + self.shift)
+
+    def lodf(self):
+        """Returns the base case line outage distribution factor matrix.
+
+        RETURNS: numpy array (n_branch x n_branch)
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lodf = self.M / (1 - np.diag(self.M))[None, :]
+        np.fill_diagonal(lodf, -1)
+        return lodf
+
+    def update(self, bus, gen, branch):
+        """Updates the base case flows of the whole grid for its failed lines
+        and changed injections. Updates the arrays in-place as
+        DCPowerFlow.solve() does.
+
+        ARGUMENTS: bus, gen, branch: numpy arrays (PYPOWER case data for the
+                                     whole base grid)
+        RETURNS:   bool (False if the update is singular and nothing was done)
+        """
+        failed = np.flatnonzero(branch[:, idx_brch.BR_X] == np.inf)
+        if np.any(self.shift[failed] != 0):
+            # phase shift injections of outaged lines are not modelled
+            return False
+
+        # injections that changed since the base case
+        P, gbus, on = self.injections(bus, gen, np.arange(self.n_bus))
+        dP = P - self.P0
+        changed = np.flatnonzero(dP)
+        Va = self.Va0 + self.X[:, changed] @ dP[changed]
+        flows = self.flows0 + self.ptdf[:, changed] @ dP[changed]
+
+        if len(failed) > 0:
+            # fictitious transfers across the outaged lines that cancel
+            # their flows: (I - M_KK) * transfers = flows_K
+            outage = np.eye(len(failed)) - self.M[np.ix_(failed, failed)]
+            if np.linalg.cond(outage) > self.maxCondition:
+                # outages island the grid
+                return False
+            transfers = np.linalg.solve(outage, flows[failed])
+            flows += self.M[:, failed] @ transfers
+            flows[failed] = 0
+            Va += (self.X[:, self.f[failed]] - self.X[:, self.t[failed]]) @ transfers
+
+        branch[:, idx_brch.PF] = flows * self.baseMVA
+        branch[:, idx_brch.PT] = -branch[:, idx_brch.PF]
+        branch[:, idx_brch.QF] = 0
+        branch[:, idx_brch.QT] = 0
+        bus[:, idx_bus.VM] = 1
+        bus[:, idx_bus.VA] = Va * (180 / np.pi)
+
+        # the reference generator picks up any mismatch, as in a full solve
+        on_rows = np.flatnonzero(on)
+        refgen = on_rows[gbus == self.ref[0]]
+        if len(refgen) > 0:
+            gen[refgen[0], idx_gen.PG] -= np.sum(P) * self.baseMVA
+        return True
+
+    def solve(self, bus, gen, branch, bus_rows, branch_rows):
+        """Solves a DC power flow as DCPowerFlow.solve() does, using an
+        incremental update when the case file is the whole base grid.
+        """
+        if len(self.ref) == 1 and np.array_equal(bus_rows, np.arange(self.n_bus)):
+            if self.update(bus, gen, branch):
+                return
+        DCPowerFlow.solve(self, bus, gen, branch, bus_rows, branch_rows)
@@ -0,0 +1,137 @@
+import numpy as np
+import hashlib
+from collections import OrderedDict
+
+import pypower.idx_bus as idx_bus
+
+from basecase import case_hash
+
+"""
+memo.py - Memoization of cascade states, shared across the Monte Carlo samples
+of a run with fixed capacities. Many samples reach the same set of failed lines
+(repeated attack sets for small attacks, and converging cascades late on), and
+the outcome of a round only depends on that set, so the outcome of each round
+is cached by the set of lines that have failed.
+"""
+
+def failed_set_key(failed_lines, n_branch):
+    """Canonical key of a set of failed lines: the lines as a packed bitset.
+
+    ARGUMENTS: failed_lines: list (of line indices),
+               n_branch: int (number of branches in the grid)
+    RETURNS:   bytes
+    """
+    mask = np.zeros(n_branch, dtype=bool)
+    mask[list(failed_lines)] = True
+    return np.packbits(mask).tobytes()
+
+def memoizable(grid):
+    """Checks whether the cascades of a grid can be memoized, i.e. whether it
+    has no bus shunts (see CascadeMemo).
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file)
+    RETURNS:   bool
+    """
+    return not np.any(grid['bus'][:, idx_bus.GS] != 0)
+
+def capacities_hash(capacities):
+    """ARGUMENTS: capacities: list (of line capacities)
+    RETURNS:   str
+    """
+    array = np.ascontiguousarray(capacities, dtype=float)
+    return hashlib.sha1(array.tobytes()).hexdigest()
+
+
+class CascadeMemo(object):
+    """Least recently used cache of cascade rounds. Maps the set of failed
+    lines after a round (see failed_set_key()) to the round's outcome: the
+    lines that fail next, the total load served and the number of DC power
+    flows solved to compute it.
+
+    A memo is bound to the grid, solver and capacities of the first simulation
+    that uses it (see bind()); outcomes do not carry over to other capacities.
+
+    The outcome of a round is treated as a function of the failed set alone.
+    This is exact for the flows as long as the rescaled injections do not
+    depend on the order lines failed in. Bus shunts (GS) break this: the
+    reference generator picks up their power after each rescaling, so on cases
+    with shunts a replayed cascade can differ from a simulated one, and bind()
+    refuses them.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.binding = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_solves = 0
+        self.evictions = 0
+
+    def bind(self, grid, capacities, solver='pypower'):
+        """Binds the memo to a grid, solver and set of capacities, or checks
+        that it is already bound to them. Raises a ValueError for grids with
+        bus shunts (see CascadeMemo).
+
+        ARGUMENTS: grid: dict (representing a PYPOWER case file),
+                   capacities: list (of line capacities),
+                   solver: str (see basecase.get_solver())
+        """
+        if not memoizable(grid):
+            raise ValueError("CascadeMemo cannot memoize grids with bus shunts (GS), "
+                             "whose rounds depend on the order lines failed in")
+        binding = (case_hash(grid), solver, capacities_hash(capacities))
+        if self.binding is None:
+            self.binding = binding
+        elif binding != self.binding:
+            raise ValueError("CascadeMemo is bound to a different grid, solver "
+                             "or set of capacities")
+
+    def get(self, key):
+        """Looks up the outcome of a round.
+
+        ARGUMENTS: key: bytes (see failed_set_key())
+        RETURNS:   tuple (next failed lines, load served), or None on a miss
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        next_failures, load, n_solves = entry
+        self.saved_solves += n_solves
+        return (list(next_failures), load)
+
+    def put(self, key, next_failures, load, n_solves):
+        """Records the outcome of a round.
+
+        ARGUMENTS: key: bytes (see failed_set_key()),
+                   next_failures: list (of line indices),
+                   load: float (total load served after the round),
+                   n_solves: int (number of DC power flows solved in the round)
+        """
+        self.entries[key] = (tuple(next_failures), load, n_solves)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """RETURNS: dict (hit and miss counters, hit rate, saved solves,
+        evictions and number of entries)"""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.,
+                'saved_solves': self.saved_solves,
+                'evictions': self.evictions,
+                'size': len(self.entries)}
+
+    def clear(self):
+        self.entries.clear()
+        self.binding = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_solves = 0
+        self.evictions = 0
@@ -0,0 +1,177 @@
+import numpy as np
+
+"""
+observers.py - Observers for run_simulation(observers=[...]). After every round
+of a cascade, each observer's on_round() is called with a dict describing the
+round:
+
+    'round':            round number (starting at 0)
+    'timings':          dict (stage name -> wall time in seconds, for the
+                        stages in STAGES)
+    'n_islands':        number of islands after the round
+    'n_solved':         number of islands a DC power flow was solved for
+    'new_failed_lines': list (of lines that overloaded in the round and fail
+                        in the next one)
+    'load_served':      total load served after the round
+    'memoized':         bool (the round was taken from a memo.CascadeMemo, in
+                        which case timings are zero and the island counts are
+                        None)
+    'pf_iterations':    Newton iterations of the round's AC power flows (None
+                        for DC solvers and memoized rounds)
+    'pf_fallbacks':     number of islands whose AC power flow did not converge
+                        and were solved with the DC power flow instead (None
+                        as for pf_iterations)
+
+and on_finish() is called with run_simulation()'s output once the cascade ends.
+"""
+
+STAGES = ('components', 'rescale', 'solve', 'combine', 'overload')
+
+
+class Observer(object):
+    """Base class for observers, which ignores every event."""
+
+    def on_round(self, event):
+        pass
+
+    def on_finish(self, output):
+        pass
+
+
+class StageTimer(Observer):
+    """Totals the time spent in each stage of the cascade over any number of
+    simulations (e.g. a whole systemsize_analysis.equal_freespace() sweep).
+    """
+
+    def __init__(self):
+        self.totals = {stage: 0. for stage in STAGES}
+        self.rounds = 0
+        self.memoized_rounds = 0
+        self.simulations = 0
+
+    def on_round(self, event):
+        self.rounds += 1
+        if event['memoized']:
+            self.memoized_rounds += 1
+        for stage, seconds in event['timings'].items():
+            self.totals[stage] += seconds
+
+    def on_finish(self, output):
+        self.simulations += 1
+
+    def summary(self):
+        """RETURNS: dict (total seconds per stage, plus the total, the number
+        of rounds and simulations, and seconds per simulation)"""
+        total = sum(self.totals.values())
+        summary = dict(self.totals)
+        summary['total'] = total
+        summary['rounds'] = self.rounds
+        summary['memoized_rounds'] = self.memoized_rounds
+        summary['simulations'] = self.simulations
+        summary['per_simulation'] = total / self.simulations if self.simulations > 0 else 0.
+        return summary
+
+    def report(self):
+        """RETURNS: str (a table of time spent per stage)"""
+        summary = self.summary()
+        total = summary['total']
+        out_string = '\n Stage          Time (s)     Pct '
+        out_string += '\n------------  ----------  -------'
+        for stage in STAGES:
+            pct = 100 * self.totals[stage] / total if total > 0 else 0.
+            out_string += '\n %-12s%11.3f%9.2f' % (stage, self.totals[stage], pct)
+        out_string += '\n %-12s%11.3f' % ('total', total)
+        out_string += '\n\n %d simulations, %d rounds (%d memoized)' % (
+            self.simulations, self.rounds, self.memoized_rounds)
+        return out_string
+
+
+class CascadeStats(Observer):
+    """Collects the shape of cascades over any number of simulations: cascade
+    lengths, island counts and failures per round.
+    """
+
+    def __init__(self):
+        self.lengths = []
+        self.islands = []
+        self.failures = []
+        self.current_length = 0
+
+    def on_round(self, event):
+        self.current_length += 1
+        if event['n_islands'] is not None:
+            self.islands.append(event['n_islands'])
+        self.failures.append(len(event['new_failed_lines']))
+
+    def on_finish(self, output):
+        self.lengths.append(self.current_length)
+        self.current_length = 0
+
+    def summary(self):
+        """RETURNS: dict (mean and max cascade length, island count and
+        failures per round)"""
+        summary = dict()
+        for name, values in (('length', self.lengths), ('islands', self.islands),
+                             ('failures', self.failures)):
+            summary['mean_' + name] = np.mean(values) if len(values) > 0 else 0.
+            summary['max_' + name] = max(values) if len(values) > 0 else 0
+        summary['simulations'] = len(self.lengths)
+        return summary
+
+
+class RoundRecorder(Observer):
+    """Keeps every event, for inspecting single cascades."""
+
+    def __init__(self):
+        self.events = []
+        self.outputs = []
+
+    def on_round(self, event):
+        self.events.append(event)
+
+    def on_finish(self, output):
+        self.outputs.append(output)
+
+
+class PowerFlowStats(Observer):
+    """Collects the Newton iterations, DC fallbacks and solve time of every
+    round of AC cascades (run_simulation(solver='ac')).
+    """
+
+    def __init__(self):
+        self.rounds = []
+
+    def on_round(self, event):
+        if event['pf_iterations'] is not None:
+            self.rounds.append({'round': event['round'],
+                                'iterations': event['pf_iterations'],
+                                'fallbacks': event['pf_fallbacks'],
+                                'islands': event['n_solved'],
+                                'seconds': event['timings']['solve']})
+
+    def summary(self):
+        """RETURNS: dict (per round number: rounds seen, mean Newton iterations
+        per solved island, total DC fallbacks and mean solve seconds)"""
+        summary = dict()
+        for entry in self.rounds:
+            totals = summary.setdefault(entry['round'], {'rounds': 0, 'iterations': 0,
+                                                         'islands': 0, 'fallbacks': 0,
+                                                         'seconds': 0.})
+            totals['rounds'] += 1
+            for key in ('iterations', 'islands', 'fallbacks', 'seconds'):
+                totals[key] += entry[key]
+        for totals in summary.values():
+            islands = totals.pop('islands')
+            totals['iterations'] = totals['iterations'] / islands if islands > 0 else 0.
+            totals['seconds'] /= totals['rounds']
+        return summary
+
+    def report(self):
+        """RETURNS: str (a table of the summary, one row per round number)"""
+        out_string = '\n Round   Count   Iter/island   Fallbacks   Solve (ms)'
+        out_string += '\n------  ------  ------------  ----------  -----------'
+        for n_round, totals in sorted(self.summary().items()):
+            out_string += '\n%6d%8d%14.2f%12d%13.3f' % (
+                n_round, totals['rounds'], totals['iterations'], totals['fallbacks'],
+                totals['seconds'] * 1000)
+        return out_string
@@ -1,7 +1,4 @@
-import pypower.api as pp
-import networkx as nx
 import numpy as np
-import copy
 
 import pypower.idx_brch as idx_brch
 import pypower.idx_bus as idx_bus
@@ -59,3 +56,62 @@ def rescale_power_gen(ppc):
         # scale generation to match load
         scale_factor = total_load / total_gen
         ppc['gen'][:, idx_gen.PG] *= scale_factor
+
+
+def rescale_labeled(PG, PD, gen_labels, bus_labels, n_labels, mode='gen'):
+    """Array version of rescale_power_labeled(): applies the rescaling rule to
+    every island at once, given the island label of each generator and bus.
+
+    ARGUMENTS: PG: numpy array (of generator outputs),
+               PD: numpy array (of bus loads),
+               gen_labels: numpy array (of island labels, one per generator),
+               bus_labels: numpy array (of island labels, one per bus),
+               n_labels: int (number of islands),
+               mode: str ('gen' for the rule of rescale_power_gen(), 'down' for
+                     the rule of rescale_power_down())
+    RETURNS:   None (does in-place update of PG and PD)
+    """
+    total_gen = np.bincount(gen_labels, weights=PG, minlength=n_labels)
+    total_load = np.bincount(bus_labels, weights=PD, minlength=n_labels)
+    balanced = np.isclose(total_gen, total_load)
+
+    if mode == 'gen':
+        no_gen = np.isclose(total_gen, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gen_scale = np.where(no_gen | balanced, 1., total_load / total_gen)
+        # no power generated, set loads to zero
+        PD[no_gen[bus_labels]] = 0
+        PG *= gen_scale[gen_labels]
+    elif mode == 'down':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gen_scale = np.where(~balanced & (total_gen > total_load),
+                                 total_load / total_gen, 1.)
+            load_scale = np.where(~balanced & (total_gen < total_load),
+                                  total_gen / total_load, 1.)
+        PG *= gen_scale[gen_labels]
+        PD *= load_scale[bus_labels]
+    else:
+        raise ValueError("unknown rescaling mode '%s'" % mode)
+
+def rescale_power_labeled(ppc, labels, mode='gen'):
+    """Rescales power in every island of a PYPOWER case file in a single pass,
+    with the same per-island results as calling rescale_power_gen() (or
+    rescale_power_down(), for mode='down') on each island.
+
+    ARGUMENTS: ppc: dict (representing a PYPOWER case file),
+               labels: numpy array (of island labels, one per bus row, e.g. as
+                       kept by connectivity.ComponentTracker),
+               mode: str ('gen' or 'down', see rescale_labeled())
+    RETURNS:   None (does in-place update of ppc)
+    """
+    labels = np.asarray(labels)
+    bus_ids = ppc['bus'][:, idx_bus.BUS_I].astype(int)
+    bus_lookup = -np.ones(bus_ids.max() + 1, dtype=int)
+    bus_lookup[bus_ids] = np.arange(len(bus_ids))
+    gen_labels = labels[bus_lookup[ppc['gen'][:, idx_gen.GEN_BUS].astype(int)]]
+    n_labels = labels.max() + 1 if len(labels) > 0 else 0
+
+    # column views, updated in place
+    PG = ppc['gen'][:, idx_gen.PG]
+    PD = ppc['bus'][:, idx_bus.PD]
+    rescale_labeled(PG, PD, gen_labels, labels, n_labels, mode)
@@ -0,0 +1,280 @@
+import numpy as np
+import csv
+import json
+import os
+
+"""
+resultstore.py - Columnar store for the raw samples of system size sweeps. A
+store is a directory with one typed, append-only binary file per column:
+
+    case            int16    index into the store's case names
+    attack_size     int32
+    sample          int32    sample index within (case, attack_size)
+    system_size     float64
+    power_loss      float64
+    cascade_length  int32
+    weight          float64  sample weight (see sampling.py)
+
+plus meta.json, which holds the case names, the number of committed rows and
+the sample counts. Appended rows are buffered in memory and written out in
+chunks of at least chunkRows rows (or on flush() or close()); the column files
+are extended before meta.json is replaced, so rows of an interrupted flush are
+past the committed count, and are cut off when the store is next opened.
+Columns are memory-mapped on read, and the JSON/CSV outputs of
+systemsize_analysis.py are generated by streaming over them chunkRows rows at a
+time.
+"""
+
+COLUMNS = (('case', np.int16),
+           ('attack_size', np.int32),
+           ('sample', np.int32),
+           ('system_size', np.float64),
+           ('power_loss', np.float64),
+           ('cascade_length', np.int32),
+           ('weight', np.float64))
+
+CASE_TITLES = {'30bus': 'IEEE 30-bus test case', '57bus': 'IEEE 57-bus test case',
+               '118bus': 'IEEE 118-bus test case', '300bus': 'IEEE 300-bus test case'}
+
+
+class ResultStore(object):
+    """A columnar results store (see resultstore.py), created if path does not
+    exist. Rows appended since the last flush() are not on disk (but are seen
+    by the store's own reads, which flush first); close() the store, or use it
+    as a context manager, once done appending.
+    """
+
+    def __init__(self, path, chunkRows=65536):
+        """ARGUMENTS: path: str (directory of the store),
+                      chunkRows: int (number of buffered rows that triggers a
+                                 flush, and rows per chunk when reading)
+        """
+        self.path = path
+        self.chunk_rows = chunkRows
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.buffer = {name: [] for name, dtype in COLUMNS}
+        self.buffered = 0
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+            # drop rows of a flush that never made it into meta.json
+            for name, dtype in COLUMNS:
+                fname = self.column_path(name)
+                size = self.meta['rows'] * np.dtype(dtype).itemsize
+                if os.path.getsize(fname) > size:
+                    os.truncate(fname, size)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, dtype in COLUMNS:
+                open(self.column_path(name), 'wb').close()
+            self.meta = {'cases': [], 'rows': 0, 'counts': {}}
+            self.write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def column_path(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def write_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def case_code(self, case):
+        if case not in self.meta['cases']:
+            self.meta['cases'].append(case)
+            self.meta['counts'][case] = dict()
+        return self.meta['cases'].index(case)
+
+    def append(self, case, attack_size, system_size, power_loss=None, cascade_length=None,
+               weight=None):
+        """Appends the samples of one attack size on one case. Samples are
+        numbered after those already appended for (case, attack_size).
+
+        ARGUMENTS: case: str (case name),
+                   attack_size: int,
+                   system_size: list (of floats),
+                   power_loss: list (of floats; NaN if not given),
+                   cascade_length: list (of ints; -1 if not given),
+                   weight: list (of floats; 1 if not given)
+        """
+        n = len(system_size)
+        if n == 0:
+            return
+        code = self.case_code(case)
+        counts = self.meta['counts'][case]
+        start = counts.get(str(attack_size), 0)
+        values = {'case': np.full(n, code),
+                  'attack_size': np.full(n, attack_size),
+                  'sample': start + np.arange(n),
+                  'system_size': system_size,
+                  'power_loss': np.full(n, np.nan) if power_loss is None else power_loss,
+                  'cascade_length': np.full(n, -1) if cascade_length is None else cascade_length,
+                  'weight': np.ones(n) if weight is None else weight}
+        columns = dict()
+        for name, dtype in COLUMNS:
+            columns[name] = np.asarray(values[name], dtype=dtype)
+            if len(columns[name]) != n:
+                raise ValueError("column '%s' has %d values, expected %d"
+                                 % (name, len(columns[name]), n))
+
+        for name, column in columns.items():
+            self.buffer[name].append(column)
+        self.buffered += n
+        counts[str(attack_size)] = start + n
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows to the column files and commits them in
+        meta.json.
+        """
+        if self.buffered == 0:
+            return
+        for name, dtype in COLUMNS:
+            with open(self.column_path(name), 'ab') as f:
+                f.write(np.concatenate(self.buffer[name]).tobytes())
+            self.buffer[name] = []
+        self.meta['rows'] += self.buffered
+        self.buffered = 0
+        self.write_meta()
+
+    def close(self):
+        """Flushes the buffered rows."""
+        self.flush()
+
+    def truncate(self, n_rows):
+        """Drops every row after the first n_rows (e.g. samples appended after
+        the last checkpoint of an interrupted sweep), including buffered ones.
+
+        ARGUMENTS: n_rows: int
+        """
+        self.buffer = {name: [] for name, dtype in COLUMNS}
+        self.buffered = 0
+        if n_rows < self.meta['rows']:
+            for name, dtype in COLUMNS:
+                os.truncate(self.column_path(name), n_rows * np.dtype(dtype).itemsize)
+            self.meta['rows'] = n_rows
+        counts = {case: dict() for case in self.meta['cases']}
+        for chunk in self.chunks(['case', 'attack_size']):
+            keys, sizes = np.unique(np.stack((chunk['case'], chunk['attack_size']), axis=1),
+                                    axis=0, return_counts=True)
+            for (code, attack_size), size in zip(keys, sizes):
+                case_counts = counts[self.meta['cases'][code]]
+                case_counts[str(attack_size)] = case_counts.get(str(attack_size), 0) + int(size)
+        self.meta['counts'] = counts
+        self.write_meta()
+
+    def __len__(self):
+        return self.meta['rows'] + self.buffered
+
+    def cases(self):
+        """RETURNS: list (of case names, in order of first append)"""
+        return list(self.meta['cases'])
+
+    def read_column(self, name):
+        """RETURNS: numpy array (memory map of a column's committed rows)"""
+        dtype = dict(COLUMNS)[name]
+        if self.meta['rows'] == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.column_path(name), dtype=dtype, mode='r',
+                         shape=(self.meta['rows'],))
+
+    def chunks(self, columns=None):
+        """Iterates over the store chunkRows rows at a time, after flushing any
+        buffered rows.
+
+        ARGUMENTS: columns: list (of column names; defaults to all)
+        RETURNS:   generator of dicts (column name -> memory-mapped numpy array)
+        """
+        self.flush()
+        if columns is None:
+            columns = [name for name, dtype in COLUMNS]
+        arrays = {name: self.read_column(name) for name in columns}
+        for start in range(0, self.meta['rows'], self.chunk_rows):
+            yield {name: array[start:start + self.chunk_rows] for name, array in arrays.items()}
+
+    def column(self, name, case=None):
+        """Reads one column, optionally for one case only.
+
+        ARGUMENTS: name: str (column name),
+                   case: str (case name)
+        RETURNS:   numpy array
+        """
+        code = None if case is None else self.meta['cases'].index(case)
+        parts = []
+        for chunk in self.chunks([name, 'case']):
+            if code is None:
+                parts.append(np.asarray(chunk[name]))
+            else:
+                parts.append(np.asarray(chunk[name][chunk['case'] == code]))
+        dtype = dict(COLUMNS)[name]
+        return np.concatenate(parts) if len(parts) > 0 else np.zeros(0, dtype=dtype)
+
+    def averages(self, value='system_size'):
+        """Streams over the store to compute the (weighted) mean of a column for
+        each case and attack size.
+
+        ARGUMENTS: value: str (column name)
+        RETURNS:   dict (case name -> dict (attack size -> mean))
+        """
+        sums = dict()
+        for chunk in self.chunks(['case', 'attack_size', value, 'weight']):
+            keys = np.stack((chunk['case'], chunk['attack_size']), axis=1)
+            unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            weighted = np.bincount(inverse, weights=chunk['weight'] * chunk[value])
+            total = np.bincount(inverse, weights=chunk['weight'])
+            for (code, attack_size), wx, w in zip(unique, weighted, total):
+                key = (int(code), int(attack_size))
+                old_wx, old_w = sums.get(key, (0., 0.))
+                sums[key] = (old_wx + wx, old_w + w)
+
+        output = {case: dict() for case in self.meta['cases']}
+        for (code, attack_size), (wx, w) in sorted(sums.items()):
+            output[self.meta['cases'][code]][attack_size] = wx / w
+        return output
+
+    def to_json(self, fname):
+        """Writes the store in the format of analyze_jsonout(): case name ->
+        {'average': attack size -> mean system size, 'raw': attack size ->
+        list of system sizes}. Reads one case at a time.
+
+        ARGUMENTS: fname: str
+        """
+        averages = self.averages()
+        output = dict()
+        for case in self.meta['cases']:
+            attack_sizes = self.column('attack_size', case)
+            system_sizes = self.column('system_size', case)
+            samples = self.column('sample', case)
+            order = np.lexsort((samples, attack_sizes))
+            raw = dict()
+            bounds = np.flatnonzero(np.diff(attack_sizes[order])) + 1
+            for group in np.split(order, bounds):
+                if len(group) > 0:
+                    raw[int(attack_sizes[group[0]])] = system_sizes[group].tolist()
+            output[case] = {'average': averages[case], 'raw': raw}
+        with open(fname, 'w') as outfile:
+            json.dump(output, outfile)
+
+    def to_csv(self, fname):
+        """Writes the mean system size of each case and attack size in the
+        format of json_to_csv().
+
+        ARGUMENTS: fname: str
+        """
+        averages = self.averages()
+        with open(fname, 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            for i, case in enumerate(self.meta['cases']):
+                if i > 0:
+                    writer.writerow([])
+                writer.writerow([CASE_TITLES.get(case, case)])
+                for attack_size in sorted(averages[case].keys()):
+                    writer.writerow([attack_size, averages[case][attack_size]])
@@ -0,0 +1,163 @@
+import numpy as np
+import random
+
+from basecase import base_cases
+
+"""
+sampling.py - Attack set samplers for system size sweeps. Each sampler draws
+attack sets of a given size together with weights, such that the weighted mean
+of any function of the attack set (np.average(x, weights=w)) estimates its mean
+over uniformly random attack sets:
+
+    UniformSampler:     independent uniform draws (unit weights), as
+                        random.sample
+    CRNSampler:         common random numbers; the attack of size k in sample
+                        i is the first k lines of a fixed random permutation
+                        i, so neighbouring attack sizes share most of their
+                        attacked lines and the curve over attack sizes is
+                        smooth
+    StratifiedSampler:  stratifies on the number of attacked lines from the
+                        high-flow class, which is hypergeometric under
+                        uniform sampling, with proportional allocation
+                        (rounded systematically, so unit weights)
+    ImportanceSampler:  draws the number of attacked high-flow lines from an
+                        exponentially tilted hypergeometric distribution
+                        (attacking high-flow lines more often), weighted by
+                        the exact likelihood ratio of that number
+
+Every sampler takes its randomness from rng (a random.Random, or the random
+module itself by default), so random.seed() still makes sweeps repeatable.
+"""
+
+def get_sampler(case, sampling='uniform', rng=random):
+    """Builds an attack set sampler.
+
+    ARGUMENTS: case: dict (representing a PYPOWER case file),
+               sampling: str ('uniform', 'crn', 'stratified' or 'importance'),
+               rng: random.Random (or the random module)
+    RETURNS:   sampler object (see sampling.py)
+    """
+    if sampling == 'uniform':
+        return UniformSampler(case, rng)
+    elif sampling == 'crn':
+        return CRNSampler(case, rng)
+    elif sampling == 'stratified':
+        return StratifiedSampler(case, rng)
+    elif sampling == 'importance':
+        return ImportanceSampler(case, rng)
+    else:
+        raise ValueError("unknown sampling strategy '%s'" % sampling)
+
+def numpy_rng(rng):
+    """Derives a numpy Generator from a random.Random (or the random module)."""
+    return np.random.default_rng(rng.getrandbits(64))
+
+
+class UniformSampler(object):
+    def __init__(self, case, rng=random):
+        self.n_branches = len(case['branch'])
+        self.rng = rng
+
+    def draw(self, attack_size, n_samples, offset=0):
+        """Draws attack sets.
+
+        ARGUMENTS: attack_size: int,
+                   n_samples: int,
+                   offset: int (number of samples already drawn for this
+                           attack size, for samplers that pair samples across
+                           attack sizes)
+        RETURNS:   tuple (list of attack sets, numpy array of weights)
+        """
+        attack_sets = [self.rng.sample(range(self.n_branches), attack_size)
+                       for i in range(n_samples)]
+        return (attack_sets, np.ones(n_samples))
+
+
+class CRNSampler(UniformSampler):
+    def __init__(self, case, rng=random):
+        UniformSampler.__init__(self, case, rng)
+        self.permutations = []
+
+    def draw(self, attack_size, n_samples, offset=0):
+        while len(self.permutations) < offset + n_samples:
+            self.permutations.append(self.rng.sample(range(self.n_branches), self.n_branches))
+        attack_sets = [perm[:attack_size]
+                       for perm in self.permutations[offset:offset + n_samples]]
+        return (attack_sets, np.ones(n_samples))
+
+
+class StratifiedSampler(UniformSampler):
+    def __init__(self, case, rng=random, highFraction=0.25):
+        """ARGUMENTS: case: dict (representing a PYPOWER case file),
+                   rng: random.Random,
+                   highFraction: float (fraction of lines, by base case flow,
+                                 in the high-flow class)
+        """
+        UniformSampler.__init__(self, case, rng)
+        flows = base_cases.get(case)['flows']
+        n_high = max(1, int(round(highFraction * self.n_branches)))
+        order = np.argsort(-flows, kind='stable')
+        self.high = order[:n_high]
+        self.low = order[n_high:]
+
+    def draw(self, attack_size, n_samples, offset=0):
+        n_high = len(self.high)
+        counts = np.arange(min(attack_size, n_high) + 1)
+        from scipy.stats import hypergeom
+        # P(m attacked lines in the high-flow class) under uniform sampling
+        p = hypergeom.pmf(counts, self.n_branches, n_high, attack_size)
+        feasible = attack_size - counts <= len(self.low)
+        counts, p = counts[feasible], p[feasible] / p[feasible].sum()
+
+        # proportional allocation, rounded systematically: with one uniform
+        # offset u, count m gets floor(Q_m + u) - floor(Q_{m-1} + u) samples
+        # (Q the cumulative quotas), which is floor(p_m * n) or one more, with
+        # mean exactly p_m * n, so every count (however unlikely) can be drawn,
+        # the allocation sums to n and every sample has unit weight
+        u = self.rng.random()
+        bounds = np.minimum(np.floor(np.concatenate(([0.], np.cumsum(p * n_samples))) + u),
+                            n_samples)
+        bounds[-1] = n_samples
+        allocation = np.diff(bounds).astype(int)
+
+        gen = numpy_rng(self.rng)
+        attack_sets = []
+        for m, n_m in zip(counts, allocation):
+            for i in range(n_m):
+                attack_sets.append(gen.choice(self.high, m, replace=False).tolist() +
+                                   gen.choice(self.low, attack_size - m, replace=False).tolist())
+        return (attack_sets, np.ones(n_samples))
+
+
+class ImportanceSampler(StratifiedSampler):
+    def __init__(self, case, rng=random, highFraction=0.25, tilt=0.2):
+        """ARGUMENTS: case: dict (representing a PYPOWER case file),
+                   rng: random.Random,
+                   highFraction: float (see StratifiedSampler),
+                   tilt: float (exponential tilt of the number of attacked
+                         high-flow lines: each one multiplies the odds of an
+                         attack set by exp(tilt); larger tilts spread the
+                         weights and lower the effective sample size)
+        """
+        StratifiedSampler.__init__(self, case, rng, highFraction)
+        self.tilt = tilt
+
+    def draw(self, attack_size, n_samples, offset=0):
+        n_high = len(self.high)
+        counts = np.arange(min(attack_size, n_high) + 1)
+        from scipy.stats import hypergeom
+        p = hypergeom.pmf(counts, self.n_branches, n_high, attack_size)
+        feasible = (attack_size - counts <= len(self.low)) & (p > 0)
+        counts, p = counts[feasible], p[feasible] / p[feasible].sum()
+        # proposal: hypergeometric tilted towards more high-flow lines
+        q = p * np.exp(self.tilt * (counts - counts.mean()))
+        q /= q.sum()
+
+        gen = numpy_rng(self.rng)
+        drawn = gen.choice(len(counts), n_samples, p=q)
+        attack_sets = [gen.choice(self.high, counts[j], replace=False).tolist() +
+                       gen.choice(self.low, attack_size - counts[j], replace=False).tolist()
+                       for j in drawn]
+        # within a count the attack is uniform under both distributions, so
+        # the likelihood ratio of the attack set is that of its count
+        return (attack_sets, p[drawn] / q[drawn])
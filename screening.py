@@ -0,0 +1,304 @@
+import numpy as np
+import multiprocessing
+import csv
+
+import pypower.idx_brch as idx_brch
+
+import simulation
+from basecase import base_cases, copy_case
+from backends import component_labels
+from memo import CascadeMemo, memoizable
+from kernel import get_kernel
+from rescale_power import rescale_power_labeled
+from sharedcase import SharedCases, attach_cases
+
+"""
+screening.py - N-1 and N-2 contingency screening. Ranks single and double line
+outages by the cascades they trigger without simulating every one of them:
+
+1. The first round of every contingency's cascade is predicted from the base
+   case with line outage distribution factors (one rank-1 or rank-2 update of
+   the base case flows per contingency, vectorized over contingencies).
+2. A contingency that keeps the grid connected and overloads no line in its
+   first round cannot start a cascade: its cascade ends after one round, with
+   only its own lines failed and no load lost. These are pruned.
+3. The remaining contingencies (predicted overloads, outages that island the
+   grid, and outages of phase shifting lines, which LODFs do not model) are
+   simulated in parallel (with the cascade kernel for the native solver) and
+   ranked.
+
+The predictions are DC power flows, so only screenings with a DC solver are
+pruned; with the 'ac' solver every contingency is simulated.
+"""
+
+# solvers whose flows the LODF predictions of prune() reproduce
+DC_SOLVERS = ('pypower', 'native', 'lodf')
+
+def first_round_flows(grid, solver='native'):
+    """Computes the line flows every contingency's first round starts from: the
+    base case after the rescaling run_simulation() applies to the (connected)
+    grid, solved again.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               solver: str (see basecase.get_solver())
+    RETURNS:   numpy array (of branch flows in MW)
+    """
+    base = base_cases.get(grid, solver)
+    grid = copy_case(base['grid'])
+    labels = component_labels(grid)
+    if labels.max() > 0:
+        raise ValueError("contingency screening needs a connected base grid")
+    rescale_power_labeled(grid, labels)
+    return base['rundcpf'](grid)[0]['branch'][:, idx_brch.PF]
+
+def predict_n1(M, flows, capacities, margin=1e-6, minDet=1e-6):
+    """Predicts which single line outages overload a line in their first round.
+
+    ARGUMENTS: M: numpy array (LODFPowerFlow.M of the base case),
+               flows: numpy array (from first_round_flows()),
+               capacities: numpy array,
+               margin: float (flows within this fraction of a capacity count as
+                       overloads, to absorb rounding),
+               minDet: float (outages whose LODF update has a smaller
+                       determinant are taken to island the grid)
+    RETURNS:   tuple of numpy arrays (of bools, one per line: predicted
+               overload, islands the grid)
+    """
+    n = len(flows)
+    det = 1 - np.diag(M)
+    islanding = abs(det) < minDet
+    with np.errstate(divide='ignore', invalid='ignore'):
+        transfers = np.where(islanding, 0., flows / det)
+    post = flows[:, None] + M * transfers[None, :]
+    post[np.arange(n), np.arange(n)] = 0
+    limit = capacities * (1 - margin)
+    overload = (abs(post) > limit[:, None]).any(axis=0)
+    return (overload, islanding)
+
+def predict_n2(M, flows, capacities, j, margin=1e-6, minDet=1e-6):
+    """Predicts which double line outages (j, k), k > j, overload a line in
+    their first round.
+
+    ARGUMENTS: j: int (the first line of the pairs),
+               see predict_n1() for the others
+    RETURNS:   tuple (numpy array (of the lines k), and numpy arrays of bools
+               (one per k: predicted overload, islands the grid))
+    """
+    n = len(flows)
+    k = np.arange(j + 1, n)
+    # (I - M_KK) x = flows_K for K = (j, k)
+    a = 1 - M[j, j]
+    b = -M[j, k]
+    c = -M[k, j]
+    d = 1 - M[k, k]
+    det = a * d - b * c
+    islanding = abs(det) < minDet
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_j = np.where(islanding, 0., (d * flows[j] - b * flows[k]) / det)
+        x_k = np.where(islanding, 0., (a * flows[k] - c * flows[j]) / det)
+    post = flows[:, None] + M[:, j][:, None] * x_j[None, :] + M[:, k] * x_k[None, :]
+    post[j, :] = 0
+    post[k, np.arange(len(k))] = 0
+    limit = capacities * (1 - margin)
+    overload = (abs(post) > limit[:, None]).any(axis=0)
+    return (k, overload, islanding)
+
+def prune(grid, capacities, order=2, solver='native', margin=1e-6):
+    """Finds the contingencies of up to order lines that may start a cascade.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               capacities: numpy array,
+               order: int (1 for N-1, 2 for N-1 and N-2),
+               solver: str (the solver the contingencies will be simulated
+                       with, one of DC_SOLVERS; see basecase.get_solver()),
+               margin: float (see predict_n1())
+    RETURNS:   tuple (list (of contingencies, as tuples of lines, to simulate),
+               dict (counts of screened, pruned and islanding contingencies,
+               and of those with a phase shifting line))
+    """
+    if solver not in DC_SOLVERS:
+        raise ValueError("contingencies cannot be pruned for the '%s' solver, whose "
+                         "flows DC line outage distribution factors do not predict" % solver)
+    lodf = base_cases.get(grid, 'lodf')['solver']
+    M = lodf.M
+    flows = first_round_flows(grid, solver)
+    capacities = np.asarray(capacities, dtype=float)
+    shifter = lodf.shift != 0
+    n = len(flows)
+
+    survivors = []
+    counts = {'screened': 0, 'pruned': 0, 'islanding': 0, 'phase_shifter': 0}
+    overload, islanding = predict_n1(M, flows, capacities, margin)
+    keep = overload | islanding | shifter
+    survivors.extend((int(j),) for j in np.flatnonzero(keep))
+    counts['screened'] += n
+    counts['islanding'] += int(islanding.sum())
+    counts['phase_shifter'] += int(shifter.sum())
+
+    if order >= 2:
+        for j in range(n - 1):
+            k, overload, islanding = predict_n2(M, flows, capacities, j, margin)
+            pair_shifter = shifter[j] | shifter[k]
+            keep = overload | islanding | pair_shifter
+            survivors.extend((j, int(line)) for line in k[keep])
+            counts['screened'] += len(k)
+            counts['islanding'] += int(islanding.sum())
+            counts['phase_shifter'] += int(pair_shifter.sum())
+    counts['pruned'] = counts['screened'] - len(survivors)
+    return (survivors, counts)
+
+def all_contingencies(grid, order=2):
+    """Lists every contingency of up to order lines, without pruning.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               order: int (1 for N-1, 2 for N-1 and N-2)
+    RETURNS:   tuple (list (of contingencies, as tuples of lines), dict (counts
+               as returned by prune(), with none pruned or predicted))
+    """
+    n = len(grid['branch'])
+    contingencies = [(j,) for j in range(n)]
+    if order >= 2:
+        contingencies.extend((j, k) for j in range(n - 1) for k in range(j + 1, n))
+    counts = {'screened': len(contingencies), 'pruned': 0, 'islanding': 0, 'phase_shifter': 0}
+    return (contingencies, counts)
+
+
+# state of the worker processes, set by init_worker()
+_worker = dict()
+
+def init_worker(shared, name, capacities, solver):
+    """Process pool initializer: attaches to the base case in shared memory (see
+    sharedcase.py) and keeps the screening's capacities and solver.
+    """
+    shm, cases = attach_cases(shared)
+    _worker.update({'shm': shm, 'grid': cases[name], 'capacities': capacities,
+                    'solver': solver,
+                    'memo': CascadeMemo() if memoizable(cases[name]) else None})
+
+def simulate(contingencies, grid, capacities, solver='native', memo=None):
+    """Simulates the cascade of each contingency, with the cascade kernel (see
+    kernel.py, which gives the same results) for the native solver and
+    simulation.run_simulation() otherwise.
+
+    ARGUMENTS: contingencies: list (of tuples of lines),
+               grid: dict (representing a PYPOWER case file),
+               capacities: numpy array,
+               solver: str (see basecase.get_solver()),
+               memo: memo.CascadeMemo (shared by the contingencies, for
+                     run_simulation())
+    RETURNS:   list of dicts (one row of the ranking per contingency)
+    """
+    rows = []
+    for contingency in contingencies:
+        if solver == 'native':
+            output = get_kernel(grid).run(capacities, list(contingency))
+        else:
+            output = simulation.run_simulation(grid, capacities, list(contingency),
+                                               solver=solver, memo=memo)
+        rows.append({'contingency': contingency,
+                     'failed_lines': len(output['failed_lines']),
+                     'power_loss': output['power_loss'],
+                     'system_size': output['system_size'],
+                     'cascade_length': len(output['failure_history'])})
+    return rows
+
+def run_task(contingencies):
+    return simulate(contingencies, _worker['grid'], _worker['capacities'],
+                    _worker['solver'], _worker['memo'])
+
+def screen(grid, capacities, order=2, workers=None, solver='native', chunkSize=200,
+           margin=1e-6, printProgress=False):
+    """Screens the N-1 (and N-2) contingencies of a grid: prunes those that
+    cannot start a cascade (see screening.py) and simulates the rest.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               capacities: numpy array,
+               order: int (1 for N-1, 2 for N-1 and N-2),
+               workers: int (number of processes; defaults to the CPU count,
+                        and 1 simulates in this process),
+               solver: str (see basecase.get_solver()),
+               chunkSize: int (contingencies per task),
+               margin: float (see predict_n1()),
+               printProgress: bool
+    RETURNS:   dict ('ranking': list of dicts (contingency, failed_lines,
+               power_loss, system_size and cascade_length of every simulated
+               contingency, largest power loss first, then most failed lines),
+               plus the counts of prune() (or of all_contingencies() for
+               solvers other than DC_SOLVERS) and the number 'simulated';
+               pruned contingencies fail only their own lines and lose no
+               load)
+    """
+    if 'areas' in grid:
+        del grid['areas']
+    capacities = np.asarray(capacities, dtype=float)
+    if solver in DC_SOLVERS:
+        survivors, counts = prune(grid, capacities, order, solver, margin)
+    else:
+        survivors, counts = all_contingencies(grid, order)
+    chunks = [survivors[i:i + chunkSize] for i in range(0, len(survivors), chunkSize)]
+
+    rows = []
+    if workers == 1:
+        # cascades on grids with bus shunts depend on the order lines fail in
+        memo = CascadeMemo() if memoizable(grid) else None
+        for i, chunk in enumerate(chunks):
+            rows.extend(simulate(chunk, grid, capacities, solver, memo))
+            if printProgress:
+                print("\r%d%%... " % round(100 * (i + 1) / len(chunks)), end='', flush=True)
+    else:
+        with SharedCases({'grid': grid}, solvers=[solver]) as shared:
+            initargs = (shared.descriptor, 'grid', capacities, solver)
+            with multiprocessing.Pool(workers, initializer=init_worker,
+                                      initargs=initargs) as pool:
+                for i, result in enumerate(pool.imap(run_task, chunks)):
+                    rows.extend(result)
+                    if printProgress:
+                        print("\r%d%%... " % round(100 * (i + 1) / len(chunks)), end='',
+                              flush=True)
+
+    rows.sort(key=lambda row : (-row['power_loss'], -row['failed_lines'], row['contingency']))
+    output = dict(counts)
+    output['simulated'] = len(rows)
+    output['ranking'] = rows
+    return output
+
+def proportional_screen(grid, a, order=2, workers=None, solver='native', **kwargs):
+    """Screens contingencies with capacities proportional to initial load (i.e.
+    C = (1+a)*L).
+
+    See screen() for more details.
+    """
+    capacities = base_cases.get(grid, solver)['flows']*(1+a)
+    return screen(grid, capacities, order, workers, solver, **kwargs)
+
+def ranking_table(output, top=20):
+    """Formats the top of a screening's ranking.
+
+    ARGUMENTS: output: dict (from screen()),
+               top: int (number of rows)
+    RETURNS:   str
+    """
+    out_string = '\n%d contingencies screened, %d pruned, %d simulated' % (
+        output['screened'], output['pruned'], output['simulated'])
+    out_string += '\n\n Rank   Lines         Failed   Power loss   Rounds'
+    out_string += '\n------  ------------  ------  -----------  -------'
+    for i, row in enumerate(output['ranking'][:top]):
+        lines = ','.join(str(line) for line in row['contingency'])
+        out_string += '\n%5d   %-12s%8d%13.4f%9d' % (i + 1, lines, row['failed_lines'],
+                                                     row['power_loss'], row['cascade_length'])
+    return out_string
+
+def ranking_to_csv(output, fname):
+    """Writes a screening's ranking as CSV.
+
+    ARGUMENTS: output: dict (from screen()),
+               fname: str
+    """
+    with open(fname, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['rank', 'lines', 'failed_lines', 'power_loss', 'system_size',
+                         'cascade_length'])
+        for i, row in enumerate(output['ranking']):
+            writer.writerow([i + 1, ' '.join(str(line) for line in row['contingency']),
+                             row['failed_lines'], row['power_loss'], row['system_size'],
+                             row['cascade_length']])
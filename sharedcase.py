@@ -0,0 +1,151 @@
+import numpy as np
+import sys
+from multiprocessing import shared_memory, resource_tracker
+
+from basecase import base_cases, solver_matrices
+
+"""
+sharedcase.py - Base cases in shared memory for multi-process sweeps. The parent
+process solves each base case once and packs the case's arrays, the solved
+case's arrays and the solver's dense matrices (e.g. the PTDF of the 'lodf'
+solver) into a single multiprocessing.shared_memory block. Workers receive only
+a small descriptor of the block, attach to it, and seed their base case cache
+(see basecase.py) with read-only views of the arrays, so no worker copies a
+case or repeats its base case solve.
+"""
+
+# numpy arrays are aligned to this many bytes in the block
+ALIGNMENT = 64
+
+
+def _attach(name):
+    """Attaches to an existing shared memory block without registering it
+    with the resource tracker, which would otherwise unlink the block when the
+    first worker exits (Python < 3.13).
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype : None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def _layout(arrays, offset, layout):
+    """Assigns aligned offsets to arrays.
+
+    ARGUMENTS: arrays: dict (key -> numpy array),
+               offset: int (first free byte),
+               layout: dict (output, key -> (offset, shape, dtype str))
+    RETURNS:   int (next free byte)
+    """
+    for key, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[key] = (offset, array.shape, array.dtype.str)
+        offset += array.nbytes
+    return offset
+
+def _views(buf, layout):
+    """RETURNS: dict (key -> read-only numpy array over buf)"""
+    views = dict()
+    for key, (offset, shape, dtype) in layout.items():
+        view = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        view.flags.writeable = False
+        views[key] = view
+    return views
+
+def _split_case(ppc):
+    """Splits a case file into its numpy arrays and its other entries."""
+    arrays = {key: np.ascontiguousarray(value) for key, value in ppc.items()
+              if isinstance(value, np.ndarray)}
+    other = {key: value for key, value in ppc.items() if not isinstance(value, np.ndarray)}
+    return (arrays, other)
+
+
+class SharedCases(object):
+    """Owner of a shared memory block holding solved base cases. Use as a
+    context manager, or call close() to free the block.
+    """
+
+    def __init__(self, cases, solvers=('pypower',)):
+        """Solves every case with every solver (through base_cases) and copies
+        the results into a new shared memory block.
+
+        ARGUMENTS: cases: dict (case name -> dict representing a PYPOWER case
+                          file),
+                   solvers: list (of solver names, see basecase.get_solver())
+        """
+        layout = dict()
+        descriptor = {'cases': dict()}
+        sources = dict()
+        offset = 0
+        for name, case in cases.items():
+            arrays, other = _split_case(case)
+            entry = {'other': other, 'arrays': dict(), 'solved': dict()}
+            offset = _layout(arrays, offset, entry['arrays'])
+            sources[(name, 'case')] = arrays
+            for solver in solvers:
+                base = base_cases.get(case, solver)
+                solved_arrays, solved_other = _split_case(base['grid'])
+                matrices = solver_matrices(base['solver'])
+                solved = {'other': solved_other, 'arrays': dict(), 'matrices': dict()}
+                offset = _layout(solved_arrays, offset, solved['arrays'])
+                offset = _layout(matrices, offset, solved['matrices'])
+                sources[(name, solver, 'arrays')] = solved_arrays
+                sources[(name, solver, 'matrices')] = matrices
+                entry['solved'][solver] = solved
+            descriptor['cases'][name] = entry
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        descriptor['name'] = self.shm.name
+        self.descriptor = descriptor
+        self.nbytes = offset
+
+        # copy everything in
+        for name, entry in descriptor['cases'].items():
+            self._fill(entry['arrays'], sources[(name, 'case')])
+            for solver, solved in entry['solved'].items():
+                self._fill(solved['arrays'], sources[(name, solver, 'arrays')])
+                self._fill(solved['matrices'], sources[(name, solver, 'matrices')])
+
+    def _fill(self, layout, arrays):
+        for key, (offset, shape, dtype) in layout.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            view[...] = arrays[key]
+
+    def close(self):
+        """Frees the shared memory block. Workers must be done with it."""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_cases(descriptor):
+    """Attaches to the block of a SharedCases object and adds its solved base
+    cases to base_cases. The returned case files (and base_cases' entries for
+    them) are read-only views of the block, valid while the returned handle is
+    open.
+
+    ARGUMENTS: descriptor: dict (SharedCases.descriptor)
+    RETURNS:   tuple (shared_memory.SharedMemory handle, dict (case name ->
+               dict representing a PYPOWER case file))
+    """
+    shm = _attach(descriptor['name'])
+    cases = dict()
+    for name, entry in descriptor['cases'].items():
+        case = dict(entry['other'])
+        case.update(_views(shm.buf, entry['arrays']))
+        for solver, solved in entry['solved'].items():
+            grid = dict(solved['other'])
+            grid.update(_views(shm.buf, solved['arrays']))
+            base_cases.put(case, solver, grid, _views(shm.buf, solved['matrices']) or None)
+        cases[name] = case
+    return (shm, cases)
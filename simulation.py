@@ -1,14 +1,18 @@
-import pypower.api as pp
-import networkx as nx
 import numpy as np
-import copy
+import time
 
 import pypower.idx_brch as idx_brch
 import pypower.idx_bus as idx_bus
 import pypower.idx_gen as idx_gen
 
-from components import get_components, combine_components
-from rescale_power import rescale_power_down, rescale_power_gen
+from components import labels_to_ppc_components, combine_components
+from backends import get_tracker
+from basecase import base_cases, copy_case
+from history import GridHistory
+from memo import failed_set_key
+from observers import STAGES
+from islandcache import IslandSolveCache
+from rescale_power import rescale_power_labeled
 
 
 def system_summary(grid, components, capacities):
@@ -67,7 +71,28 @@ def system_summary(grid, components, capacities):
 simulation.py - main functions for running cascading failure simulation
 """
 
-def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=False):
+def _no_clock():
+    return 0.
+
+def _notify(observers, n_round, timings, n_islands, n_solved, new_failed_lines,
+            load_served, pf_counts=None):
+    """Sends the event of one round to every observer (see observers.py)."""
+    event = {'round': n_round,
+             'timings': timings if timings is not None else dict.fromkeys(STAGES, 0.),
+             'n_islands': n_islands,
+             'n_solved': n_solved,
+             'new_failed_lines': new_failed_lines,
+             'load_served': load_served,
+             'memoized': timings is None,
+             'pf_iterations': pf_counts['iterations'] if pf_counts else None,
+             'pf_fallbacks': pf_counts['fallbacks'] if pf_counts else None}
+    for observer in observers:
+        observer.on_round(event)
+
+
+def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=False,
+                   solver='pypower', memo=None, observers=None, reuseIslands=True,
+                   backend=None):
     """Runs a cascading failure simulation.
 
     addition documentation goes here
@@ -76,24 +101,54 @@ def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=F
             capacities: list (of the same length as grid['branch']),
             attack_set: list (of line indices),
             verbose: bool,
-            step_limit: int
-    OUTPUT: dict (containing data about the simulation)
+            saveIterations: bool,
+            solver: str ('pypower', 'native' or 'lodf' for DC cascades, or
+                    'ac' for AC cascades, see basecase.get_solver()),
+            memo: memo.CascadeMemo (shared by simulations with the same grid,
+                  solver and capacities; rounds whose failed line set is in
+                  the memo are skipped. Not used with verbose or
+                  saveIterations, which need the grid of every round.),
+            observers: list (of observers.Observer, notified after every
+                       round with the round's stage timings, island counts,
+                       new failures and load served; see observers.py),
+            reuseIslands: bool (reuse the previous round's power flow for
+                          islands that are unchanged, see islandcache.py),
+            backend: str (graph backend for finding islands, see
+                     backends.get_tracker(); defaults to
+                     backends.get_default_backend())
+    OUTPUT: dict (containing data about the simulation, including the number
+            of islands_solved and islands_reused; if the cascade ends in
+            memoized rounds, grid, components and the isolated component and
+            bus lists are None)
     """
     # initialization
     if 'areas' in grid:
         del grid['areas']
-    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
-    grid = pp.rundcpf(grid, ppopt)[0]
+    use_memo = memo is not None and not (verbose or saveIterations)
+    if use_memo:
+        memo.bind(grid, capacities, solver)
+    base = base_cases.get(grid, solver)
+    rundcpf = base['rundcpf']
+    grid = copy_case(base['grid'])
     # record initial data
-    initial_power = sum(grid['bus'][:, idx_bus.PD])
+    initial_power = base['initial_power']
     initial_size = len(grid['branch'])
     # initialize data structures
     failed_lines = []
     failure_history = []
     new_failed_lines = attack_set
     components = []
+    tracker = get_tracker(grid, backend)
+    islands = IslandSolveCache(rundcpf, reuseIslands)
     if saveIterations:
-        grid_history = [copy.deepcopy(grid)]
+        grid_history = GridHistory(grid)
+    # set when memoized rounds were skipped and grid lags behind failed_lines
+    stale = False
+    # stage timings are only taken for observers
+    clock = time.perf_counter if observers else _no_clock
+    # Newton iteration and DC fallback counters of AC solvers
+    pf_counters = getattr(base['solver'], 'counters', None) if observers else None
+    n_round = 0
 
     if verbose:
         counter = 0
@@ -110,27 +165,57 @@ def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=F
         # keep track of failed lines
         failure_history.append(new_failed_lines)
         failed_lines.extend(new_failed_lines)
+
+        to_fail = new_failed_lines
+        if use_memo:
+            key = failed_set_key(failed_lines, initial_size)
+            outcome = memo.get(key)
+            if outcome is not None:
+                new_failed_lines, final_power = outcome
+                stale = True
+                if observers:
+                    _notify(observers, n_round, None, None, None,
+                            new_failed_lines, final_power)
+                n_round += 1
+                continue
+            if stale:
+                # fail everything that failed in the skipped rounds at once
+                grid = copy_case(base['grid'])
+                tracker = get_tracker(grid, backend)
+                to_fail = failed_lines
+                stale = False
         
         # fail lines
-        for line in new_failed_lines:
+        for line in to_fail:
             grid['branch'][line][idx_brch.BR_R] = np.inf
             grid['branch'][line][idx_brch.BR_X] = np.inf
 
-        # rescale power and run DC power flow in each component
-        components = get_components(grid)
+        # rescale power in every component, then run DC power flow in each
+        start = clock()
+        tracker.remove_lines(to_fail)
+        labeled = clock()
+        rescale_power_labeled(grid, tracker.labels)
+        rescaled = clock()
+        components = labels_to_ppc_components(tracker.labels, grid)
+        split = clock()
+        if pf_counters:
+            pf_before = pf_counters()
+        n_solves = 0
         for i, component in enumerate(components):
-            rescale_power_gen(component)
             if len(component['branch']) > 0:
-                components[i] = pp.rundcpf(component, ppopt)[0]
+                components[i], reused = islands.solve(component)
+                n_solves += not reused
+        islands.next_round()
+        solved = clock()
 
         # recombine components back to grid
         grid = combine_components(components, grid)
+        combined = clock()
                
         # find failed lines
-        new_failed_lines = []
-        for i in range(len(grid['branch'])):
-            if abs(grid['branch'][i][idx_brch.PF]) > capacities[i]:
-                new_failed_lines.append(i)
+        new_failed_lines = np.flatnonzero(abs(grid['branch'][:, idx_brch.PF])
+                                          > capacities).tolist()
+        scanned = clock()
 
         if verbose:
             print(system_summary(grid, components, capacities))
@@ -138,10 +223,31 @@ def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=F
             counter += 1
 
         if saveIterations:
-            grid_history.append(copy.deepcopy(grid))
+            grid_history.append(grid)
+
+        if use_memo or observers:
+            load_served = sum(grid['bus'][:, idx_bus.PD])
+        if use_memo:
+            memo.put(key, new_failed_lines, load_served, n_solves)
+        if observers:
+            timings = {'components': (labeled - start) + (split - rescaled),
+                       'rescale': rescaled - labeled,
+                       'solve': solved - split,
+                       'combine': combined - solved,
+                       'overload': scanned - combined}
+            pf_counts = None
+            if pf_counters:
+                pf_counts = {key: value - pf_before[key]
+                             for key, value in pf_counters().items()}
+            _notify(observers, n_round, timings, len(components), n_solves,
+                    new_failed_lines, load_served, pf_counts)
+        n_round += 1
         
     # compute power loss
-    final_power = sum(grid['bus'][:, idx_bus.PD])
+    if stale:
+        grid = components = None
+    else:
+        final_power = sum(grid['bus'][:, idx_bus.PD])
     power_loss = (initial_power - final_power) / initial_power
 
     #compute system size
@@ -149,9 +255,9 @@ def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=F
     system_size = final_size / initial_size
 
     # find isolated (no power generated) components and buses
-    isolated_components = []
-    isolated_buses = []
-    for component in components:
+    isolated_components = None if stale else []
+    isolated_buses = None if stale else []
+    for component in components or []:
         component_gen = sum(component['gen'][:, idx_gen.PG])
         if component_gen == 0:
             isolated_components.append(component)
@@ -166,35 +272,45 @@ def run_simulation(grid, capacities, attack_set, verbose=False, saveIterations=F
                    "isolated_components": isolated_components,
                    "isolated_buses": isolated_buses,
                    "grid": grid,
-                   "capacities": capacities}
+                   "capacities": capacities,
+                   "islands_solved": islands.solved,
+                   "islands_reused": islands.reused}
     if saveIterations:
         output_data["grid_history"] = grid_history
 
+    if observers:
+        for observer in observers:
+            observer.on_finish(output_data)
+
     return output_data
 
 
-def proportional_sim(grid, a, attack_set, verbose=False, saveIterations=False):
+def proportional_sim(grid, a, attack_set, verbose=False, saveIterations=False,
+                     solver='pypower', memo=None, observers=None,
+                     reuseIslands=True, backend=None):
     """Runs a cascading failure simulation, with capacities proportional to
     initial load (i.e. C = (1+a)*L).
 
     See run_simulation() for more details.
     """
-    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
-    initial_grid = pp.rundcpf(grid, ppopt)[0]
-    capacities = abs(initial_grid['branch'][:, idx_brch.PF])*(1+a)
+    capacities = base_cases.get(grid, solver)['flows']*(1+a)
 
     return run_simulation(grid, capacities, attack_set, verbose=verbose,
-                          saveIterations=saveIterations)
+                          saveIterations=saveIterations, solver=solver, memo=memo,
+                          observers=observers, reuseIslands=reuseIslands,
+                          backend=backend)
 
-def iid_sim(grid, dist, attack_set, verbose=False, saveIterations=False):
+def iid_sim(grid, dist, attack_set, verbose=False, saveIterations=False,
+            solver='pypower', memo=None, observers=None,
+            reuseIslands=True, backend=None):
     """Runs a cascading failure simulation, with capacities given by C = L + S, 
     where S is a random variable drawn from a given distribution.
 
     See run_simulation() for more details.
     """
-    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
-    initial_grid = pp.rundcpf(grid, ppopt)[0]
-    capacities = abs(initial_grid['branch'][:, idx_brch.PF]) + dist()
+    capacities = base_cases.get(grid, solver)['flows'] + dist()
 
     return run_simulation(grid, capacities, attack_set, verbose=verbose,
-                          saveIterations=saveIterations)
+                          saveIterations=saveIterations, solver=solver, memo=memo,
+                          observers=observers, reuseIslands=reuseIslands,
+                          backend=backend)
@@ -0,0 +1,169 @@
+import numpy as np
+import multiprocessing
+import random
+from functools import partial
+
+import batch
+import simulation
+from sharedcase import SharedCases, attach_cases
+from casestore import get_case
+
+"""
+sweep.py - Parallel system size sweeps. Spreads (case, attack size, chunk of
+iterations) tasks over a process pool. Every task draws its attack sets from its
+own RNG, seeded from a master seed and the task's coordinates, so the results
+do not depend on the number of workers or on the order tasks finish in. By
+default the solved base cases are placed in shared memory once (see
+sharedcase.py), so workers neither receive copies of the cases nor solve them.
+"""
+
+IEEE_CASES = {'30bus': partial(get_case, 'case30'), '57bus': partial(get_case, 'case57'),
+              '118bus': partial(get_case, 'case118'), '300bus': partial(get_case, 'case300')}
+
+# cases available to the worker processes, set by init_worker()
+_worker_cases = dict()
+# the worker's handle on the shared memory block its cases live in
+_worker_shm = None
+
+def init_worker(cases=None, shared=None):
+    """Process pool initializer: receives the case files once per worker rather
+    than once per task, or attaches to the base cases in shared memory.
+
+    ARGUMENTS: cases: dict (case name -> dict representing a PYPOWER case file),
+               shared: dict (sharedcase.SharedCases descriptor)
+    """
+    global _worker_cases, _worker_shm
+    if shared is not None:
+        _worker_shm, _worker_cases = attach_cases(shared)
+    else:
+        _worker_cases = cases
+
+def task_seed(masterSeed, case_index, attack_size, chunk):
+    """Derives the seed of one task from the master seed.
+
+    ARGUMENTS: masterSeed: int,
+               case_index, attack_size, chunk: int (the task's coordinates)
+    RETURNS:   int
+    """
+    seq = np.random.SeedSequence(masterSeed, spawn_key=(case_index, attack_size, chunk))
+    return int(seq.generate_state(1)[0])
+
+def run_task(task):
+    """Runs one chunk of iterations of one attack size on one case.
+
+    ARGUMENTS: task: tuple (case name, freespace, attack size, chunk index,
+                     number of iterations, seed, useBatch)
+    RETURNS:   tuple (case name, attack size, chunk index, dict of lists of
+               system_size, power_loss and cascade_length per sample)
+    """
+    name, freespace, attack_size, chunk, iterations, seed, useBatch = task
+    case = _worker_cases[name]
+    rng = random.Random(seed)
+    dist = lambda : freespace
+    n_branches = len(case['branch'])
+
+    attack_sets = [rng.sample(range(n_branches), attack_size) for i in range(iterations)]
+    if useBatch:
+        attacks = np.zeros((iterations, n_branches), dtype=bool)
+        for i, attack_set in enumerate(attack_sets):
+            attacks[i, attack_set] = True
+        result = batch.iid_batch(case, dist, attacks)
+        samples = {key: list(result[key])
+                   for key in ('system_size', 'power_loss', 'cascade_length')}
+    else:
+        samples = {'system_size': [], 'power_loss': [], 'cascade_length': []}
+        for attack_set in attack_sets:
+            result = simulation.iid_sim(case, dist, attack_set)
+            samples['system_size'].append(result['system_size'])
+            samples['power_loss'].append(result['power_loss'])
+            samples['cascade_length'].append(len(result['failure_history']))
+    return (name, attack_size, chunk, samples)
+
+def make_tasks(cases, freespace, minAttack, maxAttack, interval, iterations,
+               chunkSize, masterSeed, useBatch):
+    """Splits a sweep into tasks, most expensive first (small attacks lead to
+    longer cascades) so that the pool is load-balanced.
+
+    RETURNS: list of tuples (see run_task())
+    """
+    tasks = []
+    for case_index, name in enumerate(sorted(cases.keys())):
+        n_branches = len(cases[name]['branch'])
+        for attack_size in range(int(n_branches * minAttack), int(n_branches * maxAttack),
+                                 interval):
+            for chunk, start in enumerate(range(0, iterations, chunkSize)):
+                seed = task_seed(masterSeed, case_index, attack_size, chunk)
+                n = min(chunkSize, iterations - start)
+                tasks.append((name, freespace, attack_size, chunk, n, seed, useBatch))
+    cost = lambda task : (len(cases[task[0]]['branch']) - task[2]) * task[4]
+    return sorted(tasks, key=cost, reverse=True)
+
+def parallel_sweep(freespace, minAttack, maxAttack, interval, cases=None,
+                   iterations=200, chunkSize=50, workers=None, masterSeed=0,
+                   useBatch=True, printProgress=False, store=None, shareMemory=True):
+    """Runs systemsize_analysis.equal_freespace() style sweeps over several
+    cases on a process pool.
+
+    ARGUMENTS: freespace: float,
+               minAttack, maxAttack: float (fractions of the number of branches
+                                     in each case, as in analyze_jsonout()),
+               interval: int,
+               cases: dict (case name -> PYPOWER case file; defaults to the
+                      IEEE 30, 57, 118 and 300 bus cases),
+               iterations: int (per attack size),
+               chunkSize: int (iterations per task),
+               workers: int (number of processes; defaults to the CPU count),
+               masterSeed: int,
+               useBatch: bool (run each task with batch.iid_batch()),
+               printProgress: bool,
+               store: resultstore.ResultStore (if given, every sample is
+                      appended to it, chunk by chunk in a fixed order),
+               shareMemory: bool (solve the base cases once and share them
+                            with the workers through shared memory, rather
+                            than sending every worker a copy to solve)
+    RETURNS:   dict (case name -> dict with 'average' and 'raw' entries, as
+               returned by equal_freespace())
+    """
+    if cases is None:
+        cases = {name: case() for name, case in IEEE_CASES.items()}
+    tasks = make_tasks(cases, freespace, minAttack, maxAttack, interval, iterations,
+                       chunkSize, masterSeed, useBatch)
+
+    shared = None
+    if shareMemory:
+        # run_task() solves with batch.iid_batch() or simulation.iid_sim()
+        shared = SharedCases(cases, solvers=['native' if useBatch else 'pypower'])
+        initargs = (None, shared.descriptor)
+    else:
+        initargs = (cases,)
+
+    chunks = dict()
+    try:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+            for i, result in enumerate(pool.imap_unordered(run_task, tasks)):
+                name, attack_size, chunk, samples = result
+                chunks[(name, attack_size, chunk)] = samples
+                if printProgress:
+                    print("\r%d%%... " % round(100 * (i + 1) / len(tasks)), end='', flush=True)
+    finally:
+        if shared is not None:
+            shared.close()
+
+    # reassemble in a fixed order
+    results = dict()
+    for name in cases:
+        results[name] = {'average': dict(), 'raw': dict()}
+    for (name, attack_size, chunk) in sorted(chunks.keys()):
+        samples = chunks[(name, attack_size, chunk)]
+        raw = results[name]['raw'].setdefault(attack_size, [])
+        raw.extend(samples['system_size'])
+        if store is not None:
+            store.append(name, attack_size, **samples)
+    if store is not None:
+        store.flush()
+    for name in results:
+        for attack_size, raw in results[name]['raw'].items():
+            results[name]['average'][attack_size] = np.mean(raw)
+        results[name]['raw'] = dict(sorted(results[name]['raw'].items()))
+        results[name]['average'] = dict(sorted(results[name]['average'].items()))
+    return results
@@ -1,17 +1,30 @@
 import simulation
+import batch
+import kernel
+import sweep
+from memo import CascadeMemo
+from sampling import get_sampler
+from resultstore import ResultStore
+from checkpoint import SweepCheckpoint
+from casestore import get_case
+from basecase import case_hash
 import random
 import numpy as np
-import pypower.api as pp
 import csv
 import sys
 import copy
 import json
 import signal
+from contextlib import nullcontext
 
 import pypower.idx_bus as idx_bus
 import pypower.idx_brch as idx_brch
 import pypower.idx_gen as idx_gen
 
+# solvers whose base cases are stored with the IEEE cases the sweeps load (see
+# casestore.py)
+SWEEP_SOLVERS = ('native', 'pypower')
+
 def equalize_generation(ppc):
     n_gen = len(ppc['gen'])
     total_load = sum(ppc['bus'][:,idx_bus.PD])
@@ -19,32 +32,221 @@ def equalize_generation(ppc):
     return ppc
 
 def avg_line_flow(ppc):
-    ppc = pp.rundcpf(ppc, pp.ppoption(VERBOSE=0, OUT_ALL=0))[0]
+    from pypower.ppoption import ppoption
+    from pypower.rundcpf import rundcpf
+    ppc = rundcpf(ppc, ppoption(VERBOSE=0, OUT_ALL=0))[0]
     return np.mean(abs(ppc['branch'][:, idx_brch.PF]))
 
+def sample_system_sizes(case, dist, attack_size, n_samples, useBatch=False, memo=None,
+                        observers=None, sampler=None, offset=0, useKernel=False):
+    """Runs n_samples simulations of random attacks of attack_size lines.
+
+    ARGUMENTS: case: dict (representing a PYPOWER case file),
+               dist: function (capacity distribution, see iid_sim()),
+               attack_size: int,
+               n_samples: int,
+               useBatch: bool (run all samples together with batch.iid_batch()),
+               memo: memo.CascadeMemo,
+               observers: list (of observers.Observer),
+               sampler: sampling sampler object (draws the attack sets and
+                        their weights; defaults to random.sample),
+               offset: int (number of samples already drawn for this attack
+                       size, see sampling.py),
+               useKernel: bool (run each sample with kernel.iid_kernel())
+    RETURNS:   dict (lists of the system_size, power_loss and cascade_length of
+               each sample, and a numpy array of sample weights, keyed as the
+               columns of resultstore.ResultStore)
+    """
+    n_branches = len(case['branch'])
+    if sampler is not None:
+        attack_sets, weights = sampler.draw(attack_size, n_samples, offset)
+    else:
+        attack_sets = [random.sample(range(n_branches), attack_size)
+                       for i in range(n_samples)]
+        weights = np.ones(n_samples)
+
+    if useBatch:
+        # run all iterations together (the memo and observers only apply to
+        # run_simulation())
+        attacks = np.zeros((n_samples, n_branches), dtype=bool)
+        for i, attack_set in enumerate(attack_sets):
+            attacks[i, attack_set] = True
+        batch_result = batch.iid_batch(case, dist, attacks)
+        return {'system_size': list(batch_result['system_size']),
+                'power_loss': list(batch_result['power_loss']),
+                'cascade_length': list(batch_result['cascade_length']),
+                'weight': weights}
+
+    samples = {'system_size': [], 'power_loss': [], 'cascade_length': [], 'weight': weights}
+    if useKernel:
+        # the memo and observers only apply to run_simulation()
+        for attack_set in attack_sets:
+            iter_result = kernel.iid_kernel(case, dist, attack_set)
+            samples['system_size'].append(iter_result['system_size'])
+            samples['power_loss'].append(iter_result['power_loss'])
+            samples['cascade_length'].append(iter_result['cascade_length'])
+        return samples
+    for attack_set in attack_sets:
+        iter_result = simulation.iid_sim(case, dist, attack_set, memo=memo,
+                                         observers=observers)
+        samples['system_size'].append(iter_result['system_size'])
+        samples['power_loss'].append(iter_result['power_loss'])
+        samples['cascade_length'].append(len(iter_result['failure_history']))
+    return samples
+
+def ci_halfwidth(samples, confidence=0.95, weights=None):
+    """Half-width of the Student t confidence interval of the mean of samples.
+    With weights, uses the delta method standard error of the weighted
+    (self-normalized) mean.
+
+    ARGUMENTS: samples: list (of floats, at least 2),
+               confidence: float,
+               weights: numpy array (of sample weights, see sampling.py)
+    RETURNS:   float
+    """
+    n = len(samples)
+    if n < 2:
+        return np.inf
+    from scipy.stats import t
+    q = t.ppf(0.5 + confidence / 2, n - 1)
+    if weights is None:
+        return q * np.std(samples, ddof=1) / np.sqrt(n)
+    samples = np.asarray(samples)
+    weights = np.asarray(weights)
+    mean = np.average(samples, weights=weights)
+    se = np.sqrt(np.sum((weights * (samples - mean))**2) * n / (n - 1)) / np.sum(weights)
+    return q * se
+
+def sweep_fingerprint(case, freespace, minAttack, maxAttack, interval, iterations,
+                      useBatch, adaptive, ciTarget, batchSize, confidence, sampling,
+                      useKernel):
+    """Fingerprint of the parameters an equal_freespace() sweep's results
+    depend on, which checkpoints are checked against (see
+    checkpoint.SweepCheckpoint.check()).
+
+    RETURNS: dict
+    """
+    return {'case': case_hash(case), 'freespace': float(freespace),
+            'attacks': (int(minAttack), int(maxAttack), int(interval)),
+            'iterations': int(iterations), 'sampling': sampling, 'adaptive': bool(adaptive),
+            'ciTarget': float(ciTarget) if adaptive else None,
+            'batchSize': int(batchSize) if adaptive else None,
+            'confidence': float(confidence), 'useBatch': bool(useBatch),
+            'useKernel': bool(useKernel)}
+
 def equal_freespace(case, freespace, minAttack, maxAttack, interval,
-                    iterations=200, printProgress=False):
+                    iterations=200, printProgress=False, useBatch=False,
+                    useMemo=False, observers=None, adaptive=False, ciTarget=0.01,
+                    batchSize=20, confidence=0.95, sampling=None, store=None,
+                    caseName='case', checkpoint=None, useKernel=False):
+    """Estimates the mean system size after attacks of each size in
+    range(minAttack, maxAttack, interval), with capacities C = L + freespace.
+
+    By default every attack size gets iterations samples. With adaptive=True,
+    samples are drawn batchSize at a time until the confidence interval
+    half-width of the mean falls to ciTarget or iterations samples have been
+    drawn, so deterministic attack sizes stop early and the budget goes to the
+    noisy ones.
+
+    sampling selects a variance reduction strategy for the attack sets
+    ('uniform', 'crn', 'stratified' or 'importance', see sampling.py); the
+    default draws independent random.sample attack sets, as 'uniform'.
+
+    useKernel runs each sample with the flat-array cascade kernel (see
+    kernel.py) instead of simulation.iid_sim().
+
+    If store (a resultstore.ResultStore) is given, every sample's system size,
+    power loss, cascade length and weight are appended to it under caseName,
+    and the store is flushed once the sweep is done.
+
+    If checkpoint (a checkpoint.SweepCheckpoint) is given, each attack size's
+    results are checkpointed under caseName once complete. Attack sizes already
+    in the checkpoint are not rerun, and the random state is restored from the
+    checkpoint before the first one that is, so a resumed sweep gives the same
+    results as an uninterrupted one. A checkpoint whose blocks for caseName
+    were computed with other parameters (see sweep_fingerprint()) raises a
+    checkpoint.CheckpointMismatch.
+
+    RETURNS: dict ('average' and 'raw' system sizes, 'ci' half-widths (at the
+             given confidence) and 'samples' counts, all keyed by attack size;
+             plus 'weights' (per sample in 'raw') if sampling is given, and
+             'memo' stats if useMemo)
+    """
     output = dict()
     output['average'] = dict()
     output['raw'] = dict()
+    output['ci'] = dict()
+    output['samples'] = dict()
+    sampler = None
+    if sampling is not None:
+        sampler = get_sampler(case, sampling)
+        output['weights'] = dict()
+    # all samples share the same capacities, so they can share cascade rounds
+    memo = CascadeMemo() if useMemo else None
 
     dist = lambda : freespace
-    n_branches = len(case['branch'])
+    resumed = False
+    if checkpoint is not None:
+        checkpoint.check(caseName, sweep_fingerprint(case, freespace, minAttack, maxAttack,
+                                                     interval, iterations, useBatch,
+                                                     adaptive, ciTarget, batchSize,
+                                                     confidence, sampling, useKernel))
         
     for attack_size in range(minAttack, maxAttack, interval):
         if printProgress:
             progress = attack_size/(maxAttack-minAttack)
             print("\r%d%%... " % round(progress*100), end='', flush=True)
 
-        system_sizes = []
-        for i in range(iterations):
-            attack_set = random.sample(range(n_branches), attack_size)
-            iter_result = simulation.iid_sim(case, dist, attack_set)
-            system_sizes.append(iter_result['system_size'])
-        avg_size = np.mean(system_sizes)
+        if checkpoint is not None:
+            block = checkpoint.completed(caseName, attack_size)
+            if block is not None:
+                for key, value in block.items():
+                    output[key][attack_size] = value
+                continue
+            if not resumed:
+                checkpoint.resume(sampler, caseName, store)
+                resumed = True
+
+        if adaptive:
+            system_sizes = []
+            weights = np.zeros(0)
+            while len(system_sizes) < iterations:
+                n = min(batchSize, iterations - len(system_sizes))
+                samples = sample_system_sizes(case, dist, attack_size, n, useBatch,
+                                              memo, observers, sampler, len(system_sizes),
+                                              useKernel)
+                if store is not None:
+                    store.append(caseName, attack_size, **samples)
+                system_sizes += samples['system_size']
+                weights = np.concatenate((weights, samples['weight']))
+                if ci_halfwidth(system_sizes, confidence, weights) <= ciTarget:
+                    break
+        else:
+            samples = sample_system_sizes(case, dist, attack_size, iterations,
+                                          useBatch, memo, observers, sampler,
+                                          useKernel=useKernel)
+            if store is not None:
+                store.append(caseName, attack_size, **samples)
+            system_sizes, weights = samples['system_size'], samples['weight']
+        if sampler is not None:
+            output['weights'][attack_size] = list(weights)
+            avg_size = np.average(system_sizes, weights=weights)
+            output['ci'][attack_size] = ci_halfwidth(system_sizes, confidence, weights)
+        else:
+            avg_size = np.mean(system_sizes)
+            output['ci'][attack_size] = ci_halfwidth(system_sizes, confidence)
         output['average'][attack_size] = avg_size
         output['raw'][attack_size] = copy.deepcopy(system_sizes)
-
+        output['samples'][attack_size] = len(system_sizes)
+        if checkpoint is not None:
+            block = {key: output[key][attack_size]
+                     for key in ('average', 'raw', 'ci', 'samples', 'weights') if key in output}
+            checkpoint.save(caseName, attack_size, block, sampler, store)
+
+    if store is not None:
+        store.flush()
+    if memo is not None:
+        output['memo'] = memo.stats()
     return output
 
 
@@ -60,7 +262,7 @@ def analyze_csvout(factor, minAttack, maxAttack, interval, fname, iterations=200
         print('  running 30 bus test case... ')
         writer.writerow(['IEEE 30 bus test case'])
         #c30 = equalize_generation(pp.case30())
-        c30 = pp.case30()
+        c30 = get_case('case30', SWEEP_SOLVERS)
         out30 = equal_freespace(c30, space(c30), 0, len(c30['branch']), interval,
                                 iterations=iterations, printProgress=True)
         print('    finished!')
@@ -71,7 +273,7 @@ def analyze_csvout(factor, minAttack, maxAttack, interval, fname, iterations=200
         writer.writerow([])
         writer.writerow(['IEEE 57 bus test case'])
         #c57 = equalize_generation(pp.case57())
-        c57 = pp.case57()
+        c57 = get_case('case57', SWEEP_SOLVERS)
         out57 = equal_freespace(c57, space(c57), 0, len(c57['branch']), interval,
                                 iterations=iterations, printProgress=True)
         print('    finished!')
@@ -82,7 +284,7 @@ def analyze_csvout(factor, minAttack, maxAttack, interval, fname, iterations=200
         writer.writerow([])
         writer.writerow(['IEEE 118 bus test case'])
         #c118 = equalize_generation(pp.case118())
-        c118 = pp.case118()
+        c118 = get_case('case118', SWEEP_SOLVERS)
         out118 = equal_freespace(c118, space(c118), 0, len(c118['branch']), interval,
                                  iterations=iterations, printProgress=True)
         print('    finished!')
@@ -93,7 +295,7 @@ def analyze_csvout(factor, minAttack, maxAttack, interval, fname, iterations=200
         writer.writerow([])
         writer.writerow(['IEEE 300 bus test case'])
         #c300 = equalize_generation(pp.case300())
-        c300 = pp.case300()
+        c300 = get_case('case300', SWEEP_SOLVERS)
         out300 = equal_freespace(c300, space(c300), 0, len(c300['branch']), interval,
                                  iterations=iterations, printProgress=True)
         print('    finished!')
@@ -103,42 +305,116 @@ def analyze_csvout(factor, minAttack, maxAttack, interval, fname, iterations=200
     print('System size analysis complete!')
 
 
-def analyze_jsonout(space, minAttack, maxAttack, interval, fname, iterations=200):
+def analyze_jsonout(space, minAttack, maxAttack, interval, fname, iterations=200,
+                    useBatch=False, adaptive=False, ciTarget=0.01, checkpointPath=None):
+    """Runs equal_freespace() on the IEEE 30, 57, 118 and 300 bus cases and
+    writes the results to fname as JSON.
+
+    If checkpointPath is given, every completed (case, attack size) block is
+    checkpointed there (see checkpoint.py), and SIGINT/SIGTERM stop the sweep
+    with a SweepInterrupted once any checkpoint being written is complete.
+    Rerunning with the same checkpointPath resumes where the sweep stopped. The
+    checkpoint is removed once the JSON output has been written.
+    """
     print("Beginning system size analysis...")
 
     results = dict()
+    checkpoint = SweepCheckpoint(checkpointPath) if checkpointPath is not None else None
+    if checkpoint is not None and len(checkpoint.blocks) > 0:
+        print('  resuming from %d checkpointed blocks in %s' % (len(checkpoint.blocks),
+                                                             checkpointPath))
+
+    with checkpoint.handle_signals() if checkpoint is not None else nullcontext():
+        print('  running 30 bus test case... ', end='', flush=True)
+        c30 = get_case('case30', SWEEP_SOLVERS)
+        n_b = len(c30['branch'])
+        results['30bus'] = equal_freespace(c30, space, int(n_b * minAttack), int(n_b * maxAttack),
+                                           interval, iterations=iterations,
+                                           useBatch=useBatch, adaptive=adaptive,
+                                           ciTarget=ciTarget, caseName='30bus',
+                                           checkpoint=checkpoint)
+        print('finished!')
+
+        print('  running 57 bus test case... ', end='', flush=True)
+        c57 = get_case('case57', SWEEP_SOLVERS)
+        n_b = len(c57['branch'])
+        results['57bus'] = equal_freespace(c57, space, int(n_b * minAttack), int(n_b * maxAttack),
+                                           interval, iterations=iterations,
+                                           useBatch=useBatch, adaptive=adaptive,
+                                           ciTarget=ciTarget, caseName='57bus',
+                                           checkpoint=checkpoint)
+        print('finished!')
+
+        print('  running 118 bus test case... ', end='', flush=True)
+        c118 = get_case('case118', SWEEP_SOLVERS)
+        n_b = len(c118['branch'])
+        results['118bus'] = equal_freespace(c118, space, int(n_b * minAttack), int(n_b * maxAttack),
+                                            interval, iterations=iterations,
+                                            useBatch=useBatch, adaptive=adaptive,
+                                            ciTarget=ciTarget, caseName='118bus',
+                                            checkpoint=checkpoint)
+        print('finished!')
+
+        print('  running 300 bus test case... ', end='', flush=True)
+        c300 = get_case('case300', SWEEP_SOLVERS)
+        n_b = len(c300['branch'])
+        results['300bus'] = equal_freespace(c300, space, int(n_b * minAttack), int(n_b * maxAttack),
+                                            interval, iterations=iterations,
+                                            useBatch=useBatch, adaptive=adaptive,
+                                            ciTarget=ciTarget, caseName='300bus',
+                                            checkpoint=checkpoint)
+        print('finished!')
+
+    with open(fname, 'w') as outfile:
+        json.dump(results, outfile)
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    print("Full system size analysis complete!")
+
+
+def analyze_parallel(space, minAttack, maxAttack, interval, fname, iterations=200,
+                     workers=None, masterSeed=0, storePath=None):
+    print("Beginning system size analysis on %s processes..." % (workers or 'all'))
 
-    print('  running 30 bus test case... ', end='', flush=True)
-    c30 = pp.case30()
-    n_b = len(c30['branch'])
-    results['30bus'] = equal_freespace(c30, space, int(n_b * minAttack), int(n_b * maxAttack),
-                                       interval, iterations=iterations)
-    print('finished!')
-
-    print('  running 57 bus test case... ', end='', flush=True)
-    c57 = pp.case57()
-    n_b = len(c57['branch'])
-    results['57bus'] = equal_freespace(c57, space, int(n_b * minAttack), int(n_b * maxAttack),
-                                       interval, iterations=iterations)
-    print('finished!')
-
-    print('  running 118 bus test case... ', end='', flush=True)
-    c118 = pp.case118()
-    n_b = len(c118['branch'])
-    results['118bus'] = equal_freespace(c118, space, int(n_b * minAttack), int(n_b * maxAttack),
-                                       interval, iterations=iterations)
-    print('finished!')
-
-    print('  running 300 bus test case... ', end='', flush=True)
-    c300 = pp.case300()
-    n_b = len(c300['branch'])
-    results['300bus'] = equal_freespace(c300, space, int(n_b * minAttack), int(n_b * maxAttack),
-                                       interval, iterations=iterations)
-    print('finished!')
+    store = ResultStore(storePath) if storePath is not None else None
+    results = sweep.parallel_sweep(space, minAttack, maxAttack, interval,
+                                   iterations=iterations, workers=workers,
+                                   masterSeed=masterSeed, printProgress=True,
+                                   store=store)
+    if store is not None:
+        store.close()
 
     with open(fname, 'w') as outfile:
         json.dump(results, outfile)
 
+    print("\nFull system size analysis complete!")
+
+
+def analyze_store(space, minAttack, maxAttack, interval, storePath, iterations=200,
+                  useBatch=True, jsonFname=None, csvFname=None):
+    """Runs the analyze_jsonout() sweep, appending every sample to a
+    resultstore.ResultStore at storePath, then streams the JSON and/or CSV
+    outputs out of the store.
+    """
+    print("Beginning system size analysis...")
+
+    store = ResultStore(storePath)
+    for name, load_case in sweep.IEEE_CASES.items():
+        print('  running %s test case... ' % name, end='', flush=True)
+        case = load_case()
+        n_b = len(case['branch'])
+        equal_freespace(case, space, int(n_b * minAttack), int(n_b * maxAttack), interval,
+                        iterations=iterations, useBatch=useBatch, store=store,
+                        caseName=name)
+        print('finished!')
+
+    if jsonFname is not None:
+        store.to_json(jsonFname)
+    if csvFname is not None:
+        store.to_csv(csvFname)
+    store.close()
+
     print("Full system size analysis complete!")
 
 
@@ -170,11 +446,22 @@ def json_to_csv(in_fname, out_fname):
     return
 
 
-def main(space, minAttack, maxAttack, interval, fname, iterations=200):
-    analyze_jsonout(space, minAttack, maxAttack, interval, fname, iterations=iterations)
+def main(space, minAttack, maxAttack, interval, fname, iterations=200, workers=None,
+         useBatch=False):
+    if workers is not None:
+        analyze_parallel(space, minAttack, maxAttack, interval, fname, iterations=iterations,
+                         workers=workers)
+    else:
+        analyze_jsonout(space, minAttack, maxAttack, interval, fname, iterations=iterations,
+                        useBatch=useBatch, checkpointPath=fname + '.checkpoint')
 
 if __name__ == '__main__':
-    if len(sys.argv) == 4:
+    if len(sys.argv) == 5:
+        workers = int(sys.argv[4])
+    else:
+        workers = None
+
+    if len(sys.argv) >= 4:
         iterations = int(sys.argv[3])
     else:
         iterations = 200
@@ -189,5 +476,6 @@ if __name__ == '__main__':
     else:
         fname = 'systemsize_analysis.txt'
 
-    main(space=space, fname=fname, iterations=iterations, minAttack=0, maxAttack=1, interval=1)
+    main(space=space, fname=fname, iterations=iterations, minAttack=0, maxAttack=1, interval=1,
+         workers=workers)
     #analyze_300_eqspace()
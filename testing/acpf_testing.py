@@ -0,0 +1,134 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+import sys
+sys.path.insert(0, '../')
+from acpf import *
+from observers import PowerFlowStats, RoundRecorder
+import components
+import simulation
+
+CASES = [pp.case30, pp.case57, pp.case118, pp.case300]
+PPOPT = pp.ppoption(VERBOSE=0, OUT_ALL=0)
+
+def assert_same_solution(a, b, branch_rows=None):
+    if branch_rows is None:
+        branch_rows = np.arange(len(a['branch']))
+    assert(np.allclose(a['bus'][:, [idx_bus.VM, idx_bus.VA]],
+                       b['bus'][:, [idx_bus.VM, idx_bus.VA]], atol=1e-6))
+    assert(np.allclose(a['gen'][:, [idx_gen.PG, idx_gen.QG]],
+                       b['gen'][:, [idx_gen.PG, idx_gen.QG]], atol=1e-6))
+    assert(np.allclose(a['branch'][np.ix_(branch_rows, BRANCH_RESULTS)],
+                       b['branch'][:, BRANCH_RESULTS], atol=1e-6))
+
+def test_base_cases():
+    for load_case in CASES:
+        case = load_case()
+        solver = ACPowerFlow(case)
+        results, success = solver.runpf(case)
+        expected, expected_success = pp.runpf(case, PPOPT)[:2]
+        assert(success == expected_success == 1)
+        assert_same_solution(results, expected)
+
+def test_islands(iterations=10):
+    for load_case in CASES:
+        case = load_case()
+        solver = ACPowerFlow(case)
+        n_branches = len(case['branch'])
+        for i in range(iterations):
+            grid = solver.runpf(case)[0]
+            failed = random.sample(range(n_branches), random.randint(1, n_branches // 10))
+            grid['branch'][failed, idx_brch.BR_R] = np.inf
+            grid['branch'][failed, idx_brch.BR_X] = np.inf
+            for island in components.get_components(grid):
+                if len(island['branch']) == 0 or len(island.gen_idx) == 0:
+                    continue
+                results, success = solver.runpf(island)
+                # pypower needs the failed lines removed
+                active = np.flatnonzero(island['branch'][:, idx_brch.BR_X] != np.inf)
+                reference = dict(island)
+                reference['branch'] = island['branch'][active]
+                expected, expected_success = pp.runpf(reference, PPOPT)[:2]
+                if success and expected_success:
+                    assert_same_solution(results, expected, active)
+                    assert(np.all(results['branch'][island['branch'][:, idx_brch.BR_X] == np.inf,
+                                                    idx_brch.PF] == 0))
+
+def test_warm_start():
+    case = pp.case118()
+    solver = ACPowerFlow(case)
+    solved = solver.runpf(case)[0]
+    n_structures = len(solver.structures)
+    iterations = solver.iterations
+    again, success = solver.runpf(solved)
+    # already converged, and the same topology
+    assert(success == 1)
+    assert(solver.iterations == iterations)
+    assert(len(solver.structures) == n_structures)
+    assert_same_solution(again, solved)
+
+def test_fallback():
+    case = pp.case30()
+    solver = ACPowerFlow(case, maxIter=0)
+    loaded = dict(case)
+    loaded['bus'] = case['bus'].copy()
+    loaded['bus'][:, idx_bus.VA] += 1.
+    results, success = solver.runpf(loaded)
+    assert(success == 0)
+    assert(solver.counters()['fallbacks'] == 1)
+    # the DC solution
+    assert(np.all(results['bus'][:, idx_bus.VM] == 1))
+    assert(np.all(results['branch'][:, idx_brch.QF] == 0))
+
+def test_ac_cascades(iterations=10):
+    case = pp.case118()
+    n_branches = len(case['branch'])
+    stats = PowerFlowStats()
+    recorder = RoundRecorder()
+    for i in range(iterations):
+        attack_set = random.sample(range(n_branches), 5)
+        output = simulation.proportional_sim(case, 0.2, attack_set, solver='ac',
+                                             observers=[stats, recorder])
+        assert(0 <= output['system_size'] <= 1)
+    assert(all(event['pf_iterations'] is not None for event in recorder.events))
+    assert(len(stats.rounds) == len(recorder.events))
+    assert(0 in stats.summary())
+    assert('Iter/island' in stats.report())
+
+    recorder = RoundRecorder()
+    simulation.proportional_sim(case, 0.2, [0, 1], solver='native', observers=[recorder])
+    assert(all(event['pf_iterations'] is None for event in recorder.events))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing base cases against pypower.runpf... ", end='', flush=True)
+    test_base_cases()
+    print("success!")
+
+    print("  Testing islands against pypower.runpf... ", end='', flush=True)
+    test_islands()
+    print("success!")
+
+    print("  Testing warm starts... ", end='', flush=True)
+    test_warm_start()
+    print("success!")
+
+    print("  Testing DC fallback... ", end='', flush=True)
+    test_fallback()
+    print("success!")
+
+    print("  Testing AC cascades... ", end='', flush=True)
+    test_ac_cascades()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,101 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+from backends import *
+import components
+import simulation
+
+CASES = [pp.case30, pp.case57, pp.case118, pp.case300]
+
+def fail_lines(case, lines):
+    case['branch'][lines, idx_brch.BR_R] = np.inf
+    case['branch'][lines, idx_brch.BR_X] = np.inf
+
+def test_backend_parity(iterations=20):
+    for load_case in CASES:
+        for i in range(iterations):
+            case = load_case()
+            n_branches = len(case['branch'])
+            fail_lines(case, random.sample(range(n_branches), random.randint(0, n_branches // 2)))
+
+            labels = [component_labels(case, backend) for backend in BACKENDS]
+            for other in labels[1:]:
+                assert(np.array_equal(labels[0], other))
+            assert(np.array_equal(labels[0], component_labels(case, 'auto')))
+
+            islands = [components.get_components(case, backend) for backend in BACKENDS]
+            for other in islands[1:]:
+                assert(len(other) == len(islands[0]))
+                for a, b in zip(islands[0], other):
+                    for key in ('bus', 'gen', 'branch'):
+                        assert(np.array_equal(a[key], b[key]))
+
+def test_trackers(rounds=10):
+    for load_case in CASES:
+        case = load_case()
+        n_branches = len(case['branch'])
+        order = random.sample(range(n_branches), n_branches // 2)
+        trackers = [get_tracker(case, 'auto')] + [get_tracker(case, b) for b in BACKENDS]
+        per_round = len(order) // rounds
+        for r in range(rounds):
+            lines = order[r * per_round:(r + 1) * per_round]
+            for tracker in trackers:
+                tracker.remove_lines(lines)
+            for tracker in trackers[1:]:
+                assert(np.array_equal(canonical_labels(trackers[0].labels), tracker.labels))
+
+def test_simulation_backends(iterations=5):
+    case = pp.case118()
+    n_branches = len(case['branch'])
+    for i in range(iterations):
+        attack_set = random.sample(range(n_branches), 5)
+        results = [simulation.proportional_sim(case, 0.2, attack_set, solver='native',
+                                               backend=backend)
+                   for backend in ('auto',) + BACKENDS]
+        for result in results[1:]:
+            assert(result['failure_history'] == results[0]['failure_history'])
+            assert(np.isclose(result['power_loss'], results[0]['power_loss']))
+
+def test_default_backend():
+    assert(get_default_backend() == 'auto')
+    set_default_backend('networkx')
+    assert(resolve_backend(10) == 'networkx')
+    set_default_backend('auto')
+    assert(resolve_backend(AUTO_THRESHOLD) == 'scipy')
+    try:
+        set_default_backend('graph-tool')
+    except ValueError:
+        pass
+    else:
+        assert(False)
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing backend parity... ", end='', flush=True)
+    test_backend_parity()
+    print("success!")
+
+    print("  Testing trackers... ", end='', flush=True)
+    test_trackers()
+    print("success!")
+
+    print("  Testing run_simulation() backends... ", end='', flush=True)
+    test_simulation_backends()
+    print("success!")
+
+    print("  Testing default backend... ", end='', flush=True)
+    test_default_backend()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
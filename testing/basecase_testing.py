@@ -0,0 +1,96 @@
+import pypower.api as pp
+import numpy as np
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+from basecase import *
+import simulation
+
+def test_hits_and_misses():
+    case = pp.case30()
+    base_cases.clear()
+    simulation.iid_sim(case, lambda : 10, [0, 1])
+    stats = base_cases.stats()
+    assert(stats['misses'] == 1 and stats['size'] == 1)
+    # the second simulation on the same case (as a new but equal dict) is
+    # served from the cache
+    simulation.iid_sim(pp.case30(), lambda : 10, [2, 3])
+    assert(base_cases.stats()['misses'] == 1)
+    assert(base_cases.stats()['hits'] > stats['hits'])
+
+    # a changed case is a new entry
+    changed = pp.case30()
+    changed['bus'][0, idx_bus.PD] += 1.
+    assert(case_hash(changed) != case_hash(case))
+    base_cases.get(changed)
+    assert(base_cases.stats()['misses'] == 2)
+    base_cases.clear()
+    assert(base_cases.stats() == {'hits': 0, 'misses': 0, 'size': 0})
+
+def test_solver_keys():
+    cache = BaseCaseCache()
+    case = pp.case30()
+    pypower = cache.get(case, 'pypower')
+    native = cache.get(case, 'native')
+    assert(pypower is not native)
+    assert(cache.stats()['misses'] == 2 and cache.stats()['size'] == 2)
+    assert(pypower['solver'] is None and native['solver'] is not None)
+    assert(np.allclose(pypower['flows'], native['flows']))
+    assert(np.isclose(pypower['initial_power'], sum(case['bus'][:, idx_bus.PD])))
+    assert(cache.get(case, 'native') is native)
+    assert(cache.stats()['hits'] == 1)
+
+def test_eviction():
+    cache = BaseCaseCache(maxsize=2)
+    cases = [pp.case30(), pp.case57(), pp.case118()]
+    first = cache.get(cases[0], 'native')
+    cache.get(cases[1], 'native')
+    # using the first case makes the second the least recently used
+    assert(cache.get(cases[0], 'native') is first)
+    cache.get(cases[2], 'native')
+    assert(cache.stats()['size'] == 2)
+    misses = cache.stats()['misses']
+    assert(cache.get(cases[0], 'native') is first)
+    cache.get(cases[1], 'native')
+    assert(cache.stats()['misses'] == misses + 1)
+
+def test_copy_case():
+    cache = BaseCaseCache()
+    entry = cache.get(pp.case30(), 'native')
+    flows = np.copy(entry['grid']['branch'][:, idx_brch.PF])
+    grid = copy_case(entry['grid'])
+    grid['branch'][:, idx_brch.PF] = 0
+    grid['branch'][0, idx_brch.BR_X] = np.inf
+    grid['bus'][:, idx_bus.PD] *= 2
+    assert(np.array_equal(entry['grid']['branch'][:, idx_brch.PF], flows))
+    assert(entry['grid']['branch'][0, idx_brch.BR_X] != np.inf)
+    assert(case_hash(grid) != case_hash(entry['grid']))
+    assert(grid['baseMVA'] == entry['grid']['baseMVA'])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing cache hits and misses... ", end='', flush=True)
+    test_hits_and_misses()
+    print("success!")
+
+    print("  Testing per-solver entries... ", end='', flush=True)
+    test_solver_keys()
+    print("success!")
+
+    print("  Testing LRU eviction... ", end='', flush=True)
+    test_eviction()
+    print("success!")
+
+    print("  Testing copy_case()... ", end='', flush=True)
+    test_copy_case()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
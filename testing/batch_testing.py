@@ -0,0 +1,37 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from batch import *
+import simulation
+
+def test_iid_batch(iterations=30):
+    for case in [pp.case30(), pp.case118(), pp.case300()]:
+        n_branches = len(case['branch'])
+        attack_sets = [random.sample(range(n_branches), random.randint(0, n_branches // 4))
+                       for i in range(iterations)]
+        attacks = np.zeros((iterations, n_branches), dtype=bool)
+        for i, attack_set in enumerate(attack_sets):
+            attacks[i, attack_set] = True
+
+        result = iid_batch(case, lambda : 10, attacks)
+        for i, attack_set in enumerate(attack_sets):
+            expected = simulation.iid_sim(case, lambda : 10, attack_set)
+            assert(np.isclose(expected['system_size'], result['system_size'][i]))
+            assert(np.isclose(expected['power_loss'], result['power_loss'][i]))
+            assert(len(expected['failure_history']) == result['cascade_length'][i])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing iid_batch()... ", end='', flush=True)
+    test_iid_batch()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,125 @@
+import pypower.api as pp
+import numpy as np
+import tempfile
+import random
+import os
+
+from pypower.savecase import savecase
+
+import sys
+sys.path.insert(0, '../')
+from casestore import *
+from basecase import base_cases, case_hash
+import simulation
+
+ARRAYS = ('bus', 'gen', 'branch', 'gencost')
+
+def write_matpower(ppc, fname):
+    """Writes a case in the layout MATPOWER's own case files use."""
+    name = os.path.splitext(os.path.basename(fname))[0]
+    lines = ['function mpc = %s' % name,
+             '%%%s  Power flow data for a test system.' % name.upper(),
+             '',
+             '%% MATPOWER Case Format : Version 2',
+             "mpc.version = '2';",
+             '',
+             '%% system MVA base',
+             'mpc.baseMVA = %g;' % ppc['baseMVA']]
+    for key in ARRAYS:
+        lines += ['', '%%%% %s data' % key, 'mpc.%s = [' % key]
+        lines += ['\t' + '\t'.join(repr(float(x)) for x in row) + ';' for row in ppc[key]]
+        lines += ['];']
+    lines += ['', '%% bus names', 'mpc.bus_name = {', "\t'one';", "\t'two';", '};']
+    with open(fname, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def test_parsers():
+    with tempfile.TemporaryDirectory() as path:
+        for make_case in (pp.case30, pp.case118, pp.case300):
+            case = make_case()
+            fname = os.path.join(path, make_case.__name__ + '.m')
+            write_matpower(case, fname)
+            parsed = parse_matpower(fname)
+            assert(parsed['version'] == '2' and parsed['baseMVA'] == case['baseMVA'])
+            assert('bus_name' not in parsed)
+            for key in ARRAYS:
+                assert(np.array_equal(parsed[key], case[key]))
+            assert(case_hash(load_source(fname)) == case_hash(case))
+
+            fname = os.path.join(path, 'py' + make_case.__name__ + '.py')
+            savecase(fname, case)
+            assert(case_hash(load_source(fname)) == case_hash(case))
+        assert(case_hash(load_source('case57')) == case_hash(pp.case57()))
+
+def test_store_round_trip():
+    solvers = ('native', 'pypower', 'lodf')
+    with tempfile.TemporaryDirectory() as path:
+        for make_case in (pp.case30, pp.case118):
+            name = make_case.__name__
+            base_cases.clear()
+            stored = get_case(name, solvers, storeDir=path)
+            assert(not stale(os.path.join(path, name), name, solvers))
+            case = make_case()
+            assert(case_hash(stored) == case_hash(case))
+            assert(isinstance(stored['bus'], np.memmap) and not stored['bus'].flags.writeable)
+
+            # the loaded base cases are used as they are, without solving
+            base_cases.clear()
+            stored = load_case(os.path.join(path, name))
+            misses = base_cases.stats()['misses']
+            attack_sets = [random.sample(range(len(case['branch'])), 5) for i in range(5)]
+            results = dict()
+            for solver in solvers:
+                results[solver] = [simulation.proportional_sim(stored, 0.2, attack_set,
+                                                               solver=solver)
+                                   for attack_set in attack_sets]
+            assert(base_cases.stats()['misses'] == misses)
+            base_cases.clear()
+            for solver in solvers:
+                for attack_set, output in zip(attack_sets, results[solver]):
+                    expected = simulation.proportional_sim(case, 0.2, attack_set, solver=solver)
+                    assert(output['failed_lines'] == expected['failed_lines'])
+                    assert(np.isclose(output['power_loss'], expected['power_loss']))
+
+def test_stale():
+    with tempfile.TemporaryDirectory() as path:
+        fname = os.path.join(path, 'mycase.m')
+        write_matpower(pp.case30(), fname)
+        store = os.path.join(path, 'store')
+        get_case(fname, storeDir=store)
+        case_dir = os.path.join(store, 'mycase')
+        assert(not stale(case_dir, fname))
+        assert(stale(case_dir, fname, ('native', 'lodf')))
+        assert(stale(case_dir, os.path.join(path, 'other', 'mycase.m')))
+        # adding a solver keeps the stored ones
+        get_case(fname, ('lodf',), storeDir=store)
+        assert(sorted(read_meta(case_dir)['solvers']) == ['lodf', 'native'])
+        # a newer source file is converted again
+        case = pp.case30()
+        case['bus'][0, 2] += 1.
+        write_matpower(case, fname)
+        later = os.path.getmtime(os.path.join(case_dir, 'case.json')) + 10
+        os.utime(fname, (later, later))
+        assert(stale(case_dir, fname))
+        assert(case_hash(get_case(fname, storeDir=store, mmap=False)) == case_hash(case))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing case file parsers... ", end='', flush=True)
+    test_parsers()
+    print("success!")
+
+    print("  Testing store round trips... ", end='', flush=True)
+    test_store_round_trip()
+    print("success!")
+
+    print("  Testing stale stores... ", end='', flush=True)
+    test_stale()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,138 @@
+import pypower.api as pp
+import numpy as np
+import random
+import signal
+import tempfile
+import os
+
+import sys
+sys.path.insert(0, '../')
+from checkpoint import *
+from observers import Observer
+from resultstore import ResultStore, COLUMNS
+import systemsize_analysis
+
+class InterruptAfter(Observer):
+    """Sends SIGINT to this process after a number of simulations."""
+    def __init__(self, n_simulations):
+        self.remaining = n_simulations
+
+    def on_finish(self, output):
+        self.remaining -= 1
+        if self.remaining == 0:
+            os.kill(os.getpid(), signal.SIGINT)
+
+def run_sweep(path, observers=None):
+    store = ResultStore(os.path.join(path, 'store'))
+    checkpoint = SweepCheckpoint(os.path.join(path, 'sweep.checkpoint'))
+    with checkpoint.handle_signals():
+        return systemsize_analysis.equal_freespace(pp.case30(), 10, 0, 41, 8, iterations=15,
+                                                   observers=observers, adaptive=True,
+                                                   ciTarget=0.001, batchSize=5,
+                                                   sampling='crn', store=store,
+                                                   caseName='30bus', checkpoint=checkpoint)
+
+def test_resume_matches_uninterrupted():
+    with tempfile.TemporaryDirectory() as reference, tempfile.TemporaryDirectory() as path:
+        random.seed(3)
+        expected = run_sweep(reference)
+        expected_state = random.getstate()
+
+        # interrupt twice mid-block, then finish
+        random.seed(3)
+        for n_simulations in (22, 17):
+            try:
+                run_sweep(path, [InterruptAfter(n_simulations)])
+            except SweepInterrupted:
+                pass
+            else:
+                assert(False)
+            random.seed(12345)
+        assert(len(SweepCheckpoint(os.path.join(path, 'sweep.checkpoint')).blocks) > 0)
+        output = run_sweep(path)
+
+        assert(random.getstate() == expected_state)
+        for key in ('average', 'raw', 'ci', 'samples', 'weights'):
+            assert(output[key].keys() == expected[key].keys())
+            for attack_size in expected[key]:
+                assert(np.array_equal(output[key][attack_size], expected[key][attack_size]))
+
+        # samples appended after the last checkpoint were dropped on resume
+        stores = [ResultStore(os.path.join(p, 'store')) for p in (reference, path)]
+        assert(stores[0].meta['counts'] == stores[1].meta['counts'])
+        for name, dtype in COLUMNS:
+            assert(np.array_equal(stores[0].column(name), stores[1].column(name)))
+
+def test_parameter_mismatch():
+    case = pp.case30()
+    changes = [{'freespace': 1000}, {'sampling': None}, {'maxAttack': 17},
+               {'iterations': 7}, {'adaptive': True}, {'useBatch': True}]
+    with tempfile.TemporaryDirectory() as path:
+        fname = os.path.join(path, 'sweep.checkpoint')
+        kwargs = {'freespace': 10, 'minAttack': 0, 'maxAttack': 9, 'interval': 4,
+                  'iterations': 6, 'sampling': 'uniform', 'caseName': '30bus'}
+        random.seed(1)
+        expected = systemsize_analysis.equal_freespace(case, checkpoint=SweepCheckpoint(fname),
+                                                       **kwargs)
+        for change in changes:
+            try:
+                systemsize_analysis.equal_freespace(case, checkpoint=SweepCheckpoint(fname),
+                                                    **dict(kwargs, **change))
+            except CheckpointMismatch:
+                pass
+            else:
+                assert(False)
+        # other cases and the same parameters still resume
+        output = systemsize_analysis.equal_freespace(case, checkpoint=SweepCheckpoint(fname),
+                                                     **kwargs)
+        assert(output['average'] == expected['average'])
+        other = dict(kwargs, caseName='other', freespace=1000)
+        systemsize_analysis.equal_freespace(case, checkpoint=SweepCheckpoint(fname), **other)
+        changed = pp.case30()
+        changed['bus'][0, 2] += 1.
+        try:
+            systemsize_analysis.equal_freespace(changed, checkpoint=SweepCheckpoint(fname),
+                                                **kwargs)
+        except CheckpointMismatch:
+            pass
+        else:
+            assert(False)
+
+def test_signal_deferred_while_saving():
+    with tempfile.TemporaryDirectory() as path:
+        fname = os.path.join(path, 'sweep.checkpoint')
+        checkpoint = SweepCheckpoint(fname)
+        checkpoint.saving = True
+        checkpoint.handle_signal(signal.SIGTERM, None)
+        checkpoint.saving = False
+        try:
+            checkpoint.save('30bus', 0, {'average': 1.})
+        except SweepInterrupted:
+            pass
+        else:
+            assert(False)
+        # the block was written before the interrupt was raised
+        assert(SweepCheckpoint(fname).completed('30bus', 0) == {'average': 1.})
+        checkpoint.remove()
+        assert(not os.path.exists(fname))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing resumed sweeps... ", end='', flush=True)
+    test_resume_matches_uninterrupted()
+    print("success!")
+
+    print("  Testing checkpoints of other sweeps... ", end='', flush=True)
+    test_parameter_mismatch()
+    print("success!")
+
+    print("  Testing signals while saving... ", end='', flush=True)
+    test_signal_deferred_while_saving()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
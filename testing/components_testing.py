@@ -11,6 +11,7 @@ import pypower.idx_gen as idx_gen
 import sys
 sys.path.insert(0, '../')
 from components import *
+from connectivity import ComponentTracker
 
 def test_ppc_to_nx(iterations=2000):
     for i in range(iterations):
@@ -74,6 +75,19 @@ def test_get_components():
 def test_combine_components(iterations=100):
     pass
 
+def test_component_tracker(iterations=200):
+    for i in range(iterations):
+        grid = pp.case118()
+        tracker = ComponentTracker(grid)
+        for r in range(5):
+            lines = random.sample(range(186), random.randint(1, 20))
+            grid['branch'][lines, idx_brch.BR_X] = np.inf
+            tracker.remove_lines(lines)
+            expected = sorted(sorted(c) for c in nx.connected_components(ppc_to_nx(grid)))
+            tracked = sorted(sorted(grid['bus'][rows, idx_bus.BUS_I].astype(int))
+                             for rows in tracker.components())
+            assert(expected == tracked)
+
 
 
 
@@ -87,6 +101,10 @@ def runTests():
     print("  Testing buses_to_ppc_subgrid()... ", end='', flush=True)
     test_buses_to_ppc_subgrid()
     print("success!")
+
+    print("  Testing ComponentTracker... ", end='', flush=True)
+    test_component_tracker()
+    print("success!")
     '''
     print("  Testing nx_to_ppc_components()... ", end='', flush=True)
     test_nx_to_ppc_components()
@@ -0,0 +1,77 @@
+import pypower.api as pp
+import numpy as np
+import random
+import copy
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+import sys
+sys.path.insert(0, '../')
+from dcpf import *
+from lodf import LODFPowerFlow
+from components import get_components
+
+def test_base_case():
+    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
+    for case in [pp.case30(), pp.case57(), pp.case118(), pp.case300()]:
+        expected = pp.rundcpf(case, ppopt)[0]
+        result = DCPowerFlow(case).rundcpf(case)[0]
+        assert(np.allclose(expected['branch'][:, idx_brch.PF], result['branch'][:, idx_brch.PF]))
+        assert(np.allclose(expected['bus'][:, idx_bus.VA], result['bus'][:, idx_bus.VA]))
+        assert(np.allclose(expected['gen'][:, idx_gen.PG], result['gen'][:, idx_gen.PG]))
+
+def test_islands(iterations=50):
+    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
+    grid = pp.rundcpf(pp.case118(), ppopt)[0]
+    solver = DCPowerFlow(grid)
+    for i in range(iterations):
+        case = copy.deepcopy(grid)
+        failed = random.sample(range(186), random.randint(0, 60))
+        case['branch'][failed, idx_brch.BR_X] = np.inf
+        for component in get_components(case):
+            if len(component['branch']) == 0:
+                continue
+            expected = pp.rundcpf(component, ppopt)[0]
+            result = solver.rundcpf(component)[0]
+            assert(np.allclose(expected['branch'][:, idx_brch.PF], result['branch'][:, idx_brch.PF]))
+            assert(np.allclose(expected['gen'][:, idx_gen.PG], result['gen'][:, idx_gen.PG]))
+
+def test_lodf_updates(iterations=50):
+    ppopt = pp.ppoption(VERBOSE=0, OUT_ALL=0)
+    grid = pp.case118()
+    solver = LODFPowerFlow(grid)
+    for i in range(iterations):
+        case = copy.deepcopy(grid)
+        failed = random.sample(range(186), random.randint(0, 5))
+        case['branch'][failed, idx_brch.BR_X] = np.inf
+        case['gen'][:, idx_gen.PG] *= random.uniform(0.5, 1.5)
+        if len(get_components(case)) > 1:
+            continue
+        expected = pp.rundcpf(case, ppopt)[0]
+        result = solver.rundcpf(case)[0]
+        assert(np.allclose(expected['branch'][:, idx_brch.PF], result['branch'][:, idx_brch.PF]))
+        assert(np.allclose(expected['bus'][:, idx_bus.VA], result['bus'][:, idx_bus.VA]))
+        assert(np.allclose(expected['gen'][:, idx_gen.PG], result['gen'][:, idx_gen.PG]))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing DCPowerFlow on base cases... ", end='', flush=True)
+    test_base_case()
+    print("success!")
+
+    print("  Testing DCPowerFlow on islands... ", end='', flush=True)
+    test_islands()
+    print("success!")
+
+    print("  Testing LODFPowerFlow updates... ", end='', flush=True)
+    test_lodf_updates()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
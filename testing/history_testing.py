@@ -0,0 +1,127 @@
+import pypower.api as pp
+import numpy as np
+import random
+import copy
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+from history import *
+from basecase import base_cases, copy_case
+import simulation
+
+class SnapshotHistory(GridHistory):
+    """GridHistory that also keeps a deep copy of every grid it is given."""
+
+    def __init__(self, grid):
+        GridHistory.__init__(self, grid)
+        self.snapshots = [copy.deepcopy(grid)]
+
+    def append(self, grid):
+        GridHistory.append(self, grid)
+        self.snapshots.append(copy.deepcopy(grid))
+
+def assert_same_grid(a, b):
+    for key in GridHistory.KEYS:
+        assert(a[key].shape == b[key].shape)
+        assert(np.array_equal(a[key], b[key], equal_nan=True))
+
+def check_history(history, snapshots, failure_history):
+    assert(len(history) == len(snapshots))
+    for j in range(len(snapshots)):
+        assert_same_grid(history[j], snapshots[j])
+    # backwards, negative and sliced
+    for j in reversed(range(len(snapshots))):
+        assert_same_grid(history[j], snapshots[j])
+    for j in range(1, len(snapshots) + 1):
+        assert_same_grid(history[-j], snapshots[-j])
+    for start, stop, step in ((None, None, None), (1, None, 2), (None, -1, None),
+                              (None, None, -1)):
+        sliced = history[start:stop:step]
+        expected = snapshots[start:stop:step]
+        assert(len(sliced) == len(expected))
+        for a, b in zip(sliced, expected):
+            assert_same_grid(a, b)
+    assert(len(history.as_list()) == len(snapshots))
+
+    # failed lines of every round
+    assert(len(history.failed_lines(0)) == 0)
+    for j, lines in enumerate(failure_history):
+        assert(sorted(history.failed_lines(j + 1)) == sorted(lines))
+    assert(sorted(history.failed_lines(-1)) == sorted(failure_history[-1]))
+
+    # the reconstructed grids are copies
+    history[0]['bus'][:] = 0
+    assert_same_grid(history[0], snapshots[0])
+
+def test_cascade_history(iterations=5):
+    simulation.GridHistory = SnapshotHistory
+    try:
+        for load_case in (pp.case118, pp.case300):
+            case = load_case()
+            n_branches = len(case['branch'])
+            for i in range(iterations):
+                attack_set = random.sample(range(n_branches), 5)
+                output = simulation.proportional_sim(case, 0.1, attack_set,
+                                                     saveIterations=True)
+                history = output['grid_history']
+                assert_same_grid(history[-1], output['grid'])
+                check_history(history, history.snapshots, output['failure_history'])
+    finally:
+        simulation.GridHistory = GridHistory
+
+def test_nan_inf():
+    case = pp.case118()
+    grid = copy_case(base_cases.get(case)['grid'])
+    history = GridHistory(grid)
+    snapshots = [copy.deepcopy(grid)]
+    failure_history = [[0, 5], [7], [1, 2, 3]]
+    for lines in failure_history:
+        grid = copy.deepcopy(grid)
+        grid['branch'][lines, idx_brch.BR_R] = np.inf
+        grid['branch'][lines, idx_brch.BR_X] = np.inf
+        grid['branch'][lines, idx_brch.PF] = np.nan
+        grid['bus'][lines, idx_bus.VA] = -np.inf
+        grid['bus'][:, idx_bus.PD] *= 0.9
+        history.append(grid)
+        snapshots.append(copy.deepcopy(grid))
+    check_history(history, snapshots, failure_history)
+
+def test_delta_buffer():
+    buf = DeltaBuffer(capacity=256)
+    rounds = []
+    for i in range(10):
+        n = random.randint(0, 200)
+        indices = np.arange(n, dtype=np.int32)
+        values = np.random.random(n)
+        buf.append(indices, values)
+        rounds.append((indices, values))
+    assert(len(buf.indices) > 256 and len(buf.indices) == len(buf.values))
+    for i, (indices, values) in enumerate(rounds):
+        got_indices, got_values = buf.get(i)
+        assert(np.array_equal(got_indices, indices))
+        assert(np.array_equal(got_values, values))
+    assert(buf.nbytes() == buf.indices.nbytes + buf.values.nbytes)
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing cascade histories... ", end='', flush=True)
+    test_cascade_history()
+    print("success!")
+
+    print("  Testing NaN and inf entries... ", end='', flush=True)
+    test_nan_inf()
+    print("success!")
+
+    print("  Testing DeltaBuffer growth... ", end='', flush=True)
+    test_delta_buffer()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
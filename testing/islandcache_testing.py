@@ -0,0 +1,50 @@
+import pypower.api as pp
+import numpy as np
+import random
+import pypower.idx_gen as idx_gen
+
+import sys
+sys.path.insert(0, '../')
+from islandcache import *
+import simulation
+
+def test_island_reuse(iterations=10):
+    for case in [pp.case30(), pp.case118()]:
+        n_branches = len(case['branch'])
+        for i in range(iterations):
+            attack_set = random.sample(range(n_branches), random.randint(1, n_branches // 10))
+            expected = simulation.proportional_sim(case, 0.2, attack_set, solver='native',
+                                                   reuseIslands=False)
+            result = simulation.proportional_sim(case, 0.2, attack_set, solver='native')
+            assert(expected['failure_history'] == result['failure_history'])
+            for key in ('bus', 'gen', 'branch'):
+                assert(np.array_equal(expected['grid'][key], result['grid'][key], equal_nan=True))
+            assert(expected['islands_reused'] == 0)
+            assert(result['islands_solved'] + result['islands_reused'] ==
+                   expected['islands_solved'])
+
+def test_fingerprint():
+    result = simulation.proportional_sim(pp.case30(), 0.5, [0, 1], solver='native')
+    components = result['components']
+    keys = [island_fingerprint(c) for c in components]
+    assert(len(set(keys)) == len(keys))
+    changed = components[0]
+    changed['gen'][0, idx_gen.PG] += 1
+    assert(island_fingerprint(changed) != keys[0])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing island reuse in run_simulation()... ", end='', flush=True)
+    test_island_reuse()
+    print("success!")
+
+    print("  Testing island_fingerprint()... ", end='', flush=True)
+    test_fingerprint()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
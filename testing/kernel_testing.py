@@ -0,0 +1,110 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from kernel import *
+from basecase import base_cases
+import simulation
+import systemsize_analysis
+
+CASES = [pp.case30, pp.case57, pp.case118, pp.case300]
+
+def test_kernel_matches_simulation(iterations=15):
+    for load_case in CASES:
+        case = load_case()
+        n_branches = len(case['branch'])
+        flows = base_cases.get(case, 'native')['flows']
+        cascades = [CascadeKernel(case, NUMPY_KERNELS), CascadeKernel(case, LOOP_KERNELS)]
+        for freespace in (5, 30):
+            capacities = flows + freespace
+            for i in range(iterations):
+                attack_set = random.sample(range(n_branches), random.randint(1, n_branches // 5))
+                expected = simulation.run_simulation(case, capacities, attack_set,
+                                                     solver='native')
+                for cascade in cascades:
+                    result = cascade.run(capacities, attack_set)
+                    assert(result['failure_history'] == expected['failure_history'])
+                    assert(result['failed_lines'] == expected['failed_lines'])
+                    assert(result['system_size'] == expected['system_size'])
+                    assert(np.isclose(result['power_loss'], expected['power_loss']))
+                    assert(result['cascade_length'] == len(expected['failure_history']))
+
+def test_loop_kernels_match_numpy(iterations=20):
+    case = pp.case118()
+    cascade = CascadeKernel(case, NUMPY_KERNELS)
+    n_bus, n_branch = cascade.n_bus, cascade.n_branch
+    for i in range(iterations):
+        failed = np.zeros(n_branch, dtype=bool)
+        failed[random.sample(range(n_branch), random.randint(0, n_branch // 2))] = True
+
+        labels = labels_loop(n_bus, cascade.f, cascade.t, failed)
+        expected = labels_numpy(n_bus, cascade.f, cascade.t, failed)
+        # same partition (labels may be numbered differently)
+        pairs = np.unique(np.stack((labels, expected), axis=1), axis=0)
+        assert(len(pairs) == labels.max() + 1 == expected.max() + 1)
+        n_labels = labels.max() + 1
+
+        states = []
+        for prepare, injections, finish in ((prepare_loop, injections_loop, finish_loop),
+                                            (prepare_numpy, injections_numpy, finish_numpy)):
+            types, PG, PD = cascade.types.copy(), cascade.PG.copy(), cascade.PD.copy()
+            ref = prepare(labels, n_labels, types, cascade.gbus, cascade.gen_on, PG, PD)
+            Pbus = injections(cascade.gbus, cascade.gen_on, PG, PD, cascade.gs, cascade.baseMVA,
+                              cascade.f, cascade.t, failed, cascade.Pfinj)
+            Va = np.linspace(-0.5, 0.5, n_bus)
+            PF, new_failed = np.zeros(n_branch), np.zeros(n_branch, dtype=bool)
+            finish(Va, Pbus, labels, n_labels, ref, cascade.gbus, cascade.gen_on, PG,
+                   cascade.f, cascade.t, cascade.b, cascade.Pfinj, failed, cascade.baseMVA,
+                   cascade.flows + 10, PF, new_failed)
+            states.append((types, PG, PD, ref, Pbus, PF, new_failed))
+        for a, b in zip(*states):
+            assert(np.array_equal(a, b))
+
+def test_get_kernels():
+    assert(get_kernels(jit=False) is NUMPY_KERNELS)
+    if numba_available():
+        assert(get_kernels() is get_kernels(jit=True))
+    else:
+        assert(get_kernels() is NUMPY_KERNELS)
+        try:
+            get_kernels(jit=True)
+        except ImportError:
+            pass
+        else:
+            assert(False)
+
+def test_equal_freespace_kernel():
+    case = pp.case57()
+    outputs = []
+    for useKernel in (False, True):
+        random.seed(0)
+        outputs.append(systemsize_analysis.equal_freespace(case, 10, 0, 40, 10, iterations=10,
+                                                           useKernel=useKernel))
+    assert(outputs[0]['raw'] == outputs[1]['raw'])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing kernel against run_simulation()... ", end='', flush=True)
+    test_kernel_matches_simulation()
+    print("success!")
+
+    print("  Testing loop kernels against NumPy kernels... ", end='', flush=True)
+    test_loop_kernels_match_numpy()
+    print("success!")
+
+    print("  Testing get_kernels()... ", end='', flush=True)
+    test_get_kernels()
+    print("success!")
+
+    print("  Testing equal_freespace() with the kernel... ", end='', flush=True)
+    test_equal_freespace_kernel()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
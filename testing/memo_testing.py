@@ -0,0 +1,83 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from memo import *
+import simulation
+
+def check_memo_results(case, iterations):
+    n_branches = len(case['branch'])
+    memo = CascadeMemo()
+    for i in range(iterations):
+        attack_set = random.sample(range(n_branches), random.randint(1, 3))
+        expected = simulation.iid_sim(case, lambda : 10, attack_set)
+        result = simulation.iid_sim(case, lambda : 10, attack_set, memo=memo)
+        assert(np.isclose(expected['system_size'], result['system_size']))
+        assert(np.isclose(expected['power_loss'], result['power_loss']))
+        assert(expected['failure_history'] == [list(lines) for lines in result['failure_history']])
+    stats = memo.stats()
+    assert(stats['hits'] > 0)
+    assert(stats['hits'] + stats['misses'] >= iterations)
+
+def test_memo_results(iterations=100):
+    check_memo_results(pp.case30(), iterations)
+    # case118 has susceptance (BS) shunts only, which DC power flows ignore
+    check_memo_results(pp.case118(), iterations)
+
+def test_memo_shunts():
+    case = pp.case300()
+    assert(not memoizable(case))
+    try:
+        simulation.iid_sim(case, lambda : 10, [0], memo=CascadeMemo())
+    except ValueError:
+        pass
+    else:
+        assert(False)
+    assert(memoizable(pp.case30()) and memoizable(pp.case118()))
+
+def test_memo_binding():
+    case = pp.case30()
+    memo = CascadeMemo()
+    simulation.iid_sim(case, lambda : 10, [0], memo=memo)
+    try:
+        simulation.iid_sim(case, lambda : 20, [0], memo=memo)
+    except ValueError:
+        pass
+    else:
+        assert(False)
+
+def test_memo_eviction():
+    memo = CascadeMemo(maxsize=2)
+    for i in range(4):
+        memo.put(failed_set_key([i], 8), [], 1., 1)
+    assert(memo.stats()['evictions'] == 2)
+    assert(memo.get(failed_set_key([0], 8)) is None)
+    assert(memo.get(failed_set_key([3], 8)) == ([], 1.))
+    assert(failed_set_key([1, 2], 8) == failed_set_key([2, 1], 8))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing CascadeMemo with run_simulation()... ", end='', flush=True)
+    test_memo_results()
+    print("success!")
+
+    print("  Testing CascadeMemo on grids with shunts... ", end='', flush=True)
+    test_memo_shunts()
+    print("success!")
+
+    print("  Testing CascadeMemo binding... ", end='', flush=True)
+    test_memo_binding()
+    print("success!")
+
+    print("  Testing CascadeMemo eviction... ", end='', flush=True)
+    test_memo_eviction()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
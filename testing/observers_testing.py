@@ -0,0 +1,61 @@
+import pypower.api as pp
+import numpy as np
+import random
+import pypower.idx_bus as idx_bus
+
+import sys
+sys.path.insert(0, '../')
+from observers import *
+import simulation
+
+def test_round_events(iterations=20):
+    case = pp.case30()
+    n_branches = len(case['branch'])
+    for i in range(iterations):
+        attack_set = random.sample(range(n_branches), random.randint(1, 5))
+        recorder = RoundRecorder()
+        result = simulation.iid_sim(case, lambda : 10, attack_set, observers=[recorder])
+        assert(len(recorder.events) == len(result['failure_history']))
+        assert(recorder.outputs == [result])
+        for event, new_failures in zip(recorder.events, result['failure_history'][1:] + [[]]):
+            assert(event['new_failed_lines'] == new_failures)
+            assert(set(event['timings'].keys()) == set(STAGES))
+            assert(not event['memoized'])
+        if len(recorder.events) > 0:
+            last = recorder.events[-1]
+            assert(np.isclose(last['load_served'], sum(result['grid']['bus'][:, idx_bus.PD])))
+            assert(last['n_islands'] == len(result['components']))
+
+def test_stage_timer(iterations=20):
+    case = pp.case30()
+    n_branches = len(case['branch'])
+    timer = StageTimer()
+    stats = CascadeStats()
+    rounds = 0
+    for i in range(iterations):
+        attack_set = random.sample(range(n_branches), 3)
+        result = simulation.iid_sim(case, lambda : 10, attack_set, observers=[timer, stats])
+        rounds += len(result['failure_history'])
+    summary = timer.summary()
+    assert(summary['simulations'] == iterations)
+    assert(summary['rounds'] == rounds)
+    assert(summary['total'] > 0)
+    assert(stats.summary()['simulations'] == iterations)
+    assert(sum(stats.lengths) == rounds)
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing round events... ", end='', flush=True)
+    test_round_events()
+    print("success!")
+
+    print("  Testing StageTimer and CascadeStats... ", end='', flush=True)
+    test_stage_timer()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,69 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+import sys
+sys.path.insert(0, '../')
+from rescale_power import *
+from components import labels_to_ppc_components, combine_components
+from connectivity import ComponentTracker
+from basecase import base_cases, copy_case
+
+def fragmented_grid(case, n_failed):
+    grid = copy_case(base_cases.get(case)['grid'])
+    lines = random.sample(range(len(grid['branch'])), n_failed)
+    grid['branch'][lines, idx_brch.BR_R] = np.inf
+    grid['branch'][lines, idx_brch.BR_X] = np.inf
+    tracker = ComponentTracker(grid)
+    tracker.remove_lines(lines)
+    # unbalance the islands
+    grid['gen'][:, idx_gen.PG] *= np.random.uniform(0.5, 1.5, len(grid['gen']))
+    grid['bus'][:, idx_bus.PD] *= np.random.uniform(0.5, 1.5, len(grid['bus']))
+    return grid, tracker.labels
+
+def test_rescale_power_labeled(iterations=20):
+    for case in [pp.case30(), pp.case118(), pp.case300()]:
+        n_branches = len(case['branch'])
+        for i in range(iterations):
+            grid, labels = fragmented_grid(case, random.randint(0, n_branches // 3))
+            for mode, rescale in (('gen', rescale_power_gen), ('down', rescale_power_down)):
+                components = labels_to_ppc_components(labels, grid)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    for component in components:
+                        rescale(component)
+                expected = combine_components(components, grid)
+
+                result = copy_case(grid)
+                rescale_power_labeled(result, labels, mode)
+                assert(np.array_equal(expected['gen'][:, idx_gen.PG], result['gen'][:, idx_gen.PG],
+                                      equal_nan=True))
+                assert(np.array_equal(expected['bus'][:, idx_bus.PD], result['bus'][:, idx_bus.PD],
+                                      equal_nan=True))
+
+def test_rescale_labeled_zero_gen():
+    PG = np.array([0., 0., 5.])
+    PD = np.array([1., 2., 3., 4.])
+    rescale_labeled(PG, PD, np.array([0, 0, 1]), np.array([0, 0, 1, 1]), 2)
+    assert(np.array_equal(PD, [0., 0., 3., 4.]))
+    assert(np.array_equal(PG, [0., 0., 7.]))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing rescale_power_labeled()... ", end='', flush=True)
+    test_rescale_power_labeled()
+    print("success!")
+
+    print("  Testing rescale_labeled() without generation... ", end='', flush=True)
+    test_rescale_labeled_zero_gen()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
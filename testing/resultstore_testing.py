@@ -0,0 +1,128 @@
+import pypower.api as pp
+import numpy as np
+import random
+import tempfile
+import json
+import csv
+import os
+
+import sys
+sys.path.insert(0, '../')
+from resultstore import *
+import systemsize_analysis
+
+def test_append_and_read():
+    with tempfile.TemporaryDirectory() as path:
+        store = ResultStore(path)
+        store.append('30bus', 5, [1., 0.5], power_loss=[0., 0.25], cascade_length=[1, 2])
+        store.append('30bus', 5, [0.75])
+        store.append('57bus', 10, [0.25, 0.5, 0.75], weight=[1., 2., 1.])
+        store.close()
+
+        # reopening sees the same data, and columns are memory-mapped
+        store = ResultStore(path)
+        assert(len(store) == 6)
+        assert(store.cases() == ['30bus', '57bus'])
+        assert(all(isinstance(c['system_size'], np.memmap) for c in store.chunks()))
+        assert(np.array_equal(store.column('sample', '30bus'), [0, 1, 2]))
+        assert(np.array_equal(store.column('cascade_length', '30bus'), [1, 2, -1]))
+        assert(np.isnan(store.column('power_loss', '30bus')[2]))
+        assert(store.column('attack_size').dtype == np.int32)
+
+        averages = store.averages()
+        assert(np.isclose(averages['30bus'][5], 0.75))
+        assert(np.isclose(averages['57bus'][10], 0.5))
+
+        # rows of a flush that never made it into meta.json are cut off
+        with open(os.path.join(path, 'system_size.bin'), 'ab') as f:
+            f.write(np.zeros(4).tobytes())
+        store = ResultStore(path)
+        assert(len(store) == 6)
+        assert(os.path.getsize(os.path.join(path, 'system_size.bin')) == 6 * 8)
+
+        try:
+            store.append('30bus', 5, [1., 1.], power_loss=[0.])
+        except ValueError:
+            pass
+        else:
+            assert(False)
+
+def test_buffered_appends(n_appends=500):
+    with tempfile.TemporaryDirectory() as path:
+        with ResultStore(path, chunkRows=1000) as store:
+            writes = []
+            write_meta = store.write_meta
+            store.write_meta = lambda : (writes.append(len(store)), write_meta())
+            for i in range(n_appends):
+                store.append('30bus', i % 7, [0.5] * 20, weight=[2.] * 20)
+            # meta.json is only rewritten when 1000 rows have been buffered
+            assert(writes == [1000 * (j + 1) for j in range(len(writes))])
+            assert(len(writes) == n_appends * 20 // 1000)
+            assert(len(ResultStore(path)) == 1000 * len(writes))
+            assert(len(store) == n_appends * 20)
+        # one file per column whatever the number of appends
+        assert(sorted(os.listdir(path)) ==
+               sorted(['meta.json'] + [name + '.bin' for name, dtype in COLUMNS]))
+        store = ResultStore(path, chunkRows=3000)
+        assert(len(store) == n_appends * 20)
+        assert([len(chunk['case']) for chunk in store.chunks()] == [3000, 3000, 3000, 1000])
+        samples = store.column('sample')
+        attack_sizes = store.column('attack_size')
+        for attack_size in range(7):
+            n = np.count_nonzero(attack_sizes == attack_size)
+            assert(np.array_equal(samples[attack_sizes == attack_size], np.arange(n)))
+
+        # buffered rows past a truncation are dropped too
+        store.append('30bus', 0, [1.] * 5)
+        store.truncate(4000)
+        assert(len(store) == 4000 and len(ResultStore(path)) == 4000)
+        counts = store.meta['counts']['30bus']
+        assert(sum(counts.values()) == 4000)
+        assert(counts['0'] == np.count_nonzero(store.column('attack_size') == 0))
+
+def test_equal_freespace_store():
+    case = pp.case30()
+    with tempfile.TemporaryDirectory() as path:
+        store = ResultStore(path)
+        random.seed(0)
+        output = systemsize_analysis.equal_freespace(case, 10, 0, 40, 10, iterations=15,
+                                                     useBatch=True, store=store,
+                                                     caseName='30bus')
+        averages = store.averages()['30bus']
+        assert(sorted(averages.keys()) == sorted(output['average'].keys()))
+        for attack_size, average in output['average'].items():
+            assert(np.isclose(averages[attack_size], average))
+
+        json_fname = os.path.join(path, 'out.json')
+        csv_fname = os.path.join(path, 'out.csv')
+        store.to_json(json_fname)
+        store.to_csv(csv_fname)
+        with open(json_fname) as f:
+            data = json.load(f)
+        for attack_size, raw in output['raw'].items():
+            assert(np.allclose(data['30bus']['raw'][str(attack_size)], raw))
+        with open(csv_fname) as f:
+            rows = list(csv.reader(f))
+        assert(rows[0] == ['IEEE 30-bus test case'])
+        assert(len(rows) == 1 + len(output['average']))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing ResultStore append and read... ", end='', flush=True)
+    test_append_and_read()
+    print("success!")
+
+    print("  Testing buffered appends... ", end='', flush=True)
+    test_buffered_appends()
+    print("success!")
+
+    print("  Testing equal_freespace() with a ResultStore... ", end='', flush=True)
+    test_equal_freespace_store()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,112 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from sampling import *
+
+def check_attack_sets(attack_sets, attack_size, n_branches):
+    for attack_set in attack_sets:
+        assert(len(attack_set) == attack_size)
+        assert(len(set(attack_set)) == attack_size)
+        assert(all(0 <= line < n_branches for line in attack_set))
+
+def test_crn_sampler():
+    case = pp.case30()
+    n_branches = len(case['branch'])
+    sampler = CRNSampler(case, random.Random(0))
+    small, weights = sampler.draw(5, 20)
+    large, weights = sampler.draw(15, 20)
+    check_attack_sets(large, 15, n_branches)
+    assert(np.all(weights == 1))
+    for a, b in zip(small, large):
+        assert(b[:5] == a)
+    # later batches continue with new permutations
+    more, weights = sampler.draw(15, 10, offset=20)
+    assert(len(sampler.permutations) == 30)
+    assert(more == [perm[:15] for perm in sampler.permutations[20:]])
+
+def test_weighted_samplers(n_samples=4000):
+    case = pp.case118()
+    n_branches = len(case['branch'])
+    for sampler in [StratifiedSampler(case, random.Random(0)),
+                    ImportanceSampler(case, random.Random(0))]:
+        high = set(sampler.high)
+        for attack_size in [0, 1, 20, 100, n_branches]:
+            attack_sets, weights = sampler.draw(attack_size, n_samples)
+            check_attack_sets(attack_sets, attack_size, n_branches)
+            assert(len(weights) == n_samples)
+            # weighted mean of the number of attacked high-flow lines matches
+            # its mean under uniform sampling
+            n_high = [len(high.intersection(attack_set)) for attack_set in attack_sets]
+            expected = attack_size * len(high) / n_branches
+            assert(np.isclose(np.average(n_high, weights=weights), expected,
+                              atol=0.05 * max(1, expected)))
+
+def test_stratified_tails(batchSize=20, n_batches=1000):
+    # small batches, as in adaptive sweeps, leave the rarest counts of
+    # attacked high-flow lines below one sample each; they must still be drawn
+    # as often as under uniform sampling
+    for load_case, attack_size in ((pp.case118, 40), (pp.case300, 100)):
+        case = load_case()
+        n_branches = len(case['branch'])
+        stratified = StratifiedSampler(case, random.Random(0))
+        uniform = UniformSampler(case, random.Random(0))
+        high = set(stratified.high)
+        from scipy.stats import hypergeom
+        counts = np.arange(attack_size + 1)
+        p = hypergeom.pmf(counts, n_branches, len(high), attack_size)
+        rare = set(counts[(p > 0) & (p * batchSize < 0.5)])
+        expected = p[list(rare)].sum()
+        assert(expected > 0.02)
+
+        estimates = dict()
+        for name, sampler in (('stratified', stratified), ('uniform', uniform)):
+            in_rare = []
+            weights = []
+            for i in range(n_batches):
+                attack_sets, batch_weights = sampler.draw(attack_size, batchSize)
+                assert(len(attack_sets) == batchSize and np.all(batch_weights == 1))
+                in_rare += [len(high.intersection(attack_set)) in rare
+                            for attack_set in attack_sets]
+                weights += list(batch_weights)
+            estimates[name] = np.average(in_rare, weights=weights)
+        se = np.sqrt(expected * (1 - expected) / (batchSize * n_batches))
+        assert(abs(estimates['stratified'] - expected) < 4 * se)
+        assert(abs(estimates['stratified'] - estimates['uniform']) < 6 * se)
+
+def test_get_sampler():
+    case = pp.case30()
+    assert(isinstance(get_sampler(case, 'crn'), CRNSampler))
+    try:
+        get_sampler(case, 'latin')
+    except ValueError:
+        pass
+    else:
+        assert(False)
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing CRNSampler... ", end='', flush=True)
+    test_crn_sampler()
+    print("success!")
+
+    print("  Testing StratifiedSampler and ImportanceSampler... ", end='', flush=True)
+    test_weighted_samplers()
+    print("success!")
+
+    print("  Testing StratifiedSampler tails in small batches... ", end='', flush=True)
+    test_stratified_tails()
+    print("success!")
+
+    print("  Testing get_sampler()... ", end='', flush=True)
+    test_get_sampler()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
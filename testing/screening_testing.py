@@ -0,0 +1,109 @@
+import pypower.api as pp
+import numpy as np
+import itertools
+import tempfile
+import csv
+import os
+
+import sys
+sys.path.insert(0, '../')
+from screening import *
+from basecase import base_cases
+import simulation
+
+def test_pruned_cannot_cascade():
+    for load_case, freespace in ((pp.case30, 10), (pp.case57, 30)):
+        case = load_case()
+        n_branches = len(case['branch'])
+        capacities = base_cases.get(case, 'native')['flows'] + freespace
+        survivors, counts = prune(case, capacities, order=2)
+        assert(counts['screened'] == n_branches + n_branches * (n_branches - 1) // 2)
+        assert(counts['pruned'] + len(survivors) == counts['screened'])
+        assert(counts['pruned'] > 0)
+        survivors = set(survivors)
+        contingencies = [(j,) for j in range(n_branches)]
+        contingencies += list(itertools.combinations(range(n_branches), 2))
+        for contingency in contingencies[::3]:
+            if contingency in survivors:
+                continue
+            output = simulation.run_simulation(case, capacities, list(contingency),
+                                               solver='native')
+            assert(output['failure_history'] == [list(contingency)])
+            assert(np.isclose(output['power_loss'], 0))
+
+def test_screen_ranking():
+    case = pp.case30()
+    capacities = base_cases.get(case, 'native')['flows'] + 10
+    output = screen(case, capacities, order=2, workers=1)
+    ranking = output['ranking']
+    assert(len(ranking) == output['simulated'] == output['screened'] - output['pruned'])
+    losses = [row['power_loss'] for row in ranking]
+    assert(losses == sorted(losses, reverse=True))
+    for row in ranking[:20]:
+        expected = simulation.run_simulation(case, capacities, list(row['contingency']),
+                                             solver='native')
+        assert(row['failed_lines'] == len(expected['failed_lines']))
+        assert(np.isclose(row['power_loss'], expected['power_loss']))
+        assert(row['cascade_length'] == len(expected['failure_history']))
+
+    # the same ranking from worker processes, and from run_simulation()
+    parallel = screen(case, capacities, order=2, workers=2, chunkSize=100)
+    assert([row['contingency'] for row in parallel['ranking']] ==
+           [row['contingency'] for row in ranking])
+    pypower = screen(case, capacities, order=1, workers=1, solver='pypower')
+    native = screen(case, capacities, order=1, workers=1)
+    for a, b in zip(pypower['ranking'], native['ranking']):
+        assert(a['failed_lines'] == b['failed_lines'])
+        assert(np.isclose(a['power_loss'], b['power_loss']))
+
+    assert('%d simulated' % output['simulated'] in ranking_table(output))
+    with tempfile.TemporaryDirectory() as path:
+        fname = os.path.join(path, 'ranking.csv')
+        ranking_to_csv(output, fname)
+        with open(fname) as f:
+            rows = list(csv.reader(f))
+        assert(len(rows) == len(ranking) + 1)
+
+def test_screen_ac():
+    case = pp.case57()
+    capacities = base_cases.get(case, 'ac')['flows'] + 10
+    try:
+        prune(case, capacities, order=1, solver='ac')
+    except ValueError:
+        pass
+    else:
+        assert(False)
+    # LODFs would prune line 62, whose AC cascade fails another line
+    output = screen(case, capacities, order=1, workers=1, solver='ac')
+    assert(output['pruned'] == 0 and output['simulated'] == len(case['branch']))
+    for row in output['ranking']:
+        expected = simulation.run_simulation(case, capacities, list(row['contingency']),
+                                             solver='ac')
+        assert(row['failed_lines'] == len(expected['failed_lines']))
+        assert(np.isclose(row['power_loss'], expected['power_loss']))
+    row = [row for row in output['ranking'] if row['contingency'] == (62,)][0]
+    assert(row['cascade_length'] > 1 and row['power_loss'] > 0)
+    parallel = screen(case, capacities, order=1, workers=2, solver='ac')
+    assert([row['contingency'] for row in parallel['ranking']] ==
+           [row['contingency'] for row in output['ranking']])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing pruned contingencies... ", end='', flush=True)
+    test_pruned_cannot_cascade()
+    print("success!")
+
+    print("  Testing screen() rankings... ", end='', flush=True)
+    test_screen_ranking()
+    print("success!")
+
+    print("  Testing AC screening... ", end='', flush=True)
+    test_screen_ac()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
@@ -0,0 +1,72 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from sharedcase import *
+from basecase import base_cases
+import simulation
+import sweep
+
+SOLVERS = ['pypower', 'native', 'lodf']
+
+def test_attach_cases(iterations=5):
+    cases = {'30bus': pp.case30(), '118bus': pp.case118()}
+    with SharedCases(cases, solvers=SOLVERS) as shared:
+        expected = dict()
+        for name, case in cases.items():
+            n_branches = len(case['branch'])
+            attack_sets = [random.sample(range(n_branches), 5) for i in range(iterations)]
+            for solver in SOLVERS:
+                expected[(name, solver)] = [(attack_set, simulation.proportional_sim(
+                    case, 0.2, attack_set, solver=solver)) for attack_set in attack_sets]
+
+        # as a fresh worker would
+        base_cases.clear()
+        shm, attached = attach_cases(shared.descriptor)
+        assert(base_cases.stats()['misses'] == 0)
+        for name, case in attached.items():
+            assert(not case['bus'].flags.writeable)
+            assert(np.array_equal(case['branch'], cases[name]['branch']))
+            for solver in SOLVERS:
+                for attack_set, result in expected[(name, solver)]:
+                    output = simulation.proportional_sim(case, 0.2, attack_set, solver=solver)
+                    assert(output['failure_history'] == result['failure_history'])
+                    assert(np.isclose(output['power_loss'], result['power_loss']))
+        assert(base_cases.stats()['misses'] == 0)
+        assert(not base_cases.get(attached['118bus'], 'lodf')['solver'].ptdf.flags.writeable)
+        base_cases.clear()
+        shm.close()
+
+    try:
+        attach_cases(shared.descriptor)
+    except FileNotFoundError:
+        pass
+    else:
+        assert(False)
+
+def test_parallel_sweep_shared():
+    cases = {'30bus': pp.case30(), '57bus': pp.case57()}
+    results = [sweep.parallel_sweep(10, 0, 0.5, 10, cases=cases, iterations=12, chunkSize=5,
+                                    workers=2, useBatch=useBatch, shareMemory=shareMemory)
+               for useBatch in (True, False) for shareMemory in (True, False)]
+    assert(results[0] == results[1])
+    assert(results[2] == results[3])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing attach_cases()... ", end='', flush=True)
+    test_attach_cases()
+    print("success!")
+
+    print("  Testing parallel_sweep() with shared memory... ", end='', flush=True)
+    test_parallel_sweep_shared()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
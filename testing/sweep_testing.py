@@ -0,0 +1,44 @@
+import pypower.api as pp
+import numpy as np
+
+import sys
+sys.path.insert(0, '../')
+from sweep import *
+
+def test_worker_counts():
+    cases = {'30bus': pp.case30(), '57bus': pp.case57()}
+    for useBatch in (True, False):
+        results = [parallel_sweep(10, 0, 0.5, 10, cases=cases, iterations=12, chunkSize=5,
+                                  workers=workers, masterSeed=3, useBatch=useBatch)
+                   for workers in (1, 2)]
+        assert(results[0] == results[1])
+        for name, case in cases.items():
+            assert(sorted(results[0][name].keys()) == ['average', 'raw'])
+            for attack_size, raw in results[0][name]['raw'].items():
+                assert(len(raw) == 12)
+                assert(results[0][name]['average'][attack_size] == np.mean(raw))
+
+def test_master_seed():
+    cases = {'30bus': pp.case30()}
+    results = [parallel_sweep(10, 0, 0.5, 10, cases=cases, iterations=12, chunkSize=5,
+                              workers=1, masterSeed=masterSeed)
+               for masterSeed in (0, 0, 1)]
+    assert(results[0] == results[1])
+    assert(results[0] != results[2])
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing parallel_sweep() with 1 and 2 workers... ", end='', flush=True)
+    test_worker_counts()
+    print("success!")
+
+    print("  Testing parallel_sweep() master seeds... ", end='', flush=True)
+    test_master_seed()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
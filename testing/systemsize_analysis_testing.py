@@ -0,0 +1,58 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from systemsize_analysis import *
+
+def test_fixed_sampling():
+    case = pp.case30()
+    random.seed(0)
+    serial = equal_freespace(case, 10, 0, 40, 10, iterations=20)
+    random.seed(0)
+    batched = equal_freespace(case, 10, 0, 40, 10, iterations=20, useBatch=True)
+    for attack_size in serial['average']:
+        assert(serial['samples'][attack_size] == 20)
+        assert(np.allclose(serial['raw'][attack_size], batched['raw'][attack_size]))
+        assert(np.isclose(serial['ci'][attack_size], ci_halfwidth(serial['raw'][attack_size])))
+
+def test_adaptive_sampling():
+    case = pp.case118()
+    output = equal_freespace(case, 10, 0, 180, 30, iterations=200, useBatch=True,
+                             adaptive=True, ciTarget=0.01, batchSize=20)
+    # no attack: the first batch is deterministic
+    assert(output['samples'][0] == 20)
+    assert(output['ci'][0] == 0)
+    for attack_size, n in output['samples'].items():
+        assert(n % 20 == 0 and n <= 200)
+        assert(n == 200 or output['ci'][attack_size] <= 0.01)
+        assert(len(output['raw'][attack_size]) == n)
+
+def test_ci_halfwidth():
+    assert(ci_halfwidth([1.]) == np.inf)
+    assert(ci_halfwidth([0.5] * 10) == 0)
+    samples = np.random.RandomState(0).normal(size=1000)
+    assert(np.isclose(ci_halfwidth(samples), 1.96 * np.std(samples, ddof=1) / np.sqrt(1000),
+                      rtol=1e-2))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing equal_freespace() fixed sampling... ", end='', flush=True)
+    test_fixed_sampling()
+    print("success!")
+
+    print("  Testing equal_freespace() adaptive sampling... ", end='', flush=True)
+    test_adaptive_sampling()
+    print("success!")
+
+    print("  Testing ci_halfwidth()... ", end='', flush=True)
+    test_ci_halfwidth()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
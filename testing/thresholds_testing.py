@@ -0,0 +1,77 @@
+import pypower.api as pp
+import numpy as np
+import random
+
+import sys
+sys.path.insert(0, '../')
+from thresholds import *
+from kernel import proportional_kernel
+import simulation
+
+def test_failure_thresholds():
+    rng = np.random.default_rng(0)
+    base_flows = rng.random(1000) * 100
+    flows = base_flows * (1 + rng.normal(0, 0.5, 1000))
+    flows[:10] = base_flows[:10]
+    flows[10:20] = 0
+    base_flows[20:30] = 0
+    thresholds = failure_thresholds(flows, base_flows)
+    assert(np.all(np.isnan(thresholds[20:30])))
+    t = thresholds[30:]
+    F, P = base_flows[30:], abs(flows[30:])
+    # the line holds at its threshold, and fails just below it
+    assert(np.all(F*(1+t) >= P))
+    assert(np.all(F*(1+np.nextafter(t, -np.inf)) < P))
+
+def test_curve_is_exact(iterations=3):
+    for load_case in (pp.case30, pp.case118):
+        case = load_case()
+        n_branches = len(case['branch'])
+        for i in range(iterations):
+            attack_set = random.sample(range(n_branches), 3)
+            curve = proportional_curve(case, attack_set, 0., 1.)
+            assert(curve['breakpoints'][0] == 0. and curve['end'] > 1.)
+            assert(np.all(np.diff(curve['breakpoints']) > 0))
+            # on a grid of a, and on both sides of every breakpoint
+            points = list(np.linspace(0, 1, 51))
+            for b in curve['breakpoints'][1:]:
+                points += [b, np.nextafter(b, -np.inf)]
+            for a in points:
+                output = proportional_kernel(case, a, attack_set)
+                assert(output['system_size'] == curve_value(curve, a))
+                assert(output['power_loss'] == curve_value(curve, a, 'power_loss'))
+            breakpoints, values = merge_pieces(curve)
+            assert(np.all(values[1:] != values[:-1]))
+            assert(np.all(curve_value(curve, breakpoints) == values))
+
+def test_pypower_curve():
+    case = pp.case30()
+    attack_set = random.sample(range(len(case['branch'])), 2)
+    curve = proportional_curve(case, attack_set, 0.1, 0.5, solver='pypower')
+    for b in curve['breakpoints'][1:]:
+        for a in (b, np.nextafter(b, -np.inf)):
+            output = simulation.proportional_sim(case, a, attack_set)
+            assert(output['system_size'] == curve_value(curve, a))
+    limited = proportional_curve(case, attack_set, 0.1, 0.5, solver='pypower', maxPieces=2)
+    assert(limited['simulations'] == min(2, curve['simulations']))
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing failure thresholds... ", end='', flush=True)
+    test_failure_thresholds()
+    print("success!")
+
+    print("  Testing exact curves... ", end='', flush=True)
+    test_curve_is_exact()
+    print("success!")
+
+    print("  Testing curves with pypower... ", end='', flush=True)
+    test_pypower_curve()
+    print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
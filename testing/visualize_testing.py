@@ -0,0 +1,105 @@
+import pypower.api as pp
+import numpy as np
+import tempfile
+import random
+import os
+
+import sys
+sys.path.insert(0, '../')
+from visualize import *
+from components_ig import ppc_to_ig
+import simulation
+
+try:
+    import cairo
+except ImportError:
+    cairo = None
+
+def cascade_history(load_case, a=0.2, attack_size=3):
+    case = load_case()
+    attack_set = random.sample(range(len(case['branch'])), attack_size)
+    output = simulation.proportional_sim(case, a, attack_set, saveIterations=True)
+    return (output['grid_history'], output['capacities'])
+
+def test_case_graph():
+    for load_case in (pp.case30, pp.case118, pp.case300):
+        grid, capacities = cascade_history(load_case)
+        grid = grid[-1]
+        expected = ppc_to_ig(grid, includeInactive=True)
+        assert(case_graph(grid).get_edgelist() == expected.get_edgelist())
+
+def test_frame_styles():
+    for load_case in (pp.case30, pp.case118):
+        history, capacities = cascade_history(load_case)
+        styles = frame_styles(history, capacities)
+        assert(styles['edge_color'].shape == (len(history), len(capacities)))
+        for i in range(len(history)):
+            G = ppc_to_ig(history[i], includeInactive=True, includeData=True)
+            vertex_color = [get_vertex_color(G.vs[j]['gen'], G.vs[j]['load'])
+                            for j in range(len(G.vs))]
+            vertex_size = np.sqrt(abs(np.array(G.vs['gen']) - np.array(G.vs['load'])))*2.5
+            # get_edge_color() cannot color unloaded lines without capacity
+            defined = [j for j in range(len(G.es))
+                       if capacities[j] > 0 or G.es[j]['isFailed'] or G.es[j]['load'] != 0]
+            edge_color = [get_edge_color(G.es[j]['load'], capacities[j], G.es[j]['isFailed'])
+                          for j in defined]
+            assert(list(styles['vertex_color'][i]) == vertex_color)
+            assert(np.allclose(styles['vertex_size'][i], vertex_size))
+            assert(list(styles['edge_color'][i][defined]) == edge_color)
+
+def test_layout_cache():
+    grid = pp.case30()
+    with tempfile.TemporaryDirectory() as path:
+        layout = get_layout(grid, path)
+        assert(os.listdir(path) == [layout_key(grid) + '.npy'])
+        cached = get_layout(grid, path)
+        assert(np.allclose(cached.coords, layout.coords))
+        # a different topology gets its own layout
+        other = pp.case30()
+        other['branch'] = other['branch'][:-1]
+        get_layout(other, path)
+        assert(len(os.listdir(path)) == 2)
+
+def test_render():
+    # plotting needs pycairo
+    if cairo is None:
+        return
+    history, capacities = cascade_history(pp.case30)
+    with tempfile.TemporaryDirectory() as path:
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            serial = visualize(history, capacities, 'serial', workers=1, layoutCache=path)
+            parallel = visualize(history, capacities, 'parallel', workers=2, layoutCache=path)
+            assert(len(serial) == len(parallel) == len(history))
+            for a, b in zip(serial, parallel):
+                with open(a, 'rb') as fa, open(b, 'rb') as fb:
+                    assert(fa.read() == fb.read())
+        finally:
+            os.chdir(cwd)
+
+
+def runTests():
+    print("Running all tests...")
+
+    print("  Testing graph construction... ", end='', flush=True)
+    test_case_graph()
+    print("success!")
+
+    print("  Testing frame styles... ", end='', flush=True)
+    test_frame_styles()
+    print("success!")
+
+    print("  Testing layout cache... ", end='', flush=True)
+    test_layout_cache()
+    print("success!")
+
+    if cairo is not None:
+        print("  Testing rendering... ", end='', flush=True)
+        test_render()
+        print("success!")
+
+    print("All tests completed successfully!")
+
+if __name__ == '__main__':
+    runTests()
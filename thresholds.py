@@ -0,0 +1,188 @@
+import numpy as np
+
+import pypower.idx_brch as idx_brch
+
+import simulation
+from basecase import base_cases
+from kernel import get_kernel
+
+"""
+thresholds.py - Exact sweeps of proportional_sim() over the tolerance parameter
+a (capacities C = (1+a)*L). The line flows of every round of a cascade depend
+only on the lines failed before it, not on the capacities, and line i fails in
+a round exactly when its flow there exceeds L_i*(1+a), i.e. when a is below a
+threshold of the line's flow-to-base-flow ratio. So one simulation at a gives
+the interval of values of a that produce the same cascade, round for round:
+from the largest threshold of the lines that held to the smallest threshold of
+the lines that failed. Sweeping from one interval's end to the next gives the
+piecewise constant outcome of the attack over a range of a, with one simulation
+per distinct cascade.
+"""
+
+# all bits of a float64 but its sign
+SIGN_MASK = np.int64(0x7FFFFFFFFFFFFFFF)
+
+def _ordered(x):
+    """Maps floats to integers of the same order (adjacent floats differ by 1)."""
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits >= 0, bits, -(bits & SIGN_MASK))
+
+def _unordered(keys):
+    """Inverse of _ordered()."""
+    bits = np.where(keys >= 0, keys, (-keys) | ~SIGN_MASK)
+    return bits.astype(np.int64).view(np.float64)
+
+def failure_thresholds(flows, base_flows):
+    """Finds, for each line, the smallest a at which a flow no longer fails it,
+    i.e. at which abs(flow) <= base_flow*(1+a) when evaluated in floating point
+    the way proportional_sim() computes capacities.
+
+    ARGUMENTS: flows: numpy array (of line flows in one round),
+               base_flows: numpy array (of absolute base case line flows)
+    RETURNS:   numpy array (of thresholds; nan for lines with no base flow,
+               whose capacity does not depend on a, and for undefined flows)
+    """
+    flows = abs(np.asarray(flows, dtype=float))
+    usable = (base_flows > 0) & np.isfinite(flows)
+    thresholds = np.full(len(flows), np.nan)
+    F, P = base_flows[usable], flows[usable]
+    estimate = P / F - 1
+
+    # bracket the exact boundary: a line fails at lo and holds at hi
+    step = 4 * np.finfo(float).eps * (1 + abs(estimate))
+    lo, hi = estimate - step, estimate + step
+    while True:
+        low = F*(1+lo) >= P
+        high = F*(1+hi) < P
+        if not (low.any() or high.any()):
+            break
+        lo[low] -= step[low]
+        hi[high] += step[high]
+        step *= 2
+    # then bisect on the floats in between
+    lo, hi = _ordered(lo), _ordered(hi)
+    while True:
+        open_ = hi - lo > 1
+        if not open_.any():
+            break
+        mid = lo + (hi - lo) // 2
+        holds = F*(1+_unordered(mid)) >= P
+        hi = np.where(open_ & holds, mid, hi)
+        lo = np.where(open_ & ~holds, mid, lo)
+    thresholds[usable] = _unordered(hi)
+    return thresholds
+
+def validity_interval(round_flows, failure_history, base_flows):
+    """Finds the values of a for which a cascade runs exactly as recorded.
+
+    ARGUMENTS: round_flows: list (of numpy arrays, the line flows each round's
+                            overloads were found from),
+               failure_history: list (of lists of lines failed in each round,
+                                starting with the attack set),
+               base_flows: numpy array (of absolute base case line flows)
+    RETURNS:   tuple (of floats lo, hi: the cascade is the same for all a with
+               lo <= a < hi)
+    """
+    lo, hi = -np.inf, np.inf
+    for n_round, flows in enumerate(round_flows):
+        thresholds = failure_thresholds(flows, base_flows)
+        failed = np.zeros(len(flows), dtype=bool)
+        if n_round + 1 < len(failure_history):
+            failed[failure_history[n_round + 1]] = True
+        known = ~np.isnan(thresholds)
+        if (known & failed).any():
+            hi = min(hi, thresholds[known & failed].min())
+        if (known & ~failed).any():
+            lo = max(lo, thresholds[known & ~failed].max())
+    return (lo, hi)
+
+def simulate_rounds(grid, a, attack_set, solver='native'):
+    """Runs proportional_sim() (with the cascade kernel for the native solver)
+    and records the line flows of every round.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               a: float,
+               attack_set: list (of line indices),
+               solver: str (see basecase.get_solver())
+    RETURNS:   dict (failure_history, failed_lines, system_size, power_loss and
+               round_flows, see kernel.CascadeKernel.run())
+    """
+    if solver == 'native':
+        kernel = get_kernel(grid)
+        return kernel.run(kernel.flows*(1+a), attack_set, saveFlows=True)
+    output = simulation.proportional_sim(grid, a, attack_set, saveIterations=True,
+                                         solver=solver)
+    history = output['grid_history']
+    output['round_flows'] = [history[i]['branch'][:, idx_brch.PF]
+                             for i in range(1, len(history))]
+    return output
+
+def proportional_curve(grid, attack_set, aMin, aMax, solver='native', maxPieces=None):
+    """Computes the outcome of an attack for every a in [aMin, aMax] exactly,
+    as a piecewise constant function of a (see thresholds.py).
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               attack_set: list (of line indices),
+               aMin, aMax: float,
+               solver: str (see basecase.get_solver()),
+               maxPieces: int (stop after this many pieces; defaults to no
+                          limit)
+    RETURNS:   dict ('breakpoints': numpy array (the value of a each piece
+               starts at, the first being aMin), 'system_size', 'power_loss'
+               and 'cascade_length': numpy arrays (one per piece),
+               'failed_lines': list (of lists, one per piece), 'end': float
+               (where the last piece ends; above aMax unless stopped by
+               maxPieces), and 'simulations': int)
+    """
+    if aMin > aMax:
+        raise ValueError("aMin must not be larger than aMax")
+    if 'areas' in grid:
+        del grid['areas']
+    base_flows = base_cases.get(grid, solver)['flows']
+    pieces = []
+    a = aMin
+    end = aMin
+    while a <= aMax and (maxPieces is None or len(pieces) < maxPieces):
+        output = simulate_rounds(grid, a, attack_set, solver)
+        lo, end = validity_interval(output['round_flows'], output['failure_history'],
+                                    base_flows)
+        if not lo <= a < end:
+            raise RuntimeError("cascade at a=%r is not valid on its own interval "
+                               "[%r, %r)" % (a, lo, end))
+        pieces.append((a, output))
+        a = end
+
+    outputs = [output for a, output in pieces]
+    return {'breakpoints': np.array([a for a, output in pieces]),
+            'system_size': np.array([output['system_size'] for output in outputs]),
+            'power_loss': np.array([output['power_loss'] for output in outputs]),
+            'cascade_length': np.array([len(output['failure_history'])
+                                        for output in outputs]),
+            'failed_lines': [output['failed_lines'] for output in outputs],
+            'end': end,
+            'simulations': len(pieces)}
+
+def curve_value(curve, a, key='system_size'):
+    """Evaluates a curve from proportional_curve() at a (or an array of a).
+
+    ARGUMENTS: curve: dict (from proportional_curve()),
+               a: float or numpy array (within [aMin, curve['end'])),
+               key: str ('system_size', 'power_loss' or 'cascade_length')
+    RETURNS:   float or numpy array
+    """
+    index = np.searchsorted(curve['breakpoints'], a, side='right') - 1
+    if np.any(index < 0) or np.any(np.asarray(a) >= curve['end']):
+        raise ValueError("a is outside of the curve")
+    return curve[key][index]
+
+def merge_pieces(curve, key='system_size'):
+    """Merges neighbouring pieces of a curve with the same value.
+
+    ARGUMENTS: curve: dict (from proportional_curve()),
+               key: str ('system_size', 'power_loss' or 'cascade_length')
+    RETURNS:   tuple (of numpy arrays: breakpoints, values)
+    """
+    values = curve[key]
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return (curve['breakpoints'][keep], values[keep])
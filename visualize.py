@@ -1,9 +1,27 @@
-import pypower.api as pp
-import networkx as nx
-import igraph as ig
 import numpy as np
-from components_ig import ppc_to_ig
+import multiprocessing
+import hashlib
+import os
 
+import pypower.idx_brch as idx_brch
+import pypower.idx_bus as idx_bus
+import pypower.idx_gen as idx_gen
+
+try:
+    import imageio.v3 as iio
+except ImportError:
+    iio = None
+
+"""
+visualize.py - Renders grids, and the rounds of a cascade (a grid_history from
+run_simulation(saveIterations=True)), as images. The graph and its layout are
+built once per case (layouts are also cached on disk), the colors and sizes of
+every frame are computed together as arrays, and frames are plotted in a
+process pool. Plotting needs pycairo; writing an animation needs imageio.
+"""
+
+# default directory for cached layouts
+LAYOUT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'layouts')
 
 def get_vertex_color(gen, load):
     if gen == load:
@@ -28,25 +46,215 @@ def get_edge_color(load, cap, isFailed):
             green = hex(int(round(255 * ((1-ratio) / 0.5))))
             return '#ff' + green[2:].zfill(2) + '00'
 
+# edge colors by code: green to yellow (0-255), yellow to red (256-511),
+# overloaded (512) and failed (513), as get_edge_color()
+EDGE_PALETTE = np.array(['#%02xff00' % i for i in range(256)] +
+                        ['#ff%02x00' % (255 - i) for i in range(256)] +
+                        ['purple', 'black'])
+VERTEX_PALETTE = np.array(['black', 'blue', 'orange'])
+
+
+def case_graph(grid):
+    """Builds the igraph graph of a grid, with every line (failed or not) as
+    the edge of the same index (as ppc_to_ig(grid, includeInactive=True)).
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file)
+    RETURNS:   igraph.Graph
+    """
+    bus_ids = grid['bus'][:, idx_bus.BUS_I]
+    order = np.argsort(bus_ids, kind='stable')
+    rows = lambda ids : order[np.searchsorted(bus_ids, ids, sorter=order)]
+    edges = np.column_stack((rows(grid['branch'][:, idx_brch.F_BUS]),
+                             rows(grid['branch'][:, idx_brch.T_BUS])))
+    import igraph as ig
+    G = ig.Graph()
+    G.add_vertices(len(bus_ids))
+    G.add_edges(edges.tolist())
+    return G
+
+def layout_key(grid):
+    """RETURNS: str (a digest of a grid's buses and lines, naming its layout)"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(grid['bus'][:, idx_bus.BUS_I]).tobytes())
+    digest.update(np.ascontiguousarray(grid['branch'][:, [idx_brch.F_BUS, idx_brch.T_BUS]]).tobytes())
+    return digest.hexdigest()
+
+def get_layout(grid, layoutCache=LAYOUT_CACHE, graph=None):
+    """Returns the Reingold-Tilford layout of a grid's graph, loading it from
+    (or saving it to) layoutCache.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               layoutCache: str (directory; None does not cache),
+               graph: igraph.Graph (from case_graph(), if already built)
+    RETURNS:   igraph.Layout
+    """
+    import igraph as ig
+    fname = None
+    if layoutCache is not None:
+        fname = os.path.join(layoutCache, layout_key(grid) + '.npy')
+        if os.path.exists(fname):
+            return ig.Layout(np.load(fname).tolist())
+    if graph is None:
+        graph = case_graph(grid)
+    layout = graph.layout_reingold_tilford()
+    if fname is not None:
+        os.makedirs(layoutCache, exist_ok=True)
+        tmp = fname + '.%d.tmp' % os.getpid()
+        with open(tmp, 'wb') as f:
+            np.save(f, np.array(layout.coords))
+        os.replace(tmp, fname)
+    return layout
+
+def bus_generation(grid, rows=None):
+    """Computes the generation drawn at each bus. As in ppc_to_ig(), a bus
+    with several generators shows the last one.
+
+    ARGUMENTS: grid: dict (representing a PYPOWER case file),
+               rows: numpy array (bus row of each generator, if known)
+    RETURNS:   numpy array (one per bus row)
+    """
+    if rows is None:
+        bus_ids = grid['bus'][:, idx_bus.BUS_I]
+        order = np.argsort(bus_ids, kind='stable')
+        rows = order[np.searchsorted(bus_ids, grid['gen'][:, idx_gen.GEN_BUS], sorter=order)]
+    last = len(rows) - 1 - np.unique(rows[::-1], return_index=True)[1]
+    gen = np.zeros(len(grid['bus']))
+    gen[rows[last]] = grid['gen'][last, idx_gen.PG]
+    return gen
+
+def frame_styles(grids, capacities):
+    """Computes the vertex colors and sizes and the edge colors of every
+    frame, as get_vertex_color() and get_edge_color() would.
+
+    ARGUMENTS: grids: list (of dicts representing PYPOWER case files with the
+                      same buses and lines, or a history.GridHistory),
+               capacities: list (of the same length as grid['branch'])
+    RETURNS:   dict ('vertex_color', 'edge_color': numpy arrays of color
+               strings, 'vertex_size': numpy array of floats; one row per
+               frame)
+    """
+    first = grids[0]
+    bus_ids = first['bus'][:, idx_bus.BUS_I]
+    order = np.argsort(bus_ids, kind='stable')
+    rows = order[np.searchsorted(bus_ids, first['gen'][:, idx_gen.GEN_BUS], sorter=order)]
+    gen = np.empty((len(grids), len(first['bus'])))
+    load = np.empty_like(gen)
+    flows = np.empty((len(grids), len(first['branch'])))
+    failed = np.empty(flows.shape, dtype=bool)
+    for i in range(len(grids)):
+        grid = grids[i]
+        gen[i] = bus_generation(grid, rows)
+        load[i] = grid['bus'][:, idx_bus.PD]
+        flows[i] = abs(grid['branch'][:, idx_brch.PF])
+        failed[i] = grid['branch'][:, idx_brch.BR_X] == np.inf
+
+    vertex_code = np.where(gen == load, 0, np.where(gen > load, 1, 2))
+
+    capacities = np.asarray(capacities, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.nan_to_num(flows / capacities, nan=0., posinf=0.)
+    edge_code = np.where(ratio < 0.5, np.rint(255 * (ratio / 0.5)),
+                         511 - np.rint(255 * ((1 - ratio) / 0.5)))
+    edge_code = np.clip(edge_code, 0, 511).astype(int)
+    edge_code[flows > capacities] = 512
+    edge_code[failed] = 513
+
+    return {'vertex_color': VERTEX_PALETTE[vertex_code],
+            'vertex_size': np.sqrt(abs(gen - load))*2.5,
+            'edge_color': EDGE_PALETTE[edge_code]}
+
+
+# graph and layout of the worker processes, set by init_worker()
+_worker = dict()
+
+def init_worker(graph, coords):
+    """Process pool initializer: keeps the graph and layout frames are drawn
+    with.
+    """
+    import igraph as ig
+    _worker['graph'] = graph
+    _worker['layout'] = ig.Layout(coords)
+
+def plot_frame(graph, layout, fname, vertex_color, vertex_size, edge_color):
+    import igraph as ig
+    ig.plot(graph, fname, layout=layout, bbox=(2000,2000), margin=100,
+            vertex_color=list(vertex_color), vertex_size=list(vertex_size),
+            edge_color=list(edge_color), edge_width=5)
+
+def render_frame(frame):
+    """Draws one frame with the worker's graph and layout.
+
+    ARGUMENTS: frame: tuple (file name, vertex colors, vertex sizes, edge
+                      colors)
+    """
+    plot_frame(_worker['graph'], _worker['layout'], *frame)
+
+def write_animation(fnames, fname, fps=2):
+    """Combines rendered frames into an animated GIF (or, for other extensions
+    such as .mp4, a video). Needs imageio (and a video plugin for videos).
+
+    ARGUMENTS: fnames: list (of image file names, in order),
+               fname: str (output file name),
+               fps: float (frames per second)
+    """
+    if iio is None:
+        raise ImportError("writing animations requires imageio")
+    frames = [iio.imread(frame) for frame in fnames]
+    if fname.lower().endswith('.gif'):
+        iio.imwrite(fname, frames, duration=1000 / fps, loop=0)
+    else:
+        # videos have no alpha channel
+        iio.imwrite(fname, [frame[..., :3] for frame in frames], fps=fps)
+
+
 def draw(grid, capacities, fname, layout=None):
-    G = ppc_to_ig(grid, includeInactive=True, includeData=True)
+    G = case_graph(grid)
     if layout == None:
         layout = G.layout_reingold_tilford()
-    vertex_color = [get_vertex_color(G.vs[i]['gen'], G.vs[i]['load']) for i in range(len(G.vs))]
-    vertex_size = np.sqrt(abs(np.array(G.vs['gen']) - np.array(G.vs['load'])))*2.5
-    edge_color = [get_edge_color(G.es[i]['load'], capacities[i], G.es[i]['isFailed'])
-                  for i in range(len(G.es))]
-    ig.plot(G, fname, layout=layout, bbox=(2000,2000), margin=100, vertex_color=vertex_color,
-            vertex_size=vertex_size, edge_color=edge_color, edge_width=5)
-
-
-def visualize(grids, capacities, title):
-    if type(grids) == list:
-        # provided list of grids
-        layout = ppc_to_ig(grids[0], includeInactive=True).layout_reingold_tilford()
-        for i in range(len(grids)):
-            draw(grids[i], capacities, 'ppcvis-' + title + '_iter' + str(i) + '.png', layout=layout)
+    styles = frame_styles([grid], capacities)
+    plot_frame(G, layout, fname, styles['vertex_color'][0], styles['vertex_size'][0],
+               styles['edge_color'][0])
+
+
+def visualize(grids, capacities, title, workers=None, layoutCache=LAYOUT_CACHE,
+              animation=None, fps=2):
+    """Draws a grid, or every round of a cascade, to 'ppcvis-<title>.png' (or
+    'ppcvis-<title>_iter<i>.png' for round i).
+
+    ARGUMENTS: grids: dict (representing a PYPOWER case file) or list (of
+                      them, or a history.GridHistory),
+               capacities: list (of the same length as grid['branch']),
+               title: str,
+               workers: int (processes drawing the frames of a cascade;
+                        defaults to the CPU count, and 1 draws in this
+                        process),
+               layoutCache: str (directory for cached layouts, see
+                            get_layout(); None does not cache),
+               animation: str (file name of a GIF or video of the frames to
+                          write as well, see write_animation()),
+               fps: float (frames per second of the animation)
+    RETURNS:   list (of the file names drawn)
+    """
+    if not isinstance(grids, dict):
+        # provided list of grids (or a history.GridHistory)
+        graph = case_graph(grids[0])
+        layout = get_layout(grids[0], layoutCache, graph)
+        styles = frame_styles(grids, capacities)
+        frames = [('ppcvis-' + title + '_iter' + str(i) + '.png', styles['vertex_color'][i],
+                   styles['vertex_size'][i], styles['edge_color'][i])
+                  for i in range(len(grids))]
+        fnames = [frame[0] for frame in frames]
+        if workers == 1 or len(frames) == 1:
+            for frame in frames:
+                plot_frame(graph, layout, *frame)
+        else:
+            with multiprocessing.Pool(workers, initializer=init_worker,
+                                      initargs=(graph, layout.coords)) as pool:
+                pool.map(render_frame, frames)
+        if animation is not None:
+            write_animation(fnames, animation, fps)
     else:
         # provided single grid
-        layout = ppc_to_ig(grids, includeInactive=True).layout_reingold_tilford()
-        draw(grids, capacities, "ppcvis-" + title + '.png')
+        fnames = ["ppcvis-" + title + '.png']
+        draw(grids, capacities, fnames[0])
+    return fnames